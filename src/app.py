@@ -1,11 +1,16 @@
 """Project Starting Point"""
+import importlib
 
 import pandas as pd
 import streamlit as st
 from streamlit_option_menu import option_menu
 
-from graph import set_mlflow
-from page_section import agent_page, history_page, intro_page
+PAGES = {
+    "Introduction": "page_section.intro_page",
+    "Agent": "page_section.agent_page",
+    "History": "page_section.history_page",
+}
+"""Module of each sidebar page, imported the first time the page is opened."""
 
 st.set_page_config(
   page_title="CognitoEDA",
@@ -15,33 +20,36 @@ st.set_page_config(
 
 if 'configuration' not in st.session_state:
     st.session_state['configuration'] = {
-            'agent_sleep_seconds': 30,
+            'requests_per_minute': 5,
+            'tokens_per_minute': 250000,
             'temperature': 1.0,
+            'max_concurrency': 1,
+            'sample_size': 0,
+            'cache_mode': 'use',
+            'use_profiler': True,
+            'use_statistics_engine': True,
+            'replay_plans': True,
+            'fan_out_tasks': True,
             'problem_type': None,
             'target_column': None,
             'data_table': pd.DataFrame(),
+            'dataset': None,
+            'arrow_strings': False,
+            'categories': False,
+            'compaction': None,
             'uuid': None,
-            'stages': [],
-            'status': "Initiating Agent .....",
-            'background_task': None
+            'job_id': None
         }
 
 if 'configuration' in st.session_state:
     st.session_state['configuration']['data_table'] = pd.DataFrame()
 
-set_mlflow()
-
 with st.sidebar:
     selected = option_menu(
         None,
-        ["Introduction", "Agent", "History"],
+        list(PAGES),
         icons=["house-door-fill", "robot", "clock-history"],
         default_index=0,
     )
 
-if selected == "Introduction":
-    intro_page.show()
-elif selected == "Agent":
-    agent_page.show()
-elif selected == "History":
-    history_page.show()
+importlib.import_module(PAGES[selected]).show()
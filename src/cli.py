@@ -0,0 +1,262 @@
+"""Batch Command Line Starting Point"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+
+from tools.cache import CacheMode
+from tools.helper import ConfigSchema, NodeName
+from tools.telemetry import TELEMETRY
+from utils.helper import ModelClasses, write_run_config
+from utils.ingestion import compact_dataset, ingest_csv
+from utils.jobs import MAX_JOB_ATTEMPTS, JobQueue, JobStatus, replace_dead_workers, start_workers, stop_workers
+from utils.run_index import RUN_INDEX
+
+
+STAGE_NODES = {
+    NodeName.PYTHON_PANDAS_TASK_AGENT.value: NodeName.PYTHON_PANDAS_CODER_AGENT.value,
+    NodeName.PYTHON_STATISTICS_TASK_AGENT.value: NodeName.PYTHON_STATISTICS_CODER_AGENT.value,
+}
+"""The stage each fanned-out task node belongs to, the one of the node reducing its tasks."""
+
+CLI_QUEUE = JobQueue(name=f'cli-{os.getpid()}')
+"""The queue of the batch, private to this process so its workers never take the jobs of the app or of another batch."""
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parses the command line of a batch run.
+
+    Returns:
+        argparse.Namespace: The dataset paths, per-file settings and agent configuration.
+    """
+    parser = argparse.ArgumentParser(description="Run CognitoEDA over a directory or glob of CSV datasets.")
+    parser.add_argument("paths", nargs="+", help="CSV files, directories or glob patterns to profile")
+    parser.add_argument("--settings", help="JSON file mapping a file name to its `target_column` and `problem_type`")
+    parser.add_argument("--target-column", help="Target column for files without settings")
+    parser.add_argument("--problem-type", choices=[val.value for _, val in ModelClasses.__members__.items()],
+                        help="Problem type for files without settings")
+    parser.add_argument("--workers", type=int, default=2, help="Number of datasets processed at the same time")
+    parser.add_argument("--requests-per-minute", type=int, default=5)
+    parser.add_argument("--tokens-per-minute", type=int, default=250000)
+    parser.add_argument("--temperature", type=float, default=1.0)
+    parser.add_argument("--max-concurrency", type=int, default=1, help="Number of coder tasks in flight per dataset")
+    parser.add_argument("--sample-size", type=int, default=0, help="Rows explored by the coder agents (0 = full data)")
+    parser.add_argument("--cache-mode", choices=[val.value for _, val in CacheMode.__members__.items()], default=CacheMode.USE.value)
+    parser.add_argument("--no-profiler", action="store_true", help="Let the LLM plan the standard metadata")
+    parser.add_argument("--no-statistics-engine", action="store_true", help="Let the LLM plan the statistical tests")
+    parser.add_argument("--no-replay-plans", action="store_true", help="Do not replay plans saved for the same schema")
+    parser.add_argument("--no-fan-out", action="store_true", help="Run coder tasks inside a single node")
+    parser.add_argument("--arrow-strings", action="store_true", help="Store text columns not stored as categoricals as Arrow strings")
+    parser.add_argument("--categories", action="store_true", help="Store low-cardinality text columns as categoricals")
+    parser.add_argument("--summary", help="Optional path of a JSON file receiving the throughput summary")
+    return parser.parse_args()
+
+
+def find_datasets(paths: list[str]) -> list[str]:
+    """
+    Expands directories and glob patterns into the sorted list of CSV files.
+
+    Args:
+        paths (list[str]): The files, directories and glob patterns given on the command line.
+
+    Returns:
+        list[str]: The CSV file paths, without duplicates.
+    """
+    datasets = set()
+    for path in paths:
+        if os.path.isdir(path):
+            datasets.update(glob.glob(os.path.join(path, '*.csv')))
+        else:
+            datasets.update(file for file in glob.glob(path) if file.lower().endswith('.csv'))
+    return sorted(datasets)
+
+
+def submit_dataset(path: str, settings: dict, args: argparse.Namespace) -> str:
+    """
+    Ingests and compacts a dataset, saves its run configuration and queues the run.
+
+    The run directory follows the layout written by the Streamlit app:
+    './logs/<uuid>/config.json' and './logs/<uuid>/data.csv', with the stage
+    logs and 'index.html' added by the worker running the job.
+
+    Args:
+        path (str): The CSV file to profile.
+        settings (dict): The `target_column` and `problem_type` of the file.
+        args (argparse.Namespace): The agent configuration of the batch.
+
+    Returns:
+        str: The run UUID of the queued job.
+    """
+    with open(path, 'rb') as f:
+        ingestion = ingest_csv(f)
+    if settings.get('target_column') not in ingestion['columns']:
+        raise ValueError(f"Target column `{settings.get('target_column')}` not found in {path}")
+    if settings.get('problem_type') not in [val.value for _, val in ModelClasses.__members__.items()]:
+        raise ValueError(f"Unknown problem type `{settings.get('problem_type')}` for {path}")
+    runnable_config = ConfigSchema(uuid=str(uuid.uuid4()),
+                                   requests_per_minute=args.requests_per_minute,
+                                   tokens_per_minute=args.tokens_per_minute,
+                                   temperature=args.temperature,
+                                   max_concurrency=args.max_concurrency,
+                                   sample_size=args.sample_size,
+                                   cache_mode=args.cache_mode,
+                                   target_column=settings['target_column'],
+                                   problem_type=settings['problem_type'],
+                                   use_profiler=not args.no_profiler,
+                                   use_statistics_engine=not args.no_statistics_engine,
+                                   replay_plans=not args.no_replay_plans,
+                                   fan_out_tasks=not args.no_fan_out)
+    dataset, compaction = compact_dataset(ingestion['dataset'], settings['target_column'], args.arrow_strings,
+                                          args.categories)
+    os.makedirs(f"./logs/{runnable_config['uuid']}")
+    write_run_config(runnable_config['uuid'], {**runnable_config, 'dataset': dataset, 'compaction': compaction, 'source': path})
+    shutil.copyfile(path, f"./logs/{runnable_config['uuid']}/data.csv")
+    RUN_INDEX.index_run(runnable_config['uuid'])
+    return CLI_QUEUE.submit(runnable_config, dataset)['uuid']
+
+
+def get_stage_seconds(run_id: str) -> list[float]:
+    """
+    Returns the wall-clock latency of each stage of a run, from its telemetry node spans.
+
+    Consecutive spans of one stage, such as the fanned-out tasks of a coder
+    stage and the node reducing them, make one stage running from the start of
+    its first span to the end of its last.
+
+    Args:
+        run_id (str): The run UUID.
+
+    Returns:
+        list[float]: The latency in seconds of each stage, in execution order.
+    """
+    stages = []
+    for span in TELEMETRY.get_spans(run_id):
+        if span['task'] is not None:
+            continue
+        stage, finished = STAGE_NODES.get(span['node'], span['node']), span['started'] + span['wall_seconds']
+        if stages and stages[-1][0] == stage:
+            stages[-1][2] = max(stages[-1][2], finished)
+        else:
+            stages.append([stage, span['started'], finished])
+    return [finished - started for _, started, finished in stages]
+
+
+def get_throughput_summary(run_ids: dict, failures: dict, elapsed_seconds: float) -> dict:
+    """
+    Summarizes the throughput of a finished batch.
+
+    Args:
+        run_ids (dict): The run UUID of every queued dataset, keyed by file path.
+        failures (dict): The error of every dataset that failed, keyed by file path.
+        elapsed_seconds (float): The wall-clock duration of the batch.
+
+    Returns:
+        dict: The run counts, runs per hour, p50/p95 stage latency, token usage,
+              estimated cost and failures.
+    """
+    stage_seconds = [seconds for run_id in run_ids.values() for seconds in get_stage_seconds(run_id)]
+    telemetry = [row for run_id in run_ids.values() for row in TELEMETRY.get_node_summary(run_id)]
+    completed = [path for path in run_ids if path not in failures]
+    return {
+        'datasets': len(run_ids) + len([path for path in failures if path not in run_ids]),
+        'completed': len(completed),
+        'failed': len(failures),
+        'elapsed_seconds': round(elapsed_seconds, 2),
+        'runs_per_hour': round(len(completed) / max(elapsed_seconds, 1e-9) * 3600, 2),
+        'stage_latency_p50_seconds': round(float(np.percentile(stage_seconds, 50)), 2) if stage_seconds else None,
+        'stage_latency_p95_seconds': round(float(np.percentile(stage_seconds, 95)), 2) if stage_seconds else None,
+        'input_tokens': sum(row['input_tokens'] for row in telemetry),
+        'output_tokens': sum(row['output_tokens'] for row in telemetry),
+        'estimated_cost': round(sum(row['cost'] for row in telemetry), 4),
+        'failures': failures,
+        'runs': run_ids,
+    }
+
+
+def wait_for_runs(run_ids: dict, workers: list) -> dict:
+    """
+    Waits for the queued datasets of a batch to finish, printing each run as it
+    does and replacing the workers that exit.
+
+    Args:
+        run_ids (dict): The run UUID of every queued dataset, keyed by file path.
+        workers (list): The worker processes returned by `start_workers`.
+
+    Returns:
+        dict: The error of every dataset that failed, keyed by file path.
+    """
+    pending, failures, replaced = dict(run_ids), {}, 0
+    while pending:
+        time.sleep(1)
+        replaced += replace_dead_workers(workers, name=CLI_QUEUE.name)
+        if replaced > len(workers) * MAX_JOB_ATTEMPTS:
+            failures.update({path: "The worker processes kept exiting before running the dataset" for path in pending})
+            break
+        for path, run_id in list(pending.items()):
+            job = CLI_QUEUE.get_job(run_id)
+            if job['status'] in (JobStatus.COMPLETED.value, JobStatus.FAILED.value):
+                pending.pop(path)
+                if job['status'] == JobStatus.FAILED.value:
+                    failures[path] = job['error']
+                print(f"[{len(run_ids) - len(pending)}/{len(run_ids)}] {job['status'].capitalize()} {path} ({run_id})")
+    return failures
+
+
+def main():
+    """
+    Profiles every dataset of a batch with the agentic workflow and reports throughput.
+
+    Each dataset is queued as a job in a queue private to the batch and the
+    jobs are processed by `--workers` worker processes, replaced whenever one
+    exits. Progress is printed as runs finish, followed by a summary of runs per hour, stage latency
+    percentiles and failures. The exit status is 1 if any dataset failed.
+    """
+    args = parse_args()
+    settings = {}
+    if args.settings:
+        with open(args.settings, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+    datasets = find_datasets(args.paths)
+    if not datasets:
+        raise SystemExit("No CSV datasets found")
+
+    started = time.monotonic()
+    workers = start_workers(args.workers, name=CLI_QUEUE.name)
+    run_ids, failures = {}, {}
+    try:
+        for path in datasets:
+            file_settings = settings.get(os.path.basename(path), settings.get(path, {}))
+            file_settings = {'target_column': file_settings.get('target_column', args.target_column),
+                             'problem_type': file_settings.get('problem_type', args.problem_type)}
+            try:
+                run_ids[path] = submit_dataset(path, file_settings, args)
+                print(f"Queued {path} as run {run_ids[path]}")
+            except (ValueError, OSError) as error:
+                failures[path] = str(error)
+                print(f"Skipped {path}: {error}")
+
+        failures.update(wait_for_runs(run_ids, workers))
+    finally:
+        stop_workers(workers)
+
+    summary = get_throughput_summary(run_ids, failures, time.monotonic() - started)
+    print(f"Runs: {summary['completed']} completed, {summary['failed']} failed in {summary['elapsed_seconds']} seconds "
+          f"({summary['runs_per_hour']} runs/hour)")
+    print(f"Stage latency: p50 {summary['stage_latency_p50_seconds']} seconds, p95 {summary['stage_latency_p95_seconds']} seconds")
+    print(f"Tokens: {summary['input_tokens']} input, {summary['output_tokens']} output (estimated cost ${summary['estimated_cost']})")
+    for path, error in failures.items():
+        print(f"Failed {path}: {error}")
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,109 @@
 """Graph Agent Starting Point"""
-import mlflow
+import os
+import time
+import traceback
+import urllib.request
+from datetime import datetime
+from functools import lru_cache, partial
+from typing import Any, AsyncIterator, Callable, Iterator
+
+from langchain_core.messages import BaseMessageChunk
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.json import parse_partial_json
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langgraph.graph import StateGraph
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from tools.agents import llm_agent, pandas_agent
-from tools.helper import AgentState, ConfigSchema, NodeName
+from tools.agents import (allm_agent, apandas_agent, apandas_task_agent, dispatch_pandas_tasks, llm_agent, pandas_agent,
+                          pandas_reduce_agent, pandas_task_agent)
+from tools.dataset import DatasetHandle
+from tools.helper import AgentState, ConfigSchema, NodeName, WorkflowStage, get_event_loop
+from utils.run_index import RUN_INDEX
+from utils.stage_log import INITIAL_STATE_NAME, log_stage_update, read_stage_records, rebuild_state
+
+
+LLM_AGENT = RunnableLambda(llm_agent, afunc=allm_agent, name='llm_agent')
+"""The LLM agent node, running `allm_agent` under `astream` and `llm_agent` under `stream`."""
+
+PANDAS_AGENT = RunnableLambda(pandas_agent, afunc=apandas_agent, name='pandas_agent')
+"""The monolithic pandas coder node, with its synchronous and asynchronous implementations."""
+
+PANDAS_TASK_AGENT = RunnableLambda(pandas_task_agent, afunc=apandas_task_agent, name='pandas_task_agent')
+"""The fanned-out pandas task node, with its synchronous and asynchronous implementations."""
+
+CHECKPOINT_PATH = './logs/.checkpoints/checkpoints.sqlite'
+"""Location of the SQLite database holding the graph checkpoints of every run, keyed by run UUID."""
 
+MLFLOW_TRACKING_URI = os.getenv('MLFLOW_TRACKING_URI', 'http://localhost:5000')
+"""MLflow tracking server receiving LangChain traces; set the variable empty to disable the MLflow sink."""
 
-def set_mlflow():
+TASK_NODE_NAMES = [NodeName.PYTHON_PANDAS_TASK_AGENT.value, NodeName.PYTHON_STATISTICS_TASK_AGENT.value]
+"""Nodes streaming the completion of a single fanned-out task."""
+
+STREAM_FLUSH_SECONDS = 0.5
+"""Minimum delay between two publications of the tokens streamed by a node."""
+
+REPORT_FILE_NAME = 'index.html'
+"""Name of the final report in the run directory; its presence marks the run as successful."""
+
+PARTIAL_REPORT_FILE_NAME = 'index.partial.html'
+"""Name of the report written progressively while the web developer streams it, removed once the final report exists."""
+
+
+def is_tracking_server_reachable(tracking_uri: str, timeout: float = 1.0) -> bool:
     """
-    Configures and initializes the MLflow tracking server.
+    Checks whether an MLflow tracking server answers its health endpoint.
 
-    This function sets the MLflow tracking URI to a local server. It then
-    attempts to set the experiment to 'CognitoEDA'. If the experiment does not
-    exist, it creates it. Finally, it enables automatic logging for LangChain
-    runs, which captures prompts, outputs, and other metadata.
+    Args:
+        tracking_uri (str): The tracking URI. Non-HTTP URIs, such as local
+                            file or database stores, are always reachable.
+        timeout (float, optional): The seconds to wait for an answer. Defaults to 1.0.
+
+    Returns:
+        bool: True if the tracking store can be used.
+    """
+    if not tracking_uri.startswith(('http://', 'https://')):
+        return True
+    try:
+        with urllib.request.urlopen(tracking_uri.rstrip('/') + '/health', timeout=timeout):
+            return True
+    except (OSError, ValueError):
+        return False
+
+
+def set_mlflow() -> bool:
     """
-    mlflow.set_tracking_uri('http://localhost:5000')
+    Configures MLflow as an optional sink of LangChain traces.
+
+    MLflow is used only when `MLFLOW_TRACKING_URI` is set (by default the
+    local server at 'http://localhost:5000') and the server answers; otherwise
+    the app starts without it and relies on the built-in run telemetry. When
+    enabled, this function sets the experiment to 'CognitoEDA', creating it if
+    it does not exist, and enables automatic logging for LangChain runs, which
+    captures prompts, outputs, and other metadata.
+
+    Returns:
+        bool: True if MLflow autologging was enabled.
+    """
+    if not MLFLOW_TRACKING_URI or not is_tracking_server_reachable(MLFLOW_TRACKING_URI):
+        return False
+    try:
+        import mlflow  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return False
+    mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
     try:
         mlflow.set_experiment('CognitoEDA')
     except:
         mlflow.create_experiment('CognitoEDA')
     mlflow.langchain.autolog()
+    return True
 
 
-def create_graph(runnable_config: ConfigSchema):
+def create_graph(runnable_config: ConfigSchema, checkpointer: BaseCheckpointSaver | None = None):
     """
     Creates and compiles the agentic workflow graph using LangGraph.
 
@@ -34,34 +111,316 @@ def create_graph(runnable_config: ConfigSchema):
     a state graph and adds nodes for each agent in the workflow (e.g.,
     Metadata Extractor, Python Coder, Web Developer). It then defines the
     sequence of operations by adding edges that connect these nodes in a
-    specific order.
+    specific order. Every agent node has an asynchronous implementation used
+    by `astream`, and a synchronous one used by `stream`. With `fan_out_tasks` enabled, each coder stage is split
+    into one task node per planned task (map) and a node merging the results
+    back in plan order (reduce).
 
     Args:
         runnable_config (ConfigSchema): A configuration object containing run-specific
                                         parameters like UUID, temperature, etc.
+        checkpointer (BaseCheckpointSaver | None, optional): The saver persisting the
+                                        state after every step. Defaults to None.
 
     Returns:
         CompiledGraph: A compiled, runnable LangGraph agent that executes the
                        defined workflow.
     """
     graph = StateGraph(AgentState, config_schema=ConfigSchema)
-    graph.add_node(NodeName.METADATA_EXTRACTOR_AGENT.value, llm_agent, config_schema=runnable_config)
-    graph.add_node(NodeName.STRUCTURE_CREATOR_AGENT.value, llm_agent, config_schema=runnable_config)
-    graph.add_node(NodeName.STATISTICS_GENERATOR_AGENT.value, llm_agent, config_schema=runnable_config)
-    graph.add_node(NodeName.PYTHON_PANDAS_CODER_AGENT.value, pandas_agent, config_schema=runnable_config)
-    graph.add_node(NodeName.PYTHON_STATISTICS_CODER_AGENT.value, pandas_agent, config_schema=runnable_config)
-    graph.add_node(NodeName.BUSINESS_INSIGHTS_AGENT.value, llm_agent, config_schema=runnable_config)
-    graph.add_node(NodeName.WEB_DEVELOPER_AGENT.value, llm_agent, config_schema=runnable_config)
-
-    graph.add_edge(NodeName.METADATA_EXTRACTOR_AGENT.value, NodeName.PYTHON_PANDAS_CODER_AGENT.value)
+    graph.add_node(NodeName.METADATA_EXTRACTOR_AGENT.value, LLM_AGENT, config_schema=runnable_config)
+    graph.add_node(NodeName.STRUCTURE_CREATOR_AGENT.value, LLM_AGENT, config_schema=runnable_config)
+    graph.add_node(NodeName.STATISTICS_GENERATOR_AGENT.value, LLM_AGENT, config_schema=runnable_config)
+    graph.add_node(NodeName.BUSINESS_INSIGHTS_AGENT.value, LLM_AGENT, config_schema=runnable_config)
+    graph.add_node(NodeName.WEB_DEVELOPER_AGENT.value, LLM_AGENT, config_schema=runnable_config)
+
+    coder_stages = [
+        (NodeName.METADATA_EXTRACTOR_AGENT, NodeName.PYTHON_PANDAS_CODER_AGENT, NodeName.PYTHON_PANDAS_TASK_AGENT),
+        (NodeName.STATISTICS_GENERATOR_AGENT, NodeName.PYTHON_STATISTICS_CODER_AGENT, NodeName.PYTHON_STATISTICS_TASK_AGENT)
+    ]
+    for planner_node, coder_node, task_node in coder_stages:
+        if runnable_config.get('fan_out_tasks'):
+            graph.add_node(task_node.value, PANDAS_TASK_AGENT, config_schema=runnable_config)
+            graph.add_node(coder_node.value, pandas_reduce_agent, config_schema=runnable_config)
+            graph.add_conditional_edges(planner_node.value,
+                                        partial(dispatch_pandas_tasks, task_node=task_node.value, reduce_node=coder_node.value),
+                                        [task_node.value, coder_node.value])
+            graph.add_edge(task_node.value, coder_node.value)
+        else:
+            graph.add_node(coder_node.value, PANDAS_AGENT, config_schema=runnable_config)
+            graph.add_edge(planner_node.value, coder_node.value)
+
     graph.add_edge(NodeName.PYTHON_PANDAS_CODER_AGENT.value, NodeName.STRUCTURE_CREATOR_AGENT.value)
     graph.add_edge(NodeName.STRUCTURE_CREATOR_AGENT.value, NodeName.STATISTICS_GENERATOR_AGENT.value)
-    graph.add_edge(NodeName.STATISTICS_GENERATOR_AGENT.value, NodeName.PYTHON_STATISTICS_CODER_AGENT.value)
     graph.add_edge(NodeName.PYTHON_STATISTICS_CODER_AGENT.value, NodeName.BUSINESS_INSIGHTS_AGENT.value)
     graph.add_edge(NodeName.BUSINESS_INSIGHTS_AGENT.value, NodeName.WEB_DEVELOPER_AGENT.value)
 
     graph.set_entry_point(NodeName.METADATA_EXTRACTOR_AGENT.value)
     graph.set_finish_point(NodeName.WEB_DEVELOPER_AGENT.value)
 
-    graph_agent = graph.compile()
+    graph_agent = graph.compile(checkpointer=checkpointer)
     return graph_agent
+
+
+@lru_cache(maxsize=4)
+def get_compiled_graph(fan_out_tasks: bool):
+    """
+    Returns the workflow graph compiled once per process for each graph layout.
+
+    The layout only depends on `fan_out_tasks`; the other settings of a run
+    are read by the nodes from the runnable config at execution time.
+
+    Args:
+        fan_out_tasks (bool): Whether coder stages fan out one node per task.
+
+    Returns:
+        CompiledGraph: The compiled graph, without a checkpointer.
+    """
+    return create_graph(ConfigSchema(fan_out_tasks=fan_out_tasks))
+
+
+async def astream_checkpointed(state: AgentState, runnable_config: ConfigSchema, resume: bool = False) -> AsyncIterator[dict]:
+    """
+    Runs the graph with a SQLite checkpointer keyed by the run UUID.
+
+    The state is saved after every completed step. When resuming, the run
+    continues from the last saved step, and the tasks of a fanned-out coder
+    stage that had completed before the failure are not run again, as their
+    results are saved with the step. A run without a pending step starts
+    from `state`.
+
+    Args:
+        state (AgentState): The initial state of the run.
+        runnable_config (ConfigSchema): The configuration of the run.
+        resume (bool, optional): Whether to continue from the last checkpoint. Defaults to False.
+
+    Yields:
+        tuple[str, Any]: `('updates', update)` with the update of each node of the
+                         workflow, keyed by node name, as it completes, and
+                         `('messages', (chunk, metadata))` for each token generated
+                         by an LLM call of a node, including the agents it runs.
+    """
+    os.makedirs(os.path.dirname(CHECKPOINT_PATH), exist_ok=True)
+    config = {**runnable_config, 'configurable': {'thread_id': runnable_config['uuid']}}
+    async with AsyncSqliteSaver.from_conn_string(CHECKPOINT_PATH) as checkpointer:
+        graph_agent = get_compiled_graph(bool(runnable_config.get('fan_out_tasks'))).copy(update={'checkpointer': checkpointer})
+        if resume and (await graph_agent.aget_state(config)).next:
+            state = None
+        async for namespace, mode, chunk in graph_agent.astream(state, config, stream_mode=['updates', 'messages'],
+                                                                subgraphs=True):
+            if mode == 'messages' or not namespace:
+                yield mode, chunk
+
+
+def stream_graph(state: AgentState, runnable_config: ConfigSchema, resume: bool = False) -> Iterator[tuple[str, Any]]:
+    """
+    Runs the graph with `astream` on the event loop of the thread and yields its updates synchronously.
+
+    All LLM calls of the run are awaited on one event loop, so fanned-out
+    tasks overlap their in-flight calls without a thread per call, while
+    synchronous callers such as the Streamlit page still consume a plain
+    iterator of node updates and tokens.
+
+    Args:
+        state (AgentState): The initial state of the run.
+        runnable_config (ConfigSchema): The configuration of the run.
+        resume (bool, optional): Whether to continue from the last checkpoint. Defaults to False.
+
+    Yields:
+        tuple[str, Any]: The stream mode and chunk yielded by `astream_checkpointed`.
+    """
+    loop = get_event_loop()
+    stage_stream = astream_checkpointed(state, runnable_config, resume)
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(anext(stage_stream))
+            except StopAsyncIteration:
+                break
+    finally:
+        loop.run_until_complete(stage_stream.aclose())
+
+
+def get_partial_report(text: str) -> str | None:
+    """
+    Extracts the HTML report from the partial JSON response of the web developer.
+
+    Args:
+        text (str): The tokens of the structured response received so far.
+
+    Returns:
+        str | None: The HTML generated so far, or None if the text is not the structured response.
+    """
+    try:
+        response = parse_partial_json(text)
+    except ValueError:
+        return None
+    report = response.get('output_format') if isinstance(response, dict) else None
+    return report if isinstance(report, str) else None
+
+
+def write_report(path: str, report: str):
+    """
+    Writes a report to a temporary file and moves it into place, so readers never see a truncated file.
+
+    Args:
+        path (str): The location of the report.
+        report (str): The HTML report.
+    """
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(report)
+    os.replace(path + '.tmp', path)
+
+
+class StageOutputStream:
+    """
+    Collects the tokens streamed by each node and publishes them at most every `STREAM_FLUSH_SECONDS`.
+    """
+
+    def __init__(self, run_dir: str, on_output: Callable[[str, str], None] | None = None):
+        self.run_dir = run_dir
+        self.on_output = on_output
+        self._texts = {}
+        self._latest = {}
+        self._published = {}
+
+    def add_token(self, chunk: BaseMessageChunk, metadata: dict):
+        """
+        Appends a streamed token to the text of the LLM call that generated it.
+
+        Args:
+            chunk (BaseMessageChunk): The message chunk holding the token.
+            metadata (dict): The stream metadata, whose checkpoint namespace starts with the workflow node.
+        """
+        text = chunk.text()
+        if not text:
+            return
+        node = (metadata.get('checkpoint_ns') or metadata.get('langgraph_node', '')).split(':')[0]
+        self._texts[chunk.id] = self._texts.get(chunk.id, '') + text
+        self._latest[node] = chunk.id
+        if time.monotonic() - self._published.get(node, 0) >= STREAM_FLUSH_SECONDS:
+            self.publish(node)
+
+    def publish(self, node: str):
+        """
+        Publishes the text of the latest LLM call of a node.
+
+        The text is passed to `on_output`, and the report generated so far by
+        the web developer is written to `PARTIAL_REPORT_FILE_NAME`.
+
+        Args:
+            node (str): The node name.
+        """
+        if node not in self._latest:
+            return
+        text = self._texts[self._latest[node]]
+        self._published[node] = time.monotonic()
+        if self.on_output is not None:
+            self.on_output(node, text)
+        report = get_partial_report(text) if node == NodeName.WEB_DEVELOPER_AGENT.value else None
+        if report:
+            write_report(os.path.join(self.run_dir, PARTIAL_REPORT_FILE_NAME), report)
+
+    def close(self, node: str):
+        """
+        Publishes the final text of a completed node and forgets its tokens.
+
+        Args:
+            node (str): The node name.
+        """
+        self.publish(node)
+        message_id = self._latest.pop(node, None)
+        self._texts.pop(message_id, None)
+
+    def discard(self, node: str):
+        """
+        Clears the text of a node whose result is published separately, such as a fanned-out task.
+
+        Args:
+            node (str): The node name.
+        """
+        message_id = self._latest.pop(node, None)
+        self._texts.pop(message_id, None)
+        if self.on_output is not None:
+            self.on_output(node, '')
+
+
+def run_agent(runnable_config: ConfigSchema, dataset: DatasetHandle, resume: bool = False,
+              on_output: Callable[[str, str], None] | None = None) -> Iterator[str]:
+    """
+    Runs the agentic workflow for a saved configuration and writes its logs.
+
+    The fields changed by every node update are appended, with timings, to a
+    compressed JSONL stage log under './logs/<uuid>/' (see `utils.stage_log`),
+    and the web developer's output is written to 'index.partial.html' as its
+    tokens arrive, then to 'index.html' once the node completes, so the run
+    only reads as successful when its report is whole. Failures are written
+    to an error log instead of being raised.
+    The run index is updated after every write, so the history reflects the
+    run as it goes.
+
+    Args:
+        runnable_config (ConfigSchema): The configuration of the run.
+        dataset (DatasetHandle): The handle of the registered dataset.
+        resume (bool, optional): Whether to restart a failed run from its last
+                                 completed node. Defaults to False.
+        on_output (Callable[[str, str], None] | None, optional): Receives the
+                                 text streamed by a node so far, keyed by node name,
+                                 and the result of each fanned-out task, keyed by
+                                 the completion message of the task. Defaults to None.
+
+    Yields:
+        str: The name of the agent stage that has just completed, with the
+             task count for fanned-out tasks. Yields "ERROR" if an exception
+             occurs during the agent run.
+    """
+    run_dir = './logs/' + runnable_config['uuid']
+    state = AgentState(
+        task= [f"The target column is `{runnable_config['target_column']}` and this is a `{runnable_config['problem_type']}` use case."],
+        metadata= [],
+        statistics= [],
+        insights= [],
+        df= dataset,
+        stage= [WorkflowStage.METADATA_EXTRACTOR_AGENT],
+        history= [],
+        task_results= [],
+        memo= []
+    )
+    completed_tasks = {}
+    output_stream = StageOutputStream(run_dir, on_output)
+    lapsed = time.monotonic()
+    try:
+        if resume and read_stage_records(run_dir):
+            logged_state = rebuild_state(run_dir)
+        else:
+            logged_state = log_stage_update(run_dir, INITIAL_STATE_NAME, {}, state, 0)
+        for mode, stage_output in stream_graph(state, runnable_config, resume):
+            if mode == 'messages':
+                output_stream.add_token(*stage_output)
+                continue
+            agent_name = list(stage_output.keys())[0]
+            if agent_name in TASK_NODE_NAMES:
+                output_stream.discard(agent_name)
+            else:
+                output_stream.close(agent_name)
+            if agent_name == NodeName.WEB_DEVELOPER_AGENT.value:
+                write_report(os.path.join(run_dir, REPORT_FILE_NAME),
+                             str(stage_output[NodeName.WEB_DEVELOPER_AGENT.value]['task'][0]))
+                if os.path.exists(os.path.join(run_dir, PARTIAL_REPORT_FILE_NAME)):
+                    os.remove(os.path.join(run_dir, PARTIAL_REPORT_FILE_NAME))
+            logged_state = log_stage_update(run_dir, agent_name, logged_state, stage_output[agent_name], time.monotonic() - lapsed)
+            lapsed = time.monotonic()
+            RUN_INDEX.index_run(runnable_config['uuid'])
+            if agent_name in TASK_NODE_NAMES:
+                completed_tasks[agent_name] = completed_tasks.get(agent_name, 0) + 1
+                result = stage_output[agent_name]['task_results'][0]
+                message = f"{agent_name} ({completed_tasks[agent_name]}/{result['total']})"
+                if on_output is not None:
+                    on_output(message, str(result['output']))
+                yield message
+            else:
+                yield agent_name
+    except Exception:  # pylint: disable=broad-exception-caught
+        with open(run_dir + '/error_' + datetime.now().strftime("%Y%m%d%H%M%S") + '.log', 'w', encoding='utf-8') as f:
+            f.write(traceback.format_exc())
+        RUN_INDEX.index_run(runnable_config['uuid'])
+        yield 'ERROR'
@@ -1,83 +1,175 @@
 """Agents Dashboard"""
 import os
-import traceback
+import shutil
 import uuid
 from copy import copy
 from datetime import datetime
 
-import pandas as pd
 import streamlit as st
 
-from graph import create_graph
-from tools.helper import AgentState, ConfigSchema, NodeName, WorkflowStage
-from utils.helper import ModelClasses
+from tools.cache import CacheMode
+from tools.helper import ConfigSchema
+from tools.telemetry import TELEMETRY
+from utils.helper import ModelClasses, read_file_bytes, write_run_config
+from utils.ingestion import compact_dataset, ingest_csv
+from utils.jobs import JOB_QUEUE, JobStatus, replace_dead_workers, start_workers
+from utils.run_index import RUN_INDEX
 
 
-def trigger_agent_func():
+OUTPUT_PREVIEW_CHARS = 2000
+"""Number of trailing characters of a node output shown in the status dashboard."""
+
+
+@st.cache_resource
+def get_job_workers() -> list:
+    """
+    Starts the background worker pool once per Streamlit server process.
+
+    Returns:
+        list: The worker processes running queued jobs.
+    """
+    return start_workers()
+
+
+def trigger_agent_func() -> str:
     """
-    Triggers the agentic workflow as a generator function.
+    Submits the saved configuration as a background job.
 
-    This function orchestrates the execution of a sequence of agents defined in a graph.
-    It first checks if the configuration has been saved. It then initializes the agent state
-    and streams through the agent graph, executing each agent in sequence.
+    This function checks that the configuration has been saved and queues the
+    run in the job queue, where the next free worker process picks it up. The
+    run therefore keeps going if the page is closed or rerun, and several runs
+    can proceed side by side. A run that is already queued or running is not
+    submitted again.
 
-    Yields:
-        str: The name of the agent stage that has just completed.
-             Yields "CONFIG_NOT_SAVED" if the configuration is not saved.
-             Yields "ERROR" if an exception occurs during the agent run.
+    Returns:
+        str: The run UUID of the submitted job, or "CONFIG_NOT_SAVED" if the
+             configuration is not saved.
     """
     if st.session_state["configuration"]["uuid"] is None:
-        yield "CONFIG_NOT_SAVED"
+        return "CONFIG_NOT_SAVED"
     if os.path.exists(f'./logs/{st.session_state["configuration"]["uuid"]}') is False:
-        yield "CONFIG_NOT_SAVED"
-    st.toast(f"Your Agent Run ID : {st.session_state['configuration']['uuid']}")
+        return "CONFIG_NOT_SAVED"
     runnable_config = ConfigSchema(uuid=st.session_state['configuration']['uuid'],
-                                   agent_sleep_seconds=st.session_state['configuration']['agent_sleep_seconds'],
-                                   temperature=st.session_state['configuration']['temperature'])
-
-    state = AgentState(
-        task= [f"The target column is `{st.session_state['configuration']['target_column']}` and this is a `{st.session_state['configuration']['problem_type']}` use case."],
-        metadata= [],
-        statistics= [],
-        insights= [],
-        df= st.session_state['configuration']['data_table'].to_json(orient="records"),
-        stage= [WorkflowStage.METADATA_EXTRACTOR_AGENT],
-        history= []
-    )
-    graph_agent = create_graph(runnable_config)
-    try:
-        for stage_output in graph_agent.stream(state, runnable_config):
-            agent_name = list(stage_output.keys())[0]
-            if agent_name == NodeName.WEB_DEVELOPER_AGENT.value:
-                with open('./logs/' + st.session_state['configuration']['uuid'] + '/index.html', 'w') as f:
-                    f.write(str(stage_output[NodeName.WEB_DEVELOPER_AGENT.value]['task'][0]))
-            with open('./logs/' + st.session_state['configuration']['uuid'] + f'/{agent_name}-' + datetime.now().strftime("%Y%m%d%H%M%S") + '.log', 'w') as f:
-                f.write(str(stage_output).replace('\n', '\\n'))
-            yield agent_name
-    except Exception:
-        with open('./logs/' + st.session_state['configuration']['uuid'] + '/error_' + datetime.now().strftime("%Y%m%d%H%M%S") + '.log', 'w') as f:
-            f.write(traceback.format_exc())
-        yield 'ERROR'
-
-
-def save_config_func():
+                                   requests_per_minute=st.session_state['configuration']['requests_per_minute'],
+                                   tokens_per_minute=st.session_state['configuration']['tokens_per_minute'],
+                                   temperature=st.session_state['configuration']['temperature'],
+                                   max_concurrency=st.session_state['configuration']['max_concurrency'],
+                                   sample_size=st.session_state['configuration']['sample_size'],
+                                   cache_mode=st.session_state['configuration']['cache_mode'],
+                                   target_column=st.session_state['configuration']['target_column'],
+                                   problem_type=st.session_state['configuration']['problem_type'],
+                                   use_profiler=st.session_state['configuration']['use_profiler'],
+                                   use_statistics_engine=st.session_state['configuration']['use_statistics_engine'],
+                                   replay_plans=st.session_state['configuration']['replay_plans'],
+                                   fan_out_tasks=st.session_state['configuration']['fan_out_tasks'])
+    job = JOB_QUEUE.submit(runnable_config, st.session_state['configuration']['dataset'])
+    if job['status'] == JobStatus.RUNNING.value:
+        st.toast(f"Your Agent Run ID : {job['uuid']} is already running")
+    else:
+        st.toast(f"Your Agent Run ID : {job['uuid']}")
+    return job['uuid']
+
+
+@st.fragment(run_every=1)
+def show_job_status(run_id: str):
+    """
+    Polls the job queue and displays the progress of a run, with the output
+    of each node and task, the tokens of the nodes still generating, and the
+    per-node wall time, LLM latency, limiter wait, pandas time, tokens and estimated cost.
+
+    Args:
+        run_id (str): The run UUID of the job to display.
+    """
+    job = JOB_QUEUE.get_job(run_id)
+    if job is None:
+        return
+    events = JOB_QUEUE.get_events(run_id)
+    totals = events[-1] if events else {'total_seconds': 0, 'throttled_seconds': 0, 'hits': 0, 'misses': 0}
+    summary = (f"(Lapsed Time: {int(totals['total_seconds'])} seconds, Throttled: {int(totals['throttled_seconds'])} seconds, "
+               f"Cache Hits: {totals['hits']}, Cache Misses: {totals['misses']})")
+    if job['status'] == JobStatus.QUEUED.value:
+        label, state = "Agent is queued .....", "running"
+    elif job['status'] == JobStatus.RUNNING.value:
+        label, state = "Agent is running ..... " + summary, "running"
+    elif job['status'] == JobStatus.COMPLETED.value:
+        label, state = "Generated Report " + summary, "complete"
+    else:
+        label, state = f"Please check logs for {run_id}", "error"
+    outputs = JOB_QUEUE.get_outputs(run_id)
+    with st.status(label, state=state, expanded=job['status'] != JobStatus.FAILED.value):
+        for event in events:
+            st.write(f"""**Agent:** `{event['message']}`\n\n**Status:** Completed\n\n**Time:** {int(event['seconds'])} seconds""")
+            if event['message'] in outputs:
+                st.code(outputs[event['message']][-OUTPUT_PREVIEW_CHARS:], language=None, wrap_lines=True, height=150)
+            st.divider()
+        if job['status'] == JobStatus.RUNNING.value:
+            completed = {event['message'] for event in events}
+            for name, text in outputs.items():
+                if text and name not in completed:
+                    st.write(f"""**Agent:** `{name}`\n\n**Status:** Generating""")
+                    st.code(text[-OUTPUT_PREVIEW_CHARS:], language=None, wrap_lines=True, height=150)
+    telemetry = TELEMETRY.get_node_summary(run_id)
+    if telemetry:
+        st.caption(f"Node Telemetry (Estimated Cost: ${sum(row['cost'] for row in telemetry):.4f})")
+        st.dataframe(telemetry, hide_index=True)
+    if job['status'] == JobStatus.COMPLETED.value:
+        _, col, _ = st.columns(3)
+        with col:
+            st.download_button(
+                label="Download HTML Report",
+                data=read_file_bytes(f'./logs/{run_id}/index.html'),
+                file_name=f"{run_id}_report.html",
+                use_container_width=True,
+                mime="text/html",
+            )
+
+
+def show_recent_jobs():
+    """
+    Displays the most recent jobs of every session with their status.
+    """
+    jobs = JOB_QUEUE.list_jobs()
+    if jobs:
+        st.caption("Recent Jobs")
+        st.dataframe([{'uuid': job['uuid'], 'status': job['status'],
+                       'submitted': datetime.fromtimestamp(job['created']).strftime("%Y-%m-%d %H:%M:%S")} for job in jobs],
+                     height=200)
+
+
+def save_config_func(file_upload):
     """
     Saves the current agent and data configuration to disk.
 
     A unique UUID is generated for the run and a corresponding directory is created
-    under './logs/'. The configuration from `st.session_state` is saved as 'config.json',
-    and the uploaded dataset is saved as 'data.csv' inside this directory.
-    A success toast message is displayed upon completion.
+    under './logs/'. The ingested dataset is compacted for the selected target
+    column (see `utils.ingestion.compact_dataset`) and the compacted dataset becomes
+    the one the run works on. The configuration from `st.session_state`, with the
+    memory of the dataset before and after compaction, is saved as 'config.json',
+    and the uploaded file is copied as 'data.csv' inside this directory in chunks,
+    without re-parsing it. A success toast message is displayed upon completion.
+
+    Args:
+        file_upload (UploadedFile): The uploaded CSV file.
     """
     st.session_state["configuration"]["uuid"] = str(uuid.uuid4())
     if not os.path.exists(f'./logs/{st.session_state["configuration"]["uuid"]}'):
         os.mkdir(f'./logs/{st.session_state["configuration"]["uuid"]}')
+    with st.spinner("Compacting dataset ....."):
+        dataset, compaction = compact_dataset(st.session_state['ingestion']['dataset'],
+                                              st.session_state["configuration"]["target_column"],
+                                              st.session_state["configuration"]["arrow_strings"],
+                                              st.session_state["configuration"]["categories"])
+    st.session_state["configuration"]["dataset"] = dataset
+    st.session_state["configuration"]["compaction"] = compaction
     config = copy(st.session_state['configuration'])
-    data_table = config.pop('data_table')
-    with open(f'./logs/{st.session_state["configuration"]["uuid"]}/config.json', 'w') as f:
-        f.write(str(config))
-    data_table.to_csv(f'./logs/{st.session_state["configuration"]["uuid"]}/data.csv', index=False)
-    st.toast("Config & Data saved successfully")
+    config.pop('data_table')
+    write_run_config(st.session_state["configuration"]["uuid"], config)
+    file_upload.seek(0)
+    with open(f'./logs/{st.session_state["configuration"]["uuid"]}/data.csv', 'wb') as f:
+        shutil.copyfileobj(file_upload, f)
+    RUN_INDEX.index_run(st.session_state["configuration"]["uuid"])
+    st.toast(f"Config & Data saved successfully (dataset memory: {compaction['memory_before'] / 2 ** 20:.1f} MB "
+             f"-> {compaction['memory_after'] / 2 ** 20:.1f} MB)")
 
 
 def show():
@@ -87,11 +179,12 @@ def show():
     This function sets up the user interface for configuring the agent and the dataset,
     triggering the agentic workflow, and monitoring its progress. It includes
     input fields for agent parameters, a file uploader for the dataset, and
-    select boxes for problem type and target column. It also manages the
-    execution of the agent in the background and displays real-time status updates,
-    finally providing a download link for the generated HTML report.
+    select boxes for problem type and target column. It also submits the run
+    to the background job queue and polls its status updates, finally
+    providing a download link for the generated HTML report.
     """
     st.set_page_config(layout="wide")
+    replace_dead_workers(get_job_workers())
     st.title("Agentic Workflow")
 
     with st.expander("Agent & Data Configuration", expanded=True):
@@ -100,76 +193,65 @@ def show():
             st.text("Agent Configuration")
             col1, col2 = st.columns(2)
             with col1:
-                st.session_state["configuration"]["agent_sleep_seconds"] = st.number_input("Agent Sleep Seconds",
-                                                                                            min_value=10,
-                                                                                            step=10,
-                                                                                            value=30)
+                st.session_state["configuration"]["requests_per_minute"] = st.number_input("Requests / Minute",
+                                                                                            min_value=1,
+                                                                                            step=1,
+                                                                                            value=5)
             with col2:
+                st.session_state["configuration"]["tokens_per_minute"] = st.number_input("Tokens / Minute",
+                                                                                          min_value=1000,
+                                                                                          step=1000,
+                                                                                          value=250000)
+            col3, col4 = st.columns(2)
+            with col3:
                 st.session_state["configuration"]["temperature"] = st.number_input("Temperature", min_value=0.0, max_value=1.0, step=0.1)
+            with col4:
+                st.session_state["configuration"]["max_concurrency"] = st.number_input("Max Concurrency", min_value=1, max_value=16, step=1, value=1)
+            st.session_state["configuration"]["sample_size"] = st.number_input("Sample Rows (0 = full data)", min_value=0, step=1000, value=0,
+                                                                               help="Pandas agents explore a target-stratified sample and only their accepted code is re-run on the full dataset")
+            st.session_state["configuration"]["cache_mode"] = st.selectbox("LLM Response Cache",
+                                                                           options=[val.value for _, val in CacheMode.__members__.items()])
+            st.session_state["configuration"]["use_profiler"] = st.checkbox("Compute standard metadata with the built-in profiler", value=True)
+            st.session_state["configuration"]["use_statistics_engine"] = st.checkbox("Compute statistical tests with the built-in statistics engine", value=True)
+            st.session_state["configuration"]["fan_out_tasks"] = st.checkbox("Run coder tasks as parallel graph nodes", value=True)
+            st.session_state["configuration"]["replay_plans"] = st.checkbox("Replay analysis plans and code saved for datasets with the same schema", value=True)
 
         with data_config_col:
             st.text("Dataset Configuration")
             file_upload = st.file_uploader("Upload CSV Dataset", type=['csv'])
             if file_upload is not None:
-                st.session_state["configuration"]["data_table"] = pd.read_csv(file_upload)
+                if st.session_state.get('ingestion', {}).get('file_id') != file_upload.file_id:
+                    with st.spinner("Ingesting dataset ....."):
+                        st.session_state['ingestion'] = {'file_id': file_upload.file_id, **ingest_csv(file_upload)}
+                    st.session_state["configuration"]["dataset"] = st.session_state['ingestion']['dataset']
+                st.session_state["configuration"]["data_table"] = st.session_state['ingestion']['preview']
+                st.caption(f"Column Profile ({st.session_state['ingestion']['row_count']} rows)")
+                st.dataframe(st.session_state['ingestion']['profile'], height=200)
                 col1, col2 = st.columns(2)
                 with col1:
                     st.session_state["configuration"]["problem_type"] = st.selectbox("Problem Type",
                                                                                      options=[val.value for _, val in ModelClasses.__members__.items()])
                 with col2:
                     st.session_state["configuration"]["target_column"] = st.selectbox("Select Target Column",
-                                                                                       options=st.session_state["configuration"]["data_table"].columns)
+                                                                                       options=st.session_state['ingestion']['columns'])
+                st.session_state["configuration"]["arrow_strings"] = st.checkbox("Store text columns as Arrow strings", value=False,
+                                                                                 help="Numeric and date columns are always compacted when the config is saved")
+                st.session_state["configuration"]["categories"] = st.checkbox("Store low-cardinality text columns as categoricals", value=False,
+                                                                              help="Saves memory, but generated code filling or editing text values may fail on them")
         if st.session_state["configuration"]["problem_type"] is not None and st.session_state["configuration"]["target_column"] is not None and st.session_state["configuration"]["data_table"].empty is False:
             _ , save_config_button, trigger_agent_button, _ = st.columns(4)
             with save_config_button:
                 if st.button("Save Config", width="stretch"):
-                    save_config_func()
+                    save_config_func(file_upload)
             with trigger_agent_button:
                 if st.button("Trigger Agent", width="stretch"):
-                    if st.session_state['configuration']['status'] == "Initiating Agent .....":
-                        st.session_state['configuration']['background_task'] = trigger_agent_func()
-                        st.session_state['configuration']['status'] = "Agent is running ....."
-                        st.session_state['configuration']['stages'] = []
-                        st.rerun()
-    if st.session_state['configuration']['background_task'] is not None:
-        with st.container(height="stretch"):
-            st.text("Agent Status Dashboard")
-            if st.session_state['configuration']['background_task'] and st.session_state['configuration']['status'] == "Agent is running .....":
-                with st.status(st.session_state['configuration']['status'], expanded=True) as status_box:
-                    try:
-                        lapsed_time = datetime.now()
-                        total_time = 0
-                        for msg in st.session_state['configuration']['background_task']:
-                            if msg == 'ERROR':
-                                raise Exception("ERROR")
-                            if msg == 'CONFIG_NOT_SAVED':
-                                raise Exception("CONFIG_NOT_SAVED")
-                            time_taken = str((datetime.now() - lapsed_time).seconds)
-                            st.write(f"""**Agent:** `{msg}`\n\n**Status:** Completed\n\n**Time:** {time_taken} seconds""")
-                            st.divider()
-                            lapsed_time = datetime.now()
-                            st.session_state['configuration']['stages'].append(msg)
-                            total_time += int(time_taken)
-                            status_box.update(label="Agent is running ..... (Lapsed Time: " + str(total_time) + " seconds)", state="running", expanded=True)
-                        st.session_state['configuration']['status'] = "Reported Generated"
-                        status_box.update(label="Generated Report" + " (Total Time taken: " + str(total_time) + " seconds)", state="complete", expanded=True)
-                    except Exception as e:
-                        if str(e) == 'ERROR':
-                            st.toast(f'Please check logs for {st.session_state["configuration"]["uuid"]}')
-                            status_box.update(label=f"Please check logs for {st.session_state['configuration']['uuid']}", state="error", expanded=False)
-                        if str(e) == 'CONFIG_NOT_SAVED':
-                            st.toast(f'Please save the config for {st.session_state["configuration"]["uuid"]}')
-                            status_box.update(label=f'Please save the config for {st.session_state["configuration"]["uuid"]}', state="error", expanded=False)
-            if st.session_state['configuration']['status'] == "Reported Generated":
-                _, col, _ = st.columns(3)
-                with col:
-                    st.download_button(
-                        label="Download HTML Report",
-                        data=open(f'./logs/{st.session_state["configuration"]["uuid"]}/index.html', 'rb').read(),
-                        file_name=f"{st.session_state['configuration']['uuid']}_report.html",
-                        use_container_width=True,
-                        mime="text/html",
-                    )
-            st.session_state['configuration']['background_task'] = None
-            st.session_state['configuration']['stages'] = []
-            st.session_state['configuration']['status'] = "Initiating Agent ....."
+                    run_id = trigger_agent_func()
+                    if run_id == 'CONFIG_NOT_SAVED':
+                        st.toast(f'Please save the config for {st.session_state["configuration"]["uuid"]}')
+                    else:
+                        st.session_state['configuration']['job_id'] = run_id
+    with st.container(height="stretch"):
+        st.text("Agent Status Dashboard")
+        if st.session_state['configuration']['job_id'] is not None:
+            show_job_status(st.session_state['configuration']['job_id'])
+        show_recent_jobs()
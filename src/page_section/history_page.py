@@ -1,9 +1,28 @@
 """History Page"""
-import ast
+import math
+import os
+from datetime import datetime
 
 import pandas as pd
 import streamlit as st
-from utils.helper import get_logs_info
+from page_section.agent_page import get_job_workers
+from tools.dataset import DatasetHandle
+from tools.helper import ConfigSchema
+from utils.helper import get_logs_info, read_file_bytes, read_run_config
+from utils.jobs import JOB_QUEUE, JobStatus
+from utils.run_index import RUN_INDEX, RunStatus
+from utils.stage_log import STAGE_LOG_EXTENSION, read_stage_file, rebuild_state
+
+
+RUNS_PER_PAGE = 20
+"""Number of runs listed on one page of the history."""
+
+STATUS_BADGES = {
+    RunStatus.SUCCESS.value: ('Success', 'green', '✅'),
+    RunStatus.FAILED.value: ('Failed', 'red', '❌'),
+    RunStatus.IN_PROGRESS.value: ('In Progress', 'orange', '⏳'),
+}
+"""Label, color and icon of the badge of each run status."""
 
 
 @st.dialog("View Details", width="large")
@@ -17,6 +36,8 @@ def view_dialog(df: pd.DataFrame):
 
     - For `.html` files, it shows an info message and a download button.
     - For `.log` files, it shows an info message and a download button.
+    - For stage logs (`.jsonl.gz`), it displays the state of the run rebuilt up
+      to that stage, the stage timings and a download button.
     - For `.json` files, it displays the JSON content and provides a download button.
     - For `.csv` files, it displays the first few rows of the data in a
       DataFrame and provides a download button.
@@ -27,13 +48,13 @@ def view_dialog(df: pd.DataFrame):
                            with the file path.
     """
     file_path = df['path'].values[0]
-    file_name = file_path.split('\\')[-1]
+    file_name = os.path.basename(file_path)
 
     if file_path.endswith('.html'):
         st.info("Recommend to download webpage.")
         st.download_button(
             label="Download Webpage",
-            data=open(file_path, 'rb').read(),
+            data=read_file_bytes(file_path),
             file_name=file_name,
             use_container_width=False,
             mime="text/html",
@@ -42,17 +63,27 @@ def view_dialog(df: pd.DataFrame):
         st.info("Recommend to download log.")
         st.download_button(
             label="Download Log",
-            data=open(file_path, 'rb').read(),
+            data=read_file_bytes(file_path),
             file_name=file_name,
             use_container_width=False,
             mime="text/plain",
         )
+    elif file_path.endswith(STAGE_LOG_EXTENSION):
+        records = read_stage_file(file_path)
+        st.caption(" | ".join(f"{record['node']}: {record['seconds']} seconds" for record in records))
+        st.json(rebuild_state(os.path.dirname(file_path), until=records[-1]['time']), expanded=1)
+        st.download_button(
+            label="Download Stage Log",
+            data=read_file_bytes(file_path),
+            file_name=file_name,
+            use_container_width=False,
+            mime="application/gzip",
+        )
     elif file_path.endswith('.json'):
-        with open(file_path, 'r') as f:
-            st.json(ast.literal_eval(f.read().replace("'", '"')))
+        st.json(read_run_config(file_path))
         st.download_button(
             label="Download JSON",
-            data=open(file_path, 'rb').read(),
+            data=read_file_bytes(file_path),
             file_name=file_name,
             use_container_width=False,
             mime="application/json",
@@ -63,35 +94,61 @@ def view_dialog(df: pd.DataFrame):
         st.dataframe(data)
 
 
+def resume_run(uuid: str):
+    """
+    Queues a failed run again, restarting it from its last completed node.
+
+    Args:
+        uuid (str): The run UUID of the failed job.
+    """
+    job = JOB_QUEUE.get_job(uuid)
+    JOB_QUEUE.submit(ConfigSchema(**job['params']['config']), DatasetHandle(**job['params']['dataset']), resume=True)
+    st.toast(f"Resuming Run ID : {uuid}")
+
+
 def show():
     """
     Displays the history page of the CognitoEDA application.
 
-    This function retrieves and displays the logs of previous EDA runs. It
-    fetches all log information, groups the runs by their unique ID, and
-    renders each run within a `st.expander`. Each expander shows the run's
-    final status (Success/Failed) and provides a set of `st.pills`
+    This function retrieves and displays the logs of previous EDA runs. Runs
+    are read from the run index one page at a time, most recently updated
+    first, and only the files of the runs on the page are looked up. Each run
+    is rendered within a `st.expander` showing its status
+    (Success/Failed/In Progress), stage count and size, and a set of `st.pills`
     representing the different files/stages of that run.
 
     When a user selects a pill, this function identifies the corresponding file
     and calls `view_dialog` to display its contents in a modal dialog. It also
     manages the selection state to ensure only one dialog is active at a time.
+
+    Failed runs of the job queue show a "Resume" button, which restarts the
+    run from the last node saved in its checkpoint.
     """
     st.title("History")
     st.write("To access more insights and individual level info about agents, "
              "run `uv run mlflow server` in your terminal and navigate to the experiment.")
 
-    df = get_logs_info()
+    get_job_workers()
+    RUN_INDEX.index_new_runs()
+    page_count = max(1, math.ceil(RUN_INDEX.count_runs() / RUNS_PER_PAGE))
+    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, step=1, value=1)
+    runs = RUN_INDEX.list_runs(limit=RUNS_PER_PAGE, offset=(page - 1) * RUNS_PER_PAGE)
+    df = get_logs_info([run['uuid'] for run in runs])
     multi_select_value = []
-    for uuid in df['uuid'].unique():
-        group = df[df['uuid'] == uuid].copy()
+    for run in runs:
+        uuid = run['uuid']
+        group = df[df['uuid'] == uuid]
         with st.expander(f"Run ID: {uuid}"):
-            is_success = list(group['success'].values)[0]
-            status = 'Success' if is_success else 'Failed'
-            color = 'green' if is_success else 'red'
-            icon = '✅' if is_success else '❌'
+            status, color, icon = STATUS_BADGES[run['status']]
             st.badge(status, color=color, icon=icon)
-            select_value = st.pills("Select File : ", options=group['stage_name'], selection_mode="single", key=uuid)
+            st.caption(f"Updated: {datetime.fromtimestamp(run['updated']).strftime('%Y-%m-%d %H:%M:%S')} | "
+                       f"Stages: {len(run['stages'])} | Size: {run['size'] / 1024:.1f} KB")
+            job = None if run['status'] == RunStatus.SUCCESS.value else JOB_QUEUE.get_job(uuid)
+            if job is not None and job['status'] == JobStatus.FAILED.value:
+                st.button("Resume", key=f"resume_{uuid}", on_click=resume_run, args=(uuid,))
+            elif job is not None and job['status'] in (JobStatus.QUEUED.value, JobStatus.RUNNING.value):
+                st.info(f"Run is {job['status']}.")
+            select_value = st.pills("Select File : ", options=group['stage_name'].unique(), selection_mode="single", key=uuid)
             if select_value:
                 multi_select_value.append([select_value, uuid])
     if len(multi_select_value) > 0:
@@ -0,0 +1,135 @@
+"""Agent Pool"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator
+
+from langchain.agents import AgentExecutor
+from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
+from langgraph.prebuilt import create_react_agent
+
+from tools.dataset import DatasetHandle, load_dataset
+from tools.helper import WorkflowStage, get_loop_pool, get_model, get_running_loop
+from tools.sandbox import SANDBOX_POOL, SandboxedPythonTool
+from tools.schema import FORMAT_MAPPER
+from tools.support_tools import get_common_tools
+
+
+MAX_POOLED_DATASETS = 4
+"""Number of datasets whose idle pandas agents are kept for reuse."""
+
+
+def _get_react_agent(temperature: float):
+    """Builds the React agent once per temperature in the pool of the running event loop, like the model it calls."""
+    pool = get_loop_pool()
+    key = ('react_agent', temperature)
+    if key not in pool:
+        pool[key] = create_react_agent(
+            model=get_model(temperature=temperature),
+            tools=list(get_common_tools())
+        )
+    return pool[key]
+
+
+def get_react_agent(temperature: float):
+    """
+    Returns the cached React agent (an LLM with tools) shared by the stages.
+
+    The agent is built without a prompt: the rendered stage prompt is sent as
+    the system message of each call, so one agent serves every run and stage.
+
+    Args:
+        temperature (float): The sampling temperature for the model.
+
+    Returns:
+        CompiledGraph: The React agent.
+    """
+    return _get_react_agent(temperature)
+
+
+def _get_structured_model(stage: WorkflowStage, temperature: float):
+    """Builds the structured output model of a stage once per temperature in the pool of the running event loop."""
+    pool = get_loop_pool()
+    key = ('structured_model', stage, temperature)
+    if key not in pool:
+        pool[key] = get_model(temperature=temperature).with_structured_output(FORMAT_MAPPER[stage], method="json_mode")
+    return pool[key]
+
+
+def get_structured_model(stage: WorkflowStage, temperature: float):
+    """
+    Returns the cached model turning a React agent conversation into the structured response of a stage.
+
+    The response is requested in JSON mode, so it is generated as text and
+    its tokens can be streamed as they arrive, unlike a function call whose
+    arguments are returned whole.
+
+    Args:
+        stage (WorkflowStage): The stage defining the structured response format.
+        temperature (float): The sampling temperature for the model.
+
+    Returns:
+        Runnable: The model parsing its JSON output into the stage schema.
+    """
+    return _get_structured_model(stage, temperature)
+
+
+class PandasAgentPool:
+    """
+    Idle Pandas DataFrame agents kept per dataset, so tasks and runs on the same data reuse them.
+
+    The agents only hold the DataFrame to describe it in their prompt: the code
+    they write runs in the sandbox processes of `SANDBOX_POOL`.
+    """
+
+    def __init__(self, max_datasets: int = MAX_POOLED_DATASETS):
+        self.max_datasets = max_datasets
+        self._idle: OrderedDict[tuple, list[AgentExecutor]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def checkout(self, dataset: DatasetHandle, temperature: float,
+                 return_intermediate_steps: bool) -> Iterator[AgentExecutor]:
+        """
+        Lends an agent bound to a dataset, building one if none is idle.
+
+        Agents are pooled per event loop, as the model they call is, and the
+        agents of closed loops are dropped. An agent serves one task at a time. Its Python tool is replaced on every
+        checkout by a tool running the task's code in a sandbox session, with
+        fresh variables and a shallow copy of the dataset, so tasks cannot
+        rebind or add columns to each other's frame.
+
+        Args:
+            dataset (DatasetHandle): The dataset the agent operates on, the full dataset or its sample.
+            temperature (float): The sampling temperature for the model.
+            return_intermediate_steps (bool): Whether the agent returns the code it ran.
+
+        Yields:
+            AgentExecutor: The agent, returned to the pool when the task completes.
+        """
+        key = (dataset['hash'], temperature, return_intermediate_steps, get_running_loop())
+        with self._lock:
+            for closed in [idle_key for idle_key in self._idle if idle_key[-1] is not None and idle_key[-1].is_closed()]:
+                del self._idle[closed]
+            idle = self._idle.get(key)
+            agent = idle.pop() if idle else None
+        if agent is None:
+            agent = create_pandas_dataframe_agent(llm=get_model(temperature=temperature),
+                                                  df=load_dataset(dataset),
+                                                  agent_type='tool-calling',
+                                                  return_intermediate_steps=return_intermediate_steps,
+                                                  allow_dangerous_code=True)
+        try:
+            with SANDBOX_POOL.session(dataset) as session:
+                agent.tools = [SandboxedPythonTool(session=session)]
+                yield agent
+        finally:
+            with self._lock:
+                self._idle.setdefault(key, []).append(agent)
+                self._idle.move_to_end(key)
+                while len(self._idle) > self.max_datasets:
+                    self._idle.popitem(last=False)
+
+
+PANDAS_AGENT_POOL = PandasAgentPool()
+"""The pandas agent pool shared in the process."""
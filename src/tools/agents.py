@@ -1,25 +1,127 @@
 """Agents Definition"""
+import asyncio
 import time
-from ast import literal_eval
+import traceback
+from functools import lru_cache, partial
 
-import pandas as pd
 from langchain_core.runnables import RunnableConfig
-from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
-from langgraph.prebuilt import create_react_agent
+from langgraph.types import Send
 
-from tools.helper import AgentState, WorkflowStage, get_model, get_next_stage_mapper
-from tools.prompt import get_prompt
-from tools.schema import FORMAT_MAPPER
-from tools.support_tools import common_tools
+from tools.agent_pool import PANDAS_AGENT_POOL, get_react_agent, get_structured_model
+from tools.cache import RESPONSE_CACHE, CacheMode, get_cache_key
+from tools.context import ContextReport
+from tools.dataset import DatasetHandle, load_dataset, register_dataset
+from tools.helper import (MODEL_NAME, PLANNING_STAGES, TELEMETRY_CALLBACK, AgentState, PandasTaskState, TaskResult,
+                          WorkflowStage, get_event_loop, get_next_stage_mapper)
+from tools.plan_cache import PLAN_CACHE, get_schema_fingerprint
+from tools.profiler import is_profiled_step, profile_dataset
+from tools.prompt import get_prompt, get_task_message
+from tools.rate_limiter import RATE_LIMITER, ainvoke_with_backoff, current_run_id
+from tools.sampling import get_accepted_steps, is_error_output, rerun_on_full_data, run_code, stratified_sample
+from tools.stats_engine import compute_statistics
+from tools.task_memo import TaskSource, get_memo_entries, get_task_results, get_tasks_to_run, plan_tasks
+from tools.telemetry import measure, record_span, traced_node
 
 
-def llm_agent(state: AgentState, config: RunnableConfig) -> AgentState:
+def apply_rate_limits(config: RunnableConfig):
+    """
+    Applies the run's rate limits to the shared limiter and tags the current context with the run.
+
+    Args:
+        config (RunnableConfig): The configuration for the runnable, containing
+                                 the requests and tokens per minute budgets and
+                                 the run's UUID.
+    """
+    RATE_LIMITER.configure(requests_per_minute=config.get('metadata').get("requests_per_minute"),
+                           tokens_per_minute=config.get('metadata').get("tokens_per_minute"))
+    current_run_id.set(config.get('metadata').get("uuid"))
+
+
+def get_run_fingerprint(state: AgentState, config: RunnableConfig) -> str | None:
+    """
+    Returns the schema fingerprint used to replay analysis plans and pandas code.
+
+    Args:
+        state (AgentState): The current state of the agentic workflow.
+        config (RunnableConfig): The configuration for the runnable, containing
+                                 the plan replay flag, target column and problem type.
+
+    Returns:
+        str | None: The fingerprint, or None if the run does not replay plans.
+    """
+    if not config.get('metadata').get("replay_plans"):
+        return None
+    return get_schema_fingerprint(load_dataset(state['df']),
+                                  target_column=config.get('metadata').get("target_column"),
+                                  problem_type=config.get('metadata').get("problem_type"))
+
+
+async def ainvoke_llm_agent(state: AgentState, task_list: list, temperature: float, cache_mode: CacheMode,
+                            config: RunnableConfig | None = None) -> tuple[str, list, ContextReport]:
+    """
+    Renders the stage prompt and asynchronously obtains the structured response of the React agent.
+
+    Responses are served from the persistent response cache when the same
+    model, temperature, stage, prompt, task and dataset were seen before.
+    The React agent is shared by every run and receives the prompt as its
+    system message; its conversation is then turned into the structured
+    response of the stage in JSON mode. Both calls receive the callbacks of
+    the node, so their tokens are streamed to the graph's `messages` stream.
+
+    Args:
+        state (AgentState): The current state of the agentic workflow.
+        task_list (list): The tasks sent to the agent as the user message.
+        temperature (float): The sampling temperature for the model.
+        cache_mode (CacheMode): How the response cache is used.
+        config (RunnableConfig | None, optional): The configuration of the node,
+                                                  whose callbacks are passed on. Defaults to None.
+
+    Returns:
+        tuple[str, list, ContextReport]: The rendered prompt, the list of output items
+                                         and the report of the context compaction.
+    """
+    stage = state['stage'][-1]
+    prompt, context_report = get_prompt(state)
+    cache_key = get_cache_key(model=MODEL_NAME, temperature=temperature, stage=stage.value,
+                              prompt=prompt, task=task_list, dataset=state['df']['hash'])
+
+    content_list = RESPONSE_CACHE.lookup(cache_mode, current_run_id.get(), cache_key)
+    if content_list is None:
+        callbacks_config = {'callbacks': (config or {}).get('callbacks')}
+        llm_agent_obj = get_react_agent(temperature)
+        content_list = []
+        messages = (await llm_agent_obj.ainvoke(
+            {"messages": [{"role": "system", "content": prompt},
+                          {"role": "user", "content": get_task_message(stage, task_list)}]},
+            config=callbacks_config
+        ))['messages']
+        content = (await ainvoke_with_backoff(get_structured_model(stage, temperature), messages,
+                                              config=callbacks_config)).output_format
+        if isinstance(content, list):
+            content_list.extend(content)
+        else:
+            content_list.append(content)
+        RESPONSE_CACHE.store(cache_mode, cache_key, content_list)
+    return prompt, content_list, context_report
+
+
+@traced_node
+async def allm_agent(state: AgentState, config: RunnableConfig) -> AgentState:
     """
     Executes a general-purpose LLM agent for various text-based tasks.
 
     This function serves as a node in the agentic graph. It uses a React agent
     (an LLM with tools) to process a given task based on the current workflow
     stage. The agent's response is then used to update the workflow state.
+    For the metadata extractor stage, the built-in profiler can compute the
+    standard metadata locally first, leaving only follow-up steps to the LLM.
+    For the statistics generator stage, the statistics engine can compute the
+    whole battery of tests locally, leaving no computation to later stages.
+    With plan replay enabled, planning stages reuse the task list stored for
+    a dataset with the same schema instead of calling the LLM. The LLM call is
+    awaited and local computations run in a worker thread, so other nodes and
+    runs sharing the event loop keep making progress. The history entry of
+    the stage records which context items were removed to fit the prompt budget.
 
     Args:
         state (AgentState): The current state of the agentic workflow. It contains
@@ -36,79 +138,214 @@ def llm_agent(state: AgentState, config: RunnableConfig) -> AgentState:
     task_list = state['task'] if isinstance(state['task'], list) else [state['task']]
     stage = state['stage'][-1]
     temperature = config.get('metadata').get("temperature")
-    prompt=get_prompt(state)
-
-    llm_agent_obj = create_react_agent(
-        model=get_model(temperature=temperature),
-        tools=common_tools,
-        prompt=prompt,
-        response_format=FORMAT_MAPPER[stage]
-    )
-    content_list = []
-    content = llm_agent_obj.invoke(
-        {"messages": [{"role": "user", "content": '\n\n'.join(task_list)}]}
-    )['structured_response']
-    content = content.output_format
-    if isinstance(content, list):
-        content_list.extend(content)
+    apply_rate_limits(config)
+    plan_replayed = False
+    use_profiler = stage == WorkflowStage.METADATA_EXTRACTOR_AGENT and config.get('metadata').get("use_profiler")
+    if use_profiler:
+        with measure('pandas_seconds'):
+            state['metadata'] = await asyncio.to_thread(profile_dataset, load_dataset(state['df']),
+                                                        target_column=config.get('metadata').get("target_column"),
+                                                        problem_type=config.get('metadata').get("problem_type"))
+    use_statistics_engine = stage == WorkflowStage.STATISTICS_GENERATOR_AGENT and config.get('metadata').get("use_statistics_engine")
+    if use_statistics_engine:
+        prompt, content_list, context_report = None, [], None
+        with measure('pandas_seconds'):
+            state['statistics'] = await asyncio.to_thread(compute_statistics, load_dataset(state['df']),
+                                                          target_column=config.get('metadata').get("target_column"),
+                                                          problem_type=config.get('metadata').get("problem_type"))
     else:
-        content_list.append(content)
+        fingerprint = get_run_fingerprint(state, config) if stage in PLANNING_STAGES else None
+        content_list = None if fingerprint is None else PLAN_CACHE.get_plan(fingerprint, stage.value)
+        plan_replayed, prompt, context_report = content_list is not None, None, None
+        if content_list is None:
+            cache_mode = CacheMode(config.get('metadata').get("cache_mode") or CacheMode.USE.value)
+            prompt, content_list, context_report = await ainvoke_llm_agent(state, task_list, temperature, cache_mode, config)
+            if fingerprint is not None:
+                PLAN_CACHE.set_plan(fingerprint, stage.value, content_list)
+    if use_profiler:
+        content_list = [content for content in content_list if not is_profiled_step(content)]
 
     state['task'] = content_list
 
     if stage == WorkflowStage.STRUCTURE_CREATOR_AGENT:
         state['metadata'] = state['task']
-    elif stage == WorkflowStage.STATISTICS_GENERATOR_AGENT:
+    elif stage == WorkflowStage.STATISTICS_GENERATOR_AGENT and not use_statistics_engine:
         state['statistics'] = state['task']
     elif stage == WorkflowStage.BUSINESS_INSIGHTS_AGENT:
         state['insights'] = state['task']
 
     state['stage'] = state['stage'] + [get_next_stage_mapper(state['stage'])]
-    state['history'] = state['history'] + [{'task': task_list, 'stage': stage, 'prompt': prompt, 'uuid': config.get("uuid"), 'output': content_list}]
+    state['history'] = state['history'] + [{'task': task_list, 'stage': stage, 'prompt': prompt, 'uuid': config.get("uuid"),
+                                            'output': state['statistics'] if use_statistics_engine else content_list,
+                                            'plan_replayed': plan_replayed, 'context': context_report}]
     return state
 
 
-def pandas_agent(state: AgentState, config: RunnableConfig) -> AgentState:
+def llm_agent(state: AgentState, config: RunnableConfig) -> AgentState:
     """
-    Executes a Pandas DataFrame agent to perform data analysis tasks.
+    Synchronous wrapper running `allm_agent` on the event loop of the thread, for callers without a running
+    event loop, so the clients pooled for that loop are reused from one call to the next.
 
-    This function acts as a node in the agentic graph. It deserializes a
-    DataFrame from the state, creates a specialized Pandas agent, and executes
-    a list of tasks (e.g., "calculate the mean of the 'age' column").
-    The results are collected and used to update the workflow state.
+    Args:
+        state (AgentState): The current state of the agentic workflow.
+        config (RunnableConfig): The configuration for the runnable.
+
+    Returns:
+        AgentState: The updated state object.
+    """
+    return get_event_loop().run_until_complete(allm_agent(state, config))
+
+
+async def arun_pandas_task(dataset: DatasetHandle, task: str, temperature: float,
+                           cache_mode: CacheMode = CacheMode.USE, sample: DatasetHandle | None = None,
+                           fingerprint: str | None = None) -> TaskResult:
+    """
+    Asynchronously runs a single task through its own Pandas DataFrame agent.
+
+    Each task borrows an agent of the shared pool whose code runs in a sandbox
+    process against a shallow copy of the dataset, so tasks running at the
+    same time cannot rebind or add columns to each other's frame, and runaway
+    code is stopped without affecting the worker. Any exception raised by the agent is caught and reported instead of
+    being propagated, so one failing task does not abort the whole node.
+    Successful answers are stored in, and served from, the response cache.
+    When a sample is given, the agent explores the sample only and the code it
+    accepted is re-run once on the full dataset. When a schema fingerprint is
+    given, code captured for the same task on a matching schema is replayed
+    without any LLM call, and the agent only runs if the replay fails.
 
     Args:
-        state (AgentState): The current state of the agentic workflow. It must
-                            contain the DataFrame as a JSON string in `state['df']`
-                            and a list of tasks in `state['task']`.
-        config (RunnableConfig): The configuration for the runnable, including
-                                 temperature and a sleep timer between agent calls.
+        dataset (DatasetHandle): The handle of the dataset the task operates on.
+        task (str): The natural-language task to execute.
+        temperature (float): The sampling temperature for the model.
+        cache_mode (CacheMode, optional): How the response cache is used.
+                                          Defaults to `CacheMode.USE`.
+        sample (DatasetHandle | None, optional): The handle of the sample the agent
+                                                 explores instead of the dataset. Defaults to None.
+        fingerprint (str | None, optional): The schema fingerprint under which
+                                            code is captured and replayed. Defaults to None.
+
+    Returns:
+        TaskResult: The agent's output (`'None'` on failure), the formatted
+                    traceback if the task failed, the sample-vs-full agreement
+                    metrics, whether captured code was replayed, the guard
+                    reports of the snippets that were rewritten, found slow or
+                    rejected, and the time the task took.
+    """
+    started = time.perf_counter()
+    sample_df = None if sample is None else load_dataset(sample)
+    cache_key = get_cache_key(model=MODEL_NAME, temperature=temperature, stage=WorkflowStage.PYTHON_CODER_AGENT.value,
+                              task=task, dataset=dataset['hash'], sample_rows=None if sample_df is None else len(sample_df))
+    content = RESPONSE_CACHE.lookup(cache_mode, current_run_id.get(), cache_key)
+    if content is not None:
+        return TaskResult(task=task, output=content, error=None, sampling=None, replayed=False, guard=[],
+                          seconds=time.perf_counter() - started, memoized=False)
+    code_list = None if fingerprint is None else PLAN_CACHE.get_code(fingerprint, task)
+    if code_list:
+        output, guard = await asyncio.to_thread(run_code, dataset, code_list)
+        if not is_error_output(output):
+            return TaskResult(task=task, output=f"{task}\n\n{output}", error=None, sampling=None, replayed=True,
+                              guard=[{**report, 'task': task} for report in guard],
+                              seconds=time.perf_counter() - started, memoized=False)
+    sampling, guard = None, []
+    try:
+        with PANDAS_AGENT_POOL.checkout(dataset if sample is None else sample, temperature,
+                                        return_intermediate_steps=sample is not None or fingerprint is not None) as pandas_agent_obj:
+            response = await pandas_agent_obj.ainvoke(task  + '\n\nNote: if unable to answer return `None`',
+                                                      config={'callbacks': [TELEMETRY_CALLBACK]})
+            guard = pandas_agent_obj.tools[0].session.reports
+        content, error = response['output'], None
+        if sample_df is not None:
+            content, sampling = await asyncio.to_thread(rerun_on_full_data, dataset, load_dataset(dataset),
+                                                        sample_df, response)
+            content, sampling['task'] = f"{task}\n\n{content}", task
+        RESPONSE_CACHE.store(cache_mode, cache_key, content)
+        accepted_steps = get_accepted_steps(response.get('intermediate_steps', []))
+        if fingerprint is not None and accepted_steps:
+            PLAN_CACHE.set_code(fingerprint, task, [code for code, _ in accepted_steps])
+    except Exception:  # pylint: disable=broad-exception-caught
+        content, error = 'None', traceback.format_exc()
+    return TaskResult(task=task, output=content, error=error, sampling=sampling, replayed=False,
+                      guard=[{**report, 'task': task} for report in guard],
+                      seconds=time.perf_counter() - started, memoized=False)
+
+
+@lru_cache(maxsize=4)
+def _get_stratified_sample(dataset_hash: str, dataset_path: str, target_column: str | None, problem_type: str | None,
+                           sample_size: int) -> DatasetHandle | None:
+    """Draws and registers the exploration sample of a registered dataset once per process."""
+    df = load_dataset(DatasetHandle(hash=dataset_hash, path=dataset_path))
+    sample_df = stratified_sample(df, target_column=target_column, problem_type=problem_type, sample_size=sample_size)
+    return None if len(sample_df) == len(df) else register_dataset(sample_df)
+
+
+def get_task_sample(state: AgentState | PandasTaskState, config: RunnableConfig) -> DatasetHandle | None:
+    """
+    Returns the handle of the target-stratified sample pandas agents explore instead of the full dataset.
+
+    The sample is registered like a dataset, so sandbox processes can map it.
+
+    Args:
+        state (AgentState | PandasTaskState): The state holding the dataset handle.
+        config (RunnableConfig): The configuration for the runnable, containing
+                                 the sample size, target column and problem type.
+
+    Returns:
+        DatasetHandle | None: The sample handle, or None if agents work on the full dataset.
+    """
+    if not config.get('metadata').get("sample_size"):
+        return None
+    return _get_stratified_sample(state['df']['hash'], state['df']['path'],
+                                  target_column=config.get('metadata').get("target_column"),
+                                  problem_type=config.get('metadata').get("problem_type"),
+                                  sample_size=config.get('metadata').get("sample_size"))
+
+
+def get_task_sources(state: AgentState, task_list: list) -> list[TaskSource]:
+    """
+    Matches the tasks of a coder stage against each other and against the tasks answered earlier in the run.
+
+    Args:
+        state (AgentState): The current state of the agentic workflow, holding
+                            the dataset handle and the run memo.
+        task_list (list): The tasks of the stage, in plan order.
+
+    Returns:
+        list[TaskSource]: How each task is answered (see `tools.task_memo.plan_tasks`).
+    """
+    return plan_tasks(task_list, state.get('memo') or [], list(load_dataset(state['df']).columns))
+
+
+def update_pandas_state(state: AgentState, config: RunnableConfig, task_list: list, results: list[TaskResult],
+                        sources: list[TaskSource]) -> AgentState:
+    """
+    Writes the ordered results of a coder stage into the workflow state.
+
+    The answers of the tasks that ran are added to the run memo, and the
+    history entry records how many tasks were answered from earlier results
+    and the agent time this saved.
+
+    Args:
+        state (AgentState): The current state of the agentic workflow.
+        config (RunnableConfig): The configuration for the runnable.
+        task_list (list): The tasks of the stage, in plan order.
+        results (list[TaskResult]): The task results, in the same order.
+        sources (list[TaskSource]): How each task was answered, in the same order.
 
     Returns:
         AgentState: The updated state object. The 'task' in the state is updated
-                    with the agent's output, and the stage is advanced.
+                    with the agents' outputs, and the stage is advanced.
     """
-    task_list = state['task'] if isinstance(state['task'], list) else [state['task']]
     stage = state['stage'][-1]
-    temperature = config.get('metadata').get("temperature")
-    df = state['df']
-    df = literal_eval(df)
-    columns = list(df[0].keys())
-    df = [list(i.values()) for i in df]
-    df = pd.DataFrame(data=df, columns=columns)
-    agent_sleep_seconds = config.get('metadata').get("agent_sleep_seconds")
-    pandas_agent_obj = create_pandas_dataframe_agent(llm=get_model(temperature=temperature),
-                                                     df=df,
-                                                     agent_type='tool-calling',
-                                                     allow_dangerous_code=True)
     content_list = []
-    for task in task_list:
-        content = pandas_agent_obj.invoke(task  + '\n\nNote: if unable to answer return `None`')
-        content = content['output']
-        if content != 'None':
-            content_list.append(content)
-        time.sleep(agent_sleep_seconds)
+    for result in results:
+        if result['output'] != 'None' and not (result['memoized'] and result['output'] in content_list):
+            content_list.append(result['output'])
+    error_list = [result['error'] for result in results if result['error'] is not None]
+    sampling_list = [result['sampling'] for result in results if result['sampling'] is not None]
+    guard_list = [report for result in results for report in result.get('guard', [])]
+    memoized_list = [result for result in results if result.get('memoized')]
     state['task'] = content_list
+    state['memo'] = (state.get('memo') or []) + get_memo_entries(sources, results)
 
     if stage == WorkflowStage.STRUCTURE_CREATOR_AGENT:
         state['metadata'] = state['task']
@@ -118,5 +355,153 @@ def pandas_agent(state: AgentState, config: RunnableConfig) -> AgentState:
         state['insights'] = state['task']
 
     state['stage'] = state['stage'] + [get_next_stage_mapper(state['stage'])]
-    state['history'] = state['history'] + [{'task': task, 'stage': stage, 'uuid': config.get("uuid"), 'output': content_list}]
+    state['history'] = state['history'] + [{'task': task_list, 'stage': stage, 'uuid': config.get("uuid"), 'output': content_list, 'errors': error_list,
+                                            'sampling': sampling_list, 'replayed': sum(result['replayed'] for result in results),
+                                            'guard': guard_list, 'memoized': len(memoized_list),
+                                            'saved_seconds': round(sum(result['seconds'] for result in memoized_list), 2)}]
+    return state
+
+
+@traced_node
+async def apandas_agent(state: AgentState, config: RunnableConfig) -> AgentState:
+    """
+    Executes a Pandas DataFrame agent to perform data analysis tasks.
+
+    This function acts as a node in the agentic graph. It loads the DataFrame
+    referenced by the dataset handle in the state and executes a list of tasks
+    (e.g., "calculate the mean of the 'age' column") with up to
+    `max_concurrency` tasks in flight at once. The results are collected in the
+    original task order and used to update the workflow state. With a positive
+    `sample_size`, agents explore a target-stratified sample and only their
+    accepted code runs on the full dataset. With plan replay enabled, code
+    captured for the same tasks on a matching schema is replayed first. Tasks
+    repeating another task of the plan, or a task answered earlier in the run,
+    are answered from that result instead of running again.
+
+    Args:
+        state (AgentState): The current state of the agentic workflow. It must
+                            contain the dataset handle in `state['df']` and a
+                            list of tasks in `state['task']`.
+        config (RunnableConfig): The configuration for the runnable, including
+                                 temperature, the rate limits, the maximum
+                                 number of concurrent tasks and the sample size.
+
+    Returns:
+        AgentState: The updated state object. The 'task' in the state is updated
+                    with the agent's output, and the stage is advanced.
+    """
+    task_list = state['task'] if isinstance(state['task'], list) else [state['task']]
+    temperature = config.get('metadata').get("temperature")
+    apply_rate_limits(config)
+    cache_mode = CacheMode(config.get('metadata').get("cache_mode") or CacheMode.USE.value)
+    semaphore = asyncio.Semaphore(max(1, config.get("max_concurrency") or 1))
+    run_task = partial(arun_pandas_task, state['df'], temperature=temperature, cache_mode=cache_mode,
+                       sample=get_task_sample(state, config), fingerprint=get_run_fingerprint(state, config))
+
+    async def run_bounded_task(task: str) -> TaskResult:
+        async with semaphore:
+            with record_span(task=task):
+                return await run_task(task)
+
+    sources = get_task_sources(state, task_list)
+    indexes = get_tasks_to_run(sources)
+    results = await asyncio.gather(*(run_bounded_task(task_list[index]) for index in indexes))
+    return update_pandas_state(state, config, task_list, get_task_results(sources, dict(zip(indexes, results))), sources)
+
+
+def pandas_agent(state: AgentState, config: RunnableConfig) -> AgentState:
+    """
+    Synchronous wrapper running `apandas_agent` on the event loop of the thread, like `llm_agent`.
+
+    Args:
+        state (AgentState): The current state of the agentic workflow.
+        config (RunnableConfig): The configuration for the runnable.
+
+    Returns:
+        AgentState: The updated state object.
+    """
+    return get_event_loop().run_until_complete(apandas_agent(state, config))
+
+
+def dispatch_pandas_tasks(state: AgentState, task_node: str, reduce_node: str) -> list[Send] | str:
+    """
+    Fans the tasks of a coder stage out to one pandas task node each.
+
+    Used as a conditional edge: LangGraph runs the sent nodes in parallel,
+    bounded by the run's `max_concurrency`, and then runs `reduce_node` once.
+    Tasks answered by another task of the plan or by the run memo are not sent.
+
+    Args:
+        state (AgentState): The current state of the agentic workflow.
+        task_node (str): The name of the node executing a single task.
+        reduce_node (str): The name of the node merging the task results.
+
+    Returns:
+        list[Send] | str: One `Send` per task to run, or `reduce_node` if there is none.
+    """
+    task_list = state['task'] if isinstance(state['task'], list) else [state['task']]
+    indexes = get_tasks_to_run(get_task_sources(state, task_list)) if task_list else []
+    if not indexes:
+        return reduce_node
+    return [Send(task_node, PandasTaskState(task=task_list[index], index=index, total=len(indexes), df=state['df']))
+            for index in indexes]
+
+
+@traced_node
+async def apandas_task_agent(state: PandasTaskState, config: RunnableConfig) -> dict:
+    """
+    Executes a single fanned-out task with its own Pandas DataFrame agent.
+
+    Args:
+        state (PandasTaskState): The task, its position in the plan and the dataset handle.
+        config (RunnableConfig): The configuration for the runnable, including
+                                 temperature, the rate limits and the sample size.
+
+    Returns:
+        dict: The state update appending the task result to `task_results`.
+    """
+    apply_rate_limits(config)
+    cache_mode = CacheMode(config.get('metadata').get("cache_mode") or CacheMode.USE.value)
+    with record_span(task=state['task']):
+        result = await arun_pandas_task(state['df'], state['task'],
+                                        temperature=config.get('metadata').get("temperature"),
+                                        cache_mode=cache_mode, sample=get_task_sample(state, config),
+                                        fingerprint=get_run_fingerprint(state, config))
+    return {'task_results': [{**result, 'index': state['index'], 'total': state['total']}]}
+
+
+def pandas_task_agent(state: PandasTaskState, config: RunnableConfig) -> dict:
+    """
+    Synchronous wrapper running `apandas_task_agent` on the event loop of the thread, like `llm_agent`.
+
+    Args:
+        state (PandasTaskState): The task, its position in the plan and the dataset handle.
+        config (RunnableConfig): The configuration for the runnable.
+
+    Returns:
+        dict: The state update appending the task result to `task_results`.
+    """
+    return get_event_loop().run_until_complete(apandas_task_agent(state, config))
+
+
+def pandas_reduce_agent(state: AgentState, config: RunnableConfig) -> AgentState:
+    """
+    Merges the results of the fanned-out pandas tasks back into the workflow state.
+
+    Args:
+        state (AgentState): The current state of the agentic workflow, holding
+                            the plan in `state['task']` and the collected
+                            results in `state['task_results']`.
+        config (RunnableConfig): The configuration for the runnable.
+
+    Returns:
+        AgentState: The updated state object with the outputs in plan order,
+                    including the tasks answered from earlier results, the
+                    stage advanced and `task_results` cleared.
+    """
+    task_list = state['task'] if isinstance(state['task'], list) else [state['task']]
+    sources = get_task_sources(state, task_list)
+    results = get_task_results(sources, {result['index']: result for result in state['task_results']})
+    state = update_pandas_state(state, config, task_list, results, sources)
+    state['task_results'] = None
     return state
@@ -0,0 +1,161 @@
+"""LLM Response Cache"""
+import hashlib
+import json
+import sqlite3
+import time
+from collections import defaultdict
+from enum import Enum
+from typing import Any
+
+from utils.sqlite_store import SQLiteStore
+
+
+CACHE_PATH = './logs/.cache/llm_cache.sqlite'
+"""Location of the SQLite database holding cached LLM responses."""
+
+
+class CacheMode(Enum):
+    """
+    Enum for the ways a run may use the response cache.
+    """
+    USE = "use"
+    REFRESH = "refresh"
+    BYPASS = "bypass"
+
+
+def get_cache_key(**parts: Any) -> str:
+    """
+    Builds a content-addressed cache key from everything that determines a response.
+
+    Args:
+        **parts (Any): The model name, temperature, stage, rendered prompt, task
+                       text, dataset fingerprint and any other inputs of the call.
+
+    Returns:
+        str: The hex digest of the canonical JSON encoding of `parts`.
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class ResponseCache(SQLiteStore):
+    """
+    On-disk cache of structured LLM responses with TTL and size-based LRU eviction.
+    """
+
+    autocommit = False
+    """The statements of a lookup or an insertion and its evictions commit together."""
+
+    def __init__(self, path: str = CACHE_PATH, ttl_seconds: int = 7 * 24 * 3600, max_size_bytes: int = 256 * 1024 * 1024):
+        super().__init__(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = max_size_bytes
+        self._stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    def create_schema(self, connection: sqlite3.Connection):
+        """Creates the response table and its recency index."""
+        connection.execute("CREATE TABLE IF NOT EXISTS responses "
+                           "(key TEXT PRIMARY KEY, value TEXT, size INTEGER, created REAL, accessed REAL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def get(self, key: str) -> Any | None:
+        """
+        Looks up a cached response.
+
+        Args:
+            key (str): The key built by `get_cache_key`.
+
+        Returns:
+            Any | None: The cached response, or None if it is missing or expired.
+        """
+        now = time.time()
+        with self._lock, self._connect() as connection:
+            row = connection.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        """
+        Stores a response and evicts expired and least recently used entries.
+
+        Args:
+            key (str): The key built by `get_cache_key`.
+            value (Any): The JSON-serializable response to store.
+        """
+        now = time.time()
+        payload = json.dumps(value)
+        with self._lock, self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                               (key, payload, len(payload), now, now))
+            connection.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+            total_size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total_size > self.max_size_bytes:
+                connection.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM ("
+                    "SELECT key, SUM(size) OVER (ORDER BY accessed DESC) AS running_size FROM responses"
+                    ") WHERE running_size > ?)",
+                    (self.max_size_bytes,)
+                )
+
+    def lookup(self, mode: CacheMode, run_id: str | None, key: str) -> Any | None:
+        """
+        Looks up a response according to the run's cache mode and counts the outcome.
+
+        Args:
+            mode (CacheMode): The cache mode of the run. Only `CacheMode.USE`
+                              reads from the cache.
+            run_id (str | None): The run UUID the hit or miss is counted against.
+            key (str): The key built by `get_cache_key`.
+
+        Returns:
+            Any | None: The cached response, or None if the call must be made.
+        """
+        if mode == CacheMode.BYPASS:
+            return None
+        value = self.get(key) if mode == CacheMode.USE else None
+        self.record(run_id, value is not None)
+        return value
+
+    def store(self, mode: CacheMode, key: str, value: Any):
+        """
+        Stores a fresh response unless the run bypasses the cache.
+
+        Args:
+            mode (CacheMode): The cache mode of the run.
+            key (str): The key built by `get_cache_key`.
+            value (Any): The JSON-serializable response to store.
+        """
+        if mode != CacheMode.BYPASS:
+            self.set(key, value)
+
+    def record(self, run_id: str | None, hit: bool):
+        """
+        Counts a cache hit or miss against a run.
+
+        Args:
+            run_id (str | None): The run UUID.
+            hit (bool): Whether the lookup was served from the cache.
+        """
+        with self._lock:
+            self._stats[run_id]['hits' if hit else 'misses'] += 1
+
+    def get_stats(self, run_id: str | None) -> dict:
+        """
+        Returns the hit and miss counters of a run.
+
+        Args:
+            run_id (str | None): The run UUID.
+
+        Returns:
+            dict: A dictionary with 'hits' and 'misses' counts.
+        """
+        with self._lock:
+            return dict(self._stats[run_id])
+
+
+RESPONSE_CACHE = ResponseCache()
+"""The response cache shared by every agent in the process."""
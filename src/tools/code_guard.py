@@ -0,0 +1,485 @@
+"""Code Guard"""
+import ast
+import copy
+import math
+import os
+
+import pandas as pd
+from langchain_experimental.tools.python.tool import sanitize_input
+from typing_extensions import TypedDict
+
+
+CODE_BUDGET_SECONDS = float(os.getenv('CODE_BUDGET_SECONDS', '10'))
+"""Estimated run time above which a code snippet is rejected, read from the `CODE_BUDGET_SECONDS` environment variable."""
+
+PATTERN_SECONDS = {
+    'iterrows': 3e-5,
+    'itertuples': 1e-6,
+    'row_apply': 8e-6,
+    'element_apply': 3e-7,
+    'row_loop': 5e-7,
+    'indexed_access': 1e-5,
+    'group_loop': 4e-5,
+    'copy_in_loop': 6e-9,
+    'concat_in_loop': 6e-9,
+}
+"""Measured cost of each slow pattern: seconds per row, per access, per group or per copied cell."""
+
+PATTERN_HINTS = {
+    'iterrows': "Replace `iterrows()` loops with column operations, e.g. `(df['a'] * df['b']).sum()` "
+                "instead of accumulating `row['a'] * row['b']`.",
+    'itertuples': "Replace `itertuples()` loops with column operations, boolean masks or `groupby` aggregations.",
+    'row_apply': "Replace `apply(..., axis=1)` with arithmetic on whole columns, `np.where` for conditions "
+                 "or `Series.str` methods for text.",
+    'element_apply': "Replace `apply`/`map` with a lambda by the equivalent operator, NumPy function or `.str`/`.dt` accessor.",
+    'row_loop': "Do not loop over the rows of a column or index in Python; use vectorized operations or `value_counts`.",
+    'indexed_access': "Do not read `.loc`/`.iloc`/`.at`/`.iat` values one at a time in a loop; select whole columns "
+                      "or use boolean masks.",
+    'group_loop': "Replace loops over `groupby` with `groupby(...).agg(...)`, `transform` or `value_counts`.",
+    'copy_in_loop': "Do not copy the DataFrame inside a loop; select the needed columns once, before the loop.",
+    'concat_in_loop': "Do not grow a DataFrame with `concat`/`merge` inside a loop; collect the pieces in a list "
+                      "and concatenate once, or use `groupby`.",
+}
+"""Hint returned to the agent for each slow pattern of a rejected snippet."""
+
+DEFAULT_LOOP_ITERATIONS = 10
+"""Iterations assumed for a loop whose iterable size cannot be inferred."""
+
+VECTORIZED_FUNCTIONS = {'abs', 'absolute', 'sign', 'sqrt', 'exp', 'log', 'log1p', 'log2', 'log10', 'floor', 'ceil'}
+"""NumPy functions that give the same result on a scalar and, element-wise, on a Series or DataFrame."""
+
+VECTORIZED_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.BitAnd, ast.BitOr)
+"""Binary operators that give the same result on scalars and, element-wise, on Series."""
+
+COMPARISON_OPERATORS = (ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq)
+"""Comparisons that give the same result on scalars and, element-wise, on Series."""
+
+FRAME_METHODS = {'copy', 'merge', 'join', 'append', 'assign', 'drop', 'dropna', 'fillna', 'rename', 'reset_index',
+                 'set_index', 'sort_values', 'sort_index', 'query', 'head', 'tail', 'sample', 'astype', 'to_frame'}
+"""DataFrame and Series methods returning a DataFrame or Series, used to follow the type of a chained receiver."""
+
+PANDAS_CONSTRUCTORS = {'DataFrame', 'Series', 'concat', 'merge', 'read_csv', 'read_parquet', 'read_excel', 'read_json'}
+"""Functions of the `pandas` module returning a DataFrame or Series."""
+
+CAST_METHODS = {'str': 'astype', 'float': 'astype', 'abs': 'abs'}
+"""Builtins passed to `Series.apply`/`map` and the Series method computing the same values."""
+
+
+class Finding(TypedDict):
+    """
+    A slow pattern found in a code snippet.
+    """
+    pattern: str
+    line: int
+    seconds: float
+
+
+class GuardReport(TypedDict):
+    """
+    The analysis of a code snippet before it runs, recorded per task in the run history.
+    """
+    code: str
+    rows: int
+    rewrites: list[str]
+    findings: list[Finding]
+    estimated_seconds: float
+    rejected: bool
+
+
+def get_frame(namespace: dict) -> pd.DataFrame | None:
+    """Returns the DataFrame the code runs against, bound to `df`."""
+    frame = namespace.get('df')
+    return frame if isinstance(frame, pd.DataFrame) else None
+
+
+def is_frame_name(node: ast.AST, namespace: dict, kind: type) -> bool:
+    """Checks whether a node is a variable bound to a Series or DataFrame before the snippet runs."""
+    return isinstance(node, ast.Name) and isinstance(namespace.get(node.id), kind)
+
+
+def is_pandas_module(node: ast.AST, namespace: dict) -> bool:
+    """Checks whether a node is the `pd` or `pandas` name, unless the session bound it to something else."""
+    return isinstance(node, ast.Name) and node.id in ('pd', 'pandas') and namespace.get(node.id, pd) is pd
+
+
+def is_frame_expression(node: ast.AST, namespace: dict, frame_names: set[str]) -> bool:
+    """
+    Checks whether a node is known to evaluate to a DataFrame or Series.
+
+    Args:
+        node (ast.AST): The expression.
+        namespace (dict): The variables of the REPL session.
+        frame_names (set[str]): The variables the snippet assigned a DataFrame or Series to so far.
+
+    Returns:
+        bool: True for a DataFrame or Series variable, a selection from one, a
+              `pandas` constructor, or a method of `FRAME_METHODS` called on one.
+              Lists, dictionaries and unknown objects are never frames.
+    """
+    if isinstance(node, ast.Name):
+        return node.id in frame_names or isinstance(namespace.get(node.id), (pd.DataFrame, pd.Series))
+    if isinstance(node, ast.Subscript):
+        return is_frame_expression(node.value, namespace, frame_names)
+    if isinstance(node, ast.Attribute):
+        return node.attr in ('loc', 'iloc', 'T') and is_frame_expression(node.value, namespace, frame_names)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+        if is_pandas_module(node.func.value, namespace):
+            return node.func.attr in PANDAS_CONSTRUCTORS
+        return node.func.attr in FRAME_METHODS and is_frame_expression(node.func.value, namespace, frame_names)
+    return False
+
+
+def is_series(node: ast.AST, namespace: dict) -> bool:
+    """
+    Checks whether a node is known to evaluate to a Series without side effects.
+
+    Args:
+        node (ast.AST): The expression.
+        namespace (dict): The variables of the REPL session.
+
+    Returns:
+        bool: True for a variable bound to a Series, or a single existing
+              column of a DataFrame variable, such as `df['age']`.
+    """
+    if is_frame_name(node, namespace, pd.Series):
+        return True
+    if not (isinstance(node, ast.Subscript) and is_frame_name(node.value, namespace, pd.DataFrame)):
+        return False
+    columns = namespace[node.value.id].columns
+    return isinstance(node.slice, ast.Constant) and node.slice.value in columns and columns.is_unique
+
+
+def is_text(node: ast.AST) -> bool:
+    """Checks whether a node is a string constant, which only concatenates and compares the same way on Series."""
+    return isinstance(node, ast.Constant) and isinstance(node.value, str)
+
+
+def is_vectorizable(node: ast.AST, parameter: str, row_wise: bool) -> bool:
+    """
+    Checks whether a lambda body computes the same values element-wise on whole columns.
+
+    Args:
+        node (ast.AST): The lambda body.
+        parameter (str): The name of the lambda parameter.
+        row_wise (bool): Whether the parameter is a row, only read through constant
+                         column subscripts, or a single value.
+
+    Returns:
+        bool: True if the body only combines the parameter and constants with
+              arithmetic, comparisons and `VECTORIZED_FUNCTIONS`.
+    """
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, (int, float, str)) and not isinstance(node.value, bool)
+    if isinstance(node, ast.Name):
+        return node.id == parameter and not row_wise
+    if isinstance(node, ast.Subscript):
+        return (row_wise and isinstance(node.value, ast.Name) and node.value.id == parameter
+                and isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str))
+    if isinstance(node, ast.BinOp):
+        if isinstance(node.op, ast.Pow):
+            return (is_vectorizable(node.left, parameter, row_wise) and isinstance(node.right, ast.Constant)
+                    and isinstance(node.right.value, (int, float)) and node.right.value > 0)
+        if (is_text(node.left) or is_text(node.right)) and not isinstance(node.op, ast.Add):
+            return False
+        return (isinstance(node.op, VECTORIZED_OPERATORS) and is_vectorizable(node.left, parameter, row_wise)
+                and is_vectorizable(node.right, parameter, row_wise))
+    if isinstance(node, ast.UnaryOp):
+        return isinstance(node.op, (ast.USub, ast.UAdd)) and is_vectorizable(node.operand, parameter, row_wise)
+    if isinstance(node, ast.Compare):
+        return (len(node.ops) == 1 and isinstance(node.ops[0], COMPARISON_OPERATORS)
+                and is_vectorizable(node.left, parameter, row_wise)
+                and is_vectorizable(node.comparators[0], parameter, row_wise))
+    if isinstance(node, ast.Call) and len(node.args) == 1 and not node.keywords:
+        function = node.func
+        is_numpy = (isinstance(function, ast.Attribute) and isinstance(function.value, ast.Name)
+                    and function.value.id in ('np', 'numpy') and function.attr in VECTORIZED_FUNCTIONS)
+        is_builtin = isinstance(function, ast.Name) and function.id == 'abs'
+        return (is_numpy or is_builtin) and is_vectorizable(node.args[0], parameter, row_wise)
+    return False
+
+
+def uses_parameter(node: ast.AST, parameter: str) -> bool:
+    """Checks whether an expression reads the lambda parameter."""
+    return any(isinstance(child, ast.Name) and child.id == parameter for child in ast.walk(node))
+
+
+def get_axis(call: ast.Call) -> object:
+    """Returns the constant `axis` keyword of a call, or None if it is not given."""
+    for keyword in call.keywords:
+        if keyword.arg == 'axis':
+            return keyword.value.value if isinstance(keyword.value, ast.Constant) else keyword.value
+    return None
+
+
+class ParameterReplacer(ast.NodeTransformer):
+    """
+    Replaces the parameter of a lambda by the columns or Series it is applied to.
+    """
+
+    def __init__(self, parameter: str, receiver: ast.expr, row_wise: bool):
+        self.parameter = parameter
+        self.receiver = receiver
+        self.row_wise = row_wise
+
+    def visit_Subscript(self, node: ast.Subscript) -> ast.AST:  # pylint: disable=invalid-name,missing-function-docstring
+        if self.row_wise and isinstance(node.value, ast.Name) and node.value.id == self.parameter:
+            return ast.Subscript(value=copy.deepcopy(self.receiver), slice=node.slice, ctx=ast.Load())
+        return self.generic_visit(node)
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:  # pylint: disable=invalid-name,missing-function-docstring
+        return copy.deepcopy(self.receiver) if node.id == self.parameter else node
+
+
+class VectorizingRewriter(ast.NodeTransformer):
+    """
+    Rewrites the `apply` and `map` calls whose lambda can run on whole columns.
+
+    Only receivers whose type is known before the snippet runs are rewritten:
+    `frame.apply(lambda row: row['a'] * row['b'], axis=1)` on a DataFrame
+    variable becomes `frame['a'] * frame['b']`, `series.apply(lambda v: v * 2)`
+    on a Series becomes `series * 2`, and `series.apply(str)` becomes
+    `series.astype(str)`. The rewritten code computes the same values.
+    """
+
+    def __init__(self, namespace: dict):
+        self.namespace = namespace
+        self.rewrites = []
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:  # pylint: disable=invalid-name,missing-function-docstring
+        node = self.generic_visit(node)
+        rewritten = self.rewrite(node)
+        if rewritten is None:
+            return node
+        self.rewrites.append(f"{ast.unparse(node)} -> {ast.unparse(rewritten)}")
+        return ast.copy_location(rewritten, node)
+
+    def rewrite(self, node: ast.Call) -> ast.expr | None:
+        """
+        Returns the vectorized equivalent of an `apply` or `map` call.
+
+        Args:
+            node (ast.Call): The call.
+
+        Returns:
+            ast.expr | None: The vectorized expression, or None if the call is kept.
+        """
+        function = node.func
+        if not (isinstance(function, ast.Attribute) and function.attr in ('apply', 'map') and len(node.args) == 1):
+            return None
+        receiver, argument, axis = function.value, node.args[0], get_axis(node)
+        if len({keyword.arg for keyword in node.keywords} - {'axis'}):
+            return None
+        if isinstance(argument, ast.Name) and argument.id in CAST_METHODS and axis is None and is_series(receiver, self.namespace):
+            method = CAST_METHODS[argument.id]
+            return ast.Call(func=ast.Attribute(value=receiver, attr=method, ctx=ast.Load()),
+                            args=[argument] if method == 'astype' else [], keywords=[])
+        if not (isinstance(argument, ast.Lambda) and len(argument.args.args) == 1 and not argument.args.defaults):
+            return None
+        parameter, body = argument.args.args[0].arg, argument.body
+        if not uses_parameter(body, parameter):
+            return None
+        if function.attr == 'apply' and axis in (1, 'columns') and is_frame_name(receiver, self.namespace, pd.DataFrame):
+            if not is_vectorizable(body, parameter, row_wise=True):
+                return None
+            columns = self.namespace[receiver.id].columns
+            if all(child.slice.value in columns for child in ast.walk(body) if isinstance(child, ast.Subscript)):
+                return ParameterReplacer(parameter, receiver, row_wise=True).visit(copy.deepcopy(body))
+            return None
+        if axis is None and is_series(receiver, self.namespace) and is_vectorizable(body, parameter, row_wise=False):
+            return ParameterReplacer(parameter, receiver, row_wise=False).visit(copy.deepcopy(body))
+        return None
+
+
+class CostEstimator(ast.NodeVisitor):
+    """
+    Estimates the run time of the slow patterns of a snippet on the current dataset.
+
+    The cost of a pattern is its measured cost in `PATTERN_SECONDS`, scaled by
+    the rows, cells or groups it touches and by the iterations of the loops
+    enclosing it. Copies and concatenations are only counted on receivers
+    known to be DataFrames or Series (see `is_frame_expression`), so growing a
+    list or copying a dictionary in a loop costs nothing.
+    """
+
+    def __init__(self, namespace: dict):
+        self.namespace = namespace
+        frame = get_frame(namespace)
+        self.rows = 0 if frame is None else len(frame)
+        self.columns = 0 if frame is None else len(frame.columns)
+        self.multiplier = 1
+        self.findings = []
+        self.frame_names = set()
+
+    def is_frame(self, node: ast.AST) -> bool:
+        """Checks whether a node is known to evaluate to a DataFrame or Series at this point of the snippet."""
+        return is_frame_expression(node, self.namespace, self.frame_names)
+
+    def add(self, pattern: str, node: ast.AST, units: float):
+        """Records a slow pattern and its cost for `units` rows, accesses, groups or cells."""
+        seconds = PATTERN_SECONDS[pattern] * units * self.multiplier
+        self.findings.append(Finding(pattern=pattern, line=getattr(node, 'lineno', 0), seconds=round(seconds, 3)))
+
+    def get_groups(self, call: ast.Call) -> float:
+        """Returns the number of groups of a `groupby` call on a DataFrame variable, or an estimate."""
+        receiver = call.func.value
+        keys = call.args[0] if call.args else None
+        if is_frame_name(receiver, self.namespace, pd.DataFrame) and keys is not None:
+            try:
+                by = ast.literal_eval(keys)
+                if all(key in self.namespace[receiver.id].columns for key in (by if isinstance(by, list) else [by])):
+                    return self.namespace[receiver.id].groupby(by, sort=False).ngroups
+            except (ValueError, TypeError, SyntaxError, KeyError):
+                pass
+        return math.sqrt(self.rows)
+
+    def get_iterations(self, node: ast.AST) -> float:
+        """
+        Estimates how many times a loop over an iterable runs, recording row loops.
+
+        Args:
+            node (ast.AST): The iterable of the loop.
+
+        Returns:
+            float: The estimated number of iterations.
+        """
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in ('enumerate', 'zip') and node.args:
+            return self.get_iterations(node.args[0])
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'range' and node.args:
+            stop = node.args[-1] if len(node.args) < 3 else node.args[1]
+            if isinstance(stop, ast.Constant) and isinstance(stop.value, int):
+                return max(stop.value, 0)
+            if isinstance(stop, ast.Call) and isinstance(stop.func, ast.Name) and stop.func.id == 'len':
+                self.add('row_loop', node, self.rows)
+                return self.rows
+            return DEFAULT_LOOP_ITERATIONS
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            if node.func.attr in ('iterrows', 'itertuples'):
+                return self.rows
+            if node.func.attr == 'groupby':
+                groups = self.get_groups(node)
+                self.add('group_loop', node, groups)
+                return groups
+        if isinstance(node, ast.Attribute) and node.attr == 'columns':
+            return self.columns
+        if isinstance(node, ast.Attribute) and node.attr in ('index', 'values') or is_series(node, self.namespace):
+            self.add('row_loop', node, self.rows)
+            return self.rows
+        if isinstance(node, ast.Name) and isinstance(self.namespace.get(node.id), pd.DataFrame):
+            return len(self.namespace[node.id].columns)
+        if isinstance(node, ast.Name) and hasattr(self.namespace.get(node.id), '__len__'):
+            return len(self.namespace[node.id])
+        return DEFAULT_LOOP_ITERATIONS
+
+    def visit_loop(self, iterables: list[ast.AST], body: list[ast.AST]):
+        """Visits the iterables of a loop, then its body with the multiplier of the loop."""
+        outer = self.multiplier
+        for iterable in iterables:
+            self.visit(iterable)
+            self.multiplier *= self.get_iterations(iterable)
+        for statement in body:
+            self.visit(statement)
+        self.multiplier = outer
+
+    def visit_For(self, node: ast.For):  # pylint: disable=invalid-name,missing-function-docstring
+        self.visit_loop([node.iter], node.body)
+        for statement in node.orelse:
+            self.visit(statement)
+
+    visit_AsyncFor = visit_For
+
+    def visit_While(self, node: ast.While):  # pylint: disable=invalid-name,missing-function-docstring
+        outer = self.multiplier
+        self.multiplier *= DEFAULT_LOOP_ITERATIONS
+        self.generic_visit(node)
+        self.multiplier = outer
+
+    def visit_comprehension_node(self, node: ast.AST):
+        """Visits a comprehension, whose element runs once per combination of its generators."""
+        elements = [getattr(node, name) for name in ('elt', 'key', 'value') if hasattr(node, name)]
+        conditions = [condition for generator in node.generators for condition in generator.ifs]
+        self.visit_loop([generator.iter for generator in node.generators], elements + conditions)
+
+    visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp = visit_comprehension_node
+
+    def visit_Assign(self, node: ast.Assign):  # pylint: disable=invalid-name,missing-function-docstring
+        self.generic_visit(node)
+        for target in node.targets:
+            if isinstance(target, ast.Name) and self.is_frame(node.value):
+                self.frame_names.add(target.id)
+            elif isinstance(target, ast.Name):
+                self.frame_names.discard(target.id)
+
+    def visit_Call(self, node: ast.Call):  # pylint: disable=invalid-name,missing-function-docstring
+        attribute = node.func.attr if isinstance(node.func, ast.Attribute) else None
+        receiver = node.func.value if isinstance(node.func, ast.Attribute) else None
+        if attribute in ('iterrows', 'itertuples'):
+            self.add(attribute, node, self.rows)
+        elif attribute == 'apply' and get_axis(node) in (1, 'columns'):
+            self.add('row_apply', node, self.rows)
+        elif attribute in ('apply', 'map', 'applymap') and node.args and isinstance(node.args[0], (ast.Lambda, ast.Name)):
+            self.add('element_apply', node, self.rows)
+        elif attribute == 'copy' and self.multiplier > 1 and not node.keywords and self.is_frame(receiver):
+            self.add('copy_in_loop', node, self.rows * self.columns)
+        elif self.multiplier > 1 and (attribute in ('concat', 'merge') and is_pandas_module(receiver, self.namespace)
+                                      or attribute in ('append', 'merge') and self.is_frame(receiver)):
+            self.add('concat_in_loop', node, self.rows * self.columns)
+        self.generic_visit(node)
+
+    def visit_Subscript(self, node: ast.Subscript):  # pylint: disable=invalid-name,missing-function-docstring
+        if self.multiplier > 1 and isinstance(node.value, ast.Attribute) and node.value.attr in ('loc', 'iloc', 'at', 'iat'):
+            self.add('indexed_access', node, 1)
+        self.generic_visit(node)
+
+
+def guard_code(code: str, namespace: dict) -> tuple[str, GuardReport]:
+    """
+    Vectorizes the safe slow patterns of a snippet and estimates the cost of the others.
+
+    The snippet is parsed as the Python REPL tool would run it. Rewritable
+    `apply` and `map` calls are replaced by their vectorized equivalent (see
+    `VectorizingRewriter`), then the remaining slow patterns are costed on the
+    dataset bound to `df` (see `CostEstimator`). A snippet estimated to take
+    longer than `CODE_BUDGET_SECONDS` is rejected.
+
+    Args:
+        code (str): The snippet written by the agent.
+        namespace (dict): The variables of the REPL session, including `df`.
+
+    Returns:
+        tuple[str, GuardReport]: The code to run, unchanged if nothing was
+                                 rewritten, and the analysis of the snippet.
+    """
+    frame = get_frame(namespace)
+    report = GuardReport(code=code, rows=0 if frame is None else len(frame), rewrites=[], findings=[],
+                         estimated_seconds=0.0, rejected=False)
+    try:
+        tree = ast.parse(sanitize_input(code))
+    except SyntaxError:
+        return code, report
+    rewriter = VectorizingRewriter(namespace)
+    tree = ast.fix_missing_locations(rewriter.visit(tree))
+    estimator = CostEstimator(namespace)
+    estimator.visit(tree)
+    estimated_seconds = sum((finding['seconds'] for finding in estimator.findings), 0.0)
+    report.update(rewrites=rewriter.rewrites, findings=estimator.findings, estimated_seconds=round(estimated_seconds, 3),
+                  rejected=estimated_seconds > CODE_BUDGET_SECONDS)
+    return (ast.unparse(tree) if rewriter.rewrites else code), report
+
+
+def get_rejection_message(report: GuardReport) -> str:
+    """
+    Explains to the agent why its snippet was not run and how to rewrite it.
+
+    Args:
+        report (GuardReport): The analysis of a rejected snippet.
+
+    Returns:
+        str: An error message in the format of the Python REPL tool, with one hint per slow pattern.
+    """
+    patterns = sorted({finding['pattern'] for finding in report['findings']},
+                      key=lambda pattern: -sum(finding['seconds'] for finding in report['findings']
+                                               if finding['pattern'] == pattern))
+    hints = '\n'.join(f"- {PATTERN_HINTS[pattern]}" for pattern in patterns)
+    return (f"PerformanceError: The code was not run: it is estimated to take {report['estimated_seconds']:.1f} seconds "
+            f"on {report['rows']} rows, over the budget of {CODE_BUDGET_SECONDS:g} seconds. "
+            f"Rewrite it with vectorized operations:\n{hints}")
@@ -0,0 +1,312 @@
+"""Prompt Context"""
+import math
+import re
+
+from typing_extensions import TypedDict
+
+from tools.helper import WorkflowStage
+from tools.sampling import NUMBER_PATTERN, is_error_output
+
+
+CHARS_PER_TOKEN = 4
+"""Average characters per token used to estimate prompt sizes without calling the tokenizer."""
+
+STAGE_CONTEXT_BUDGETS = {
+    WorkflowStage.METADATA_EXTRACTOR_AGENT: 6000,
+    WorkflowStage.STRUCTURE_CREATOR_AGENT: 12000,
+    WorkflowStage.STATISTICS_GENERATOR_AGENT: 8000,
+    WorkflowStage.BUSINESS_INSIGHTS_AGENT: 12000,
+    WorkflowStage.WEB_DEVELOPER_AGENT: 12000,
+}
+"""Maximum estimated tokens of the context sections (metadata, statistics, insights) of each stage prompt."""
+
+SECTION_WEIGHTS = {'insights': 5, 'statistics': 3, 'metadata': 2, 'content': 1}
+"""Share of the stage budget reserved for each section when the sections do not all fit."""
+
+MIN_TRUNCATED_TOKENS = 200
+"""Smallest remaining budget worth filling with the head of an item that does not fit whole."""
+
+DROPPED_PREVIEW_CHARS = 120
+"""Number of characters of a dropped item kept in the context report."""
+
+LOW_VALUE_ITEMS = {'', 'none', 'nan', 'null', 'n/a', 'na', 'not available', 'unable to answer'}
+"""Normalized item texts carrying no information, such as the answer of a coder task that failed."""
+
+TABLE_RULE_PATTERN = re.compile(r':?-{3,}:?')
+"""Matches the dashes of a markdown table separator row."""
+
+SPACES_PATTERN = re.compile(r'[ \t]{2,}')
+"""Matches the padding markdown tables use to align their columns."""
+
+LONG_DECIMAL_PATTERN = re.compile(r'(?<![\w.])-?\d+\.\d{5,}(?![\d.])')
+"""Matches decimals printed with more than four fractional digits."""
+
+TERM_PATTERN = re.compile(r'`[^`\n]+`')
+"""Matches the column names and values quoted in an item."""
+
+
+class SectionReport(TypedDict):
+    """
+    The compaction of one context section of a prompt.
+    """
+    budget: int
+    tokens_before: int
+    tokens_after: int
+    duplicates: int
+    low_value: int
+    dropped: list[str]
+    truncated: list[str]
+
+
+class ContextReport(TypedDict):
+    """
+    The compaction of the context sections of a prompt, recorded in the run history.
+    """
+    stage: str
+    budget: int
+    tokens_before: int
+    tokens_after: int
+    sections: dict[str, SectionReport]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens of a text.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def round_decimal(match: re.Match) -> str:
+    """Shortens a decimal to four fractional digits, or four significant digits below one."""
+    value = float(match.group())
+    return str(float(f'{value:.4g}') if abs(value) < 1 else round(value, 4))
+
+
+def compact_item(item) -> str:
+    """
+    Rewrites a context item with fewer tokens and the same facts.
+
+    Markdown tables lose their alignment padding and long separator rows,
+    long decimals are shortened and repeated blank lines are removed.
+
+    Args:
+        item: The metadata, statistics or insight item.
+
+    Returns:
+        str: The compacted text of the item.
+    """
+    lines = []
+    for line in str(item).strip().splitlines():
+        line = line.rstrip()
+        if line.lstrip().startswith('|'):
+            line = TABLE_RULE_PATTERN.sub('---', SPACES_PATTERN.sub(' ', line.strip()))
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return LONG_DECIMAL_PATTERN.sub(round_decimal, '\n'.join(lines))
+
+
+def get_item_key(text: str) -> str:
+    """Normalizes an item for duplicate detection, ignoring case, whitespace and surrounding punctuation."""
+    return ' '.join(text.lower().split()).strip('`\'".:;- ')
+
+
+def get_item_lines(text: str) -> tuple[str, ...]:
+    """Returns the non-empty lines of an item, each normalized like `get_item_key`."""
+    return tuple(key for key in map(get_item_key, text.splitlines()) if key)
+
+
+def is_contained_in(lines: tuple[str, ...], other_lines: tuple[str, ...]) -> bool:
+    """Checks whether the lines of an item appear, whole and in order, as a block of a longer item."""
+    return len(other_lines) > len(lines) and any(other_lines[start:start + len(lines)] == lines
+                                                 for start in range(len(other_lines) - len(lines) + 1))
+
+
+def is_low_value_item(text: str) -> bool:
+    """
+    Checks whether an item carries no information for later stages.
+
+    Args:
+        text (str): The compacted item.
+
+    Returns:
+        bool: True for empty answers such as `None`, and for error messages.
+    """
+    return get_item_key(text) in LOW_VALUE_ITEMS or is_error_output(text.split('\n\n')[-1])
+
+
+def get_item_score(text: str) -> float:
+    """
+    Ranks an item by the density of the facts it states.
+
+    Args:
+        text (str): The compacted item.
+
+    Returns:
+        float: The number of distinct numbers and quoted terms, relative to the
+               square root of the item size, so tables are not penalized for their length.
+    """
+    facts = set(NUMBER_PATTERN.findall(text)) | set(TERM_PATTERN.findall(text))
+    return (len(facts) + 1) / math.sqrt(estimate_tokens(text) + 1)
+
+
+def truncate_item(text: str, budget: int) -> str:
+    """
+    Keeps the leading lines of an item that fit a token budget.
+
+    Args:
+        text (str): The compacted item.
+        budget (int): The tokens available for the item.
+
+    Returns:
+        str: The head of the item, followed by the number of omitted lines.
+    """
+    lines = text.splitlines()
+    kept, used = [], 0
+    for line in lines:
+        used += estimate_tokens(line + '\n')
+        if used > budget - 10:
+            break
+        kept.append(line)
+    return '\n'.join(kept + [f'... ({len(lines) - len(kept)} more lines omitted)'])
+
+
+def deduplicate_items(texts: list[str]) -> tuple[list[str], int, int]:
+    """
+    Removes low-value items, repeated items and items contained in a longer one.
+
+    An item is contained in another only if its lines are whole lines of the
+    other, so an answer such as `Mean: 1` is not lost to one reading `Mean: 10`.
+
+    Args:
+        texts (list[str]): The compacted items, in their original order.
+
+    Returns:
+        tuple[list[str], int, int]: The remaining items in order, and the
+                                    number of duplicate and low-value items removed.
+    """
+    unique, keys = [], []
+    duplicates = low_value = 0
+    for text in texts:
+        if is_low_value_item(text):
+            low_value += 1
+            continue
+        key = get_item_key(text)
+        if key in keys:
+            duplicates += 1
+            continue
+        unique.append(text)
+        keys.append(key)
+    lines = [get_item_lines(text) for text in unique]
+    kept = [text for text, item_lines in zip(unique, lines)
+            if not any(is_contained_in(item_lines, other_lines) for other_lines in lines)]
+    return kept, duplicates + len(unique) - len(kept), low_value
+
+
+def fit_section(texts: list[str], budget: int) -> tuple[list[str], list[str], list[str]]:
+    """
+    Selects the highest-ranked items of a section that fit a token budget.
+
+    When budget remains after the whole items are selected, the head of the
+    best item that did not fit is kept as well.
+
+    Args:
+        texts (list[str]): The deduplicated items, in their original order.
+        budget (int): The tokens available for the section.
+
+    Returns:
+        tuple[list[str], list[str], list[str]]: The kept items in their
+                                                original order, and the dropped
+                                                and truncated items.
+    """
+    tokens = [estimate_tokens(text) + 1 for text in texts]
+    ranking = sorted(range(len(texts)), key=lambda index: (-get_item_score(texts[index]), index))
+    kept, used = {}, 0
+    for index in ranking:
+        if used + tokens[index] <= budget:
+            kept[index], used = texts[index], used + tokens[index]
+    truncated = []
+    remaining = [index for index in ranking if index not in kept]
+    if remaining and budget - used >= MIN_TRUNCATED_TOKENS:
+        kept[remaining[0]] = truncate_item(texts[remaining[0]], budget - used)
+        truncated.append(texts[remaining[0]])
+        remaining = remaining[1:]
+    return [kept[index] for index in sorted(kept)], [texts[index] for index in remaining], truncated
+
+
+def allocate_budget(needs: dict[str, int], budget: int) -> dict[str, int]:
+    """
+    Splits a stage budget between its sections by `SECTION_WEIGHTS`.
+
+    Sections needing less than their share give the rest to the others.
+
+    Args:
+        needs (dict[str, int]): The tokens of each section after deduplication.
+        budget (int): The tokens available for all sections.
+
+    Returns:
+        dict[str, int]: The budget of each section.
+    """
+    allocation = {section: 0 for section in needs}
+    pending = {section for section, need in needs.items() if need > 0}
+    remaining = budget
+    while pending and remaining > 0:
+        weights = sum(SECTION_WEIGHTS.get(section, 1) for section in pending)
+        shares = {section: remaining * SECTION_WEIGHTS.get(section, 1) // weights for section in pending}
+        satisfied = {section for section in pending if needs[section] - allocation[section] <= shares[section]}
+        if not satisfied:
+            for section in pending:
+                allocation[section] += shares[section]
+            break
+        for section in satisfied:
+            remaining -= needs[section] - allocation[section]
+            allocation[section] = needs[section]
+        pending -= satisfied
+    return allocation
+
+
+def build_context(stage: WorkflowStage, sections: dict[str, list]) -> tuple[dict[str, str], ContextReport]:
+    """
+    Compacts the context sections of a stage prompt to fit the stage budget.
+
+    Every item is compacted, then low-value, repeated and contained items are
+    removed. If the sections still exceed `STAGE_CONTEXT_BUDGETS`, each section
+    keeps its highest-ranked items within its share of the budget. The kept
+    items stay in their original order.
+
+    Args:
+        stage (WorkflowStage): The stage the prompt is rendered for.
+        sections (dict[str, list]): The items of each section, keyed by prompt variable.
+
+    Returns:
+        tuple[dict[str, str], ContextReport]: The rendered text of each section,
+                                              and the report of what was removed.
+    """
+    budget = STAGE_CONTEXT_BUDGETS[stage]
+    items, reports = {}, {}
+    for section, values in sections.items():
+        values = values if isinstance(values, list) else [values] if values else []
+        texts, duplicates, low_value = deduplicate_items([compact_item(value) for value in values])
+        items[section] = texts
+        reports[section] = SectionReport(budget=0, tokens_before=estimate_tokens('\n\n'.join(map(str, values))),
+                                         tokens_after=0, duplicates=duplicates, low_value=low_value,
+                                         dropped=[], truncated=[])
+    needs = {section: sum(estimate_tokens(text) + 1 for text in texts) for section, texts in items.items()}
+    allocation = needs if sum(needs.values()) <= budget else allocate_budget(needs, budget)
+
+    rendered = {}
+    for section, texts in items.items():
+        kept, dropped, truncated = fit_section(texts, allocation[section])
+        rendered[section] = '\n\n'.join(kept)
+        reports[section].update(budget=allocation[section], tokens_after=estimate_tokens(rendered[section]),
+                                dropped=[text[:DROPPED_PREVIEW_CHARS] for text in dropped],
+                                truncated=[text[:DROPPED_PREVIEW_CHARS] for text in truncated])
+    return rendered, ContextReport(stage=stage.value, budget=budget,
+                                   tokens_before=sum(report['tokens_before'] for report in reports.values()),
+                                   tokens_after=sum(report['tokens_after'] for report in reports.values()),
+                                   sections=reports)
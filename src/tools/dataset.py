@@ -0,0 +1,133 @@
+"""Dataset Registry"""
+import hashlib
+import os
+from functools import lru_cache
+
+import pandas as pd
+from pyarrow import feather
+from typing_extensions import TypedDict
+
+
+DATASET_DIR = './logs/.datasets'
+"""Directory where registered datasets are stored as uncompressed Arrow files."""
+
+
+class DatasetHandle(TypedDict):
+    """
+    Lightweight reference to a registered dataset, carried in the agent state.
+    """
+    hash: str
+    path: str
+
+
+def new_dataset_digest(df: pd.DataFrame) -> "hashlib._Hash":
+    """
+    Starts a content digest seeded with the column names and dtypes of a DataFrame.
+
+    Args:
+        df (pd.DataFrame): The DataFrame, or its first chunk, defining the schema.
+
+    Returns:
+        hashlib._Hash: A SHA-256 digest to feed rows into with `update_dataset_digest`.
+    """
+    digest = hashlib.sha256()
+    digest.update('\x1f'.join(map(str, df.columns)).encode('utf-8'))
+    digest.update('\x1f'.join(map(str, df.dtypes)).encode('utf-8'))
+    return digest
+
+
+def update_dataset_digest(digest: "hashlib._Hash", df: pd.DataFrame):
+    """
+    Feeds the rows of a DataFrame, or of one chunk of it, into a content digest.
+
+    Rows are hashed in a single vectorized pass with `pd.util.hash_pandas_object`,
+    so feeding a dataset chunk by chunk yields the same digest as feeding it whole.
+
+    Args:
+        digest (hashlib._Hash): The digest returned by `new_dataset_digest`.
+        df (pd.DataFrame): The rows to add.
+    """
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+
+
+def get_dataset_hash(df: pd.DataFrame) -> str:
+    """
+    Computes a content hash of a DataFrame.
+
+    The hash covers the column names, the dtypes and the row values.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to fingerprint.
+
+    Returns:
+        str: The hex digest identifying the DataFrame content.
+    """
+    digest = new_dataset_digest(df)
+    update_dataset_digest(digest, df)
+    return digest.hexdigest()
+
+
+def get_dataset_path(dataset_hash: str) -> str:
+    """
+    Returns the on-disk location of a registered dataset.
+
+    Args:
+        dataset_hash (str): The content hash of the dataset.
+
+    Returns:
+        str: The path of the Arrow file holding the dataset.
+    """
+    return os.path.join(DATASET_DIR, f'{dataset_hash}.arrow')
+
+
+def register_dataset(df: pd.DataFrame) -> DatasetHandle:
+    """
+    Stores a DataFrame once in the registry and returns a handle to it.
+
+    The DataFrame is written as an uncompressed Arrow (Feather v2) file named
+    after its content hash, so registering the same data twice is a no-op and
+    the file can later be memory-mapped instead of parsed.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to register.
+
+    Returns:
+        DatasetHandle: The handle to place in `AgentState['df']`.
+    """
+    dataset_hash = get_dataset_hash(df)
+    path = get_dataset_path(dataset_hash)
+    if not os.path.exists(path):
+        os.makedirs(DATASET_DIR, exist_ok=True)
+        feather.write_feather(df.reset_index(drop=True), path + '.tmp', compression='uncompressed')
+        os.replace(path + '.tmp', path)
+    return DatasetHandle(hash=dataset_hash, path=path)
+
+
+@lru_cache(maxsize=4)
+def _read_dataset(path: str) -> pd.DataFrame:
+    """
+    Memory-maps a registered Arrow file and converts it to a DataFrame once per process.
+
+    Columns compacted to the pandas `string` dtype keep their Arrow storage;
+    text columns stored as `object` stay `object`.
+    """
+    table = feather.read_table(path, memory_map=True)
+    with pd.option_context('mode.string_storage', 'pyarrow'):
+        return table.to_pandas(split_blocks=True)
+
+
+def load_dataset(handle: DatasetHandle) -> pd.DataFrame:
+    """
+    Returns a DataFrame view of a registered dataset.
+
+    The Arrow file is memory-mapped and converted on first access only; later
+    calls for the same handle return a shallow copy of the cached frame, so
+    every node gets its own DataFrame without re-reading or re-parsing data.
+
+    Args:
+        handle (DatasetHandle): The handle returned by `register_dataset`.
+
+    Returns:
+        pd.DataFrame: A shallow copy of the registered dataset.
+    """
+    return _read_dataset(handle['path']).copy(deep=False)
@@ -1,10 +1,17 @@
 """Helper Functions"""
+import asyncio
+import hashlib
+import os
+import threading
 from enum import Enum
+from typing import Annotated
 
-from langchain.chat_models import init_chat_model
-from langgraph.graph import END
 from typing_extensions import TypedDict
 
+from tools.dataset import DatasetHandle
+from tools.rate_limiter import RATE_LIMIT_CALLBACK, RATE_LIMITER
+from tools.telemetry import TelemetryCallbackHandler
+
 
 class WorkflowStage(Enum):
     """
@@ -26,9 +33,25 @@ class NodeName(Enum):
     STATISTICS_GENERATOR_AGENT = "Statistician Agent"
     PYTHON_PANDAS_CODER_AGENT = "Python Coder Agent - Pandas"
     PYTHON_STATISTICS_CODER_AGENT = "Python Coder Agent - Statistics"
+    PYTHON_PANDAS_TASK_AGENT = "Python Coder Agent - Pandas Task"
+    PYTHON_STATISTICS_TASK_AGENT = "Python Coder Agent - Statistics Task"
     BUSINESS_INSIGHTS_AGENT = "Business Insight Agent"
     WEB_DEVELOPER_AGENT = "Web Developer Agent"
 
+def merge_task_results(left: list, right: list | None) -> list:
+    """
+    Reducer collecting the results of fanned-out pandas tasks.
+
+    Args:
+        left (list): The results collected so far.
+        right (list | None): The results written by a node, or None to clear them.
+
+    Returns:
+        list: The combined results, or an empty list when cleared.
+    """
+    return [] if right is None else left + right
+
+
 class AgentState(TypedDict):
     """
     State for the agent graph.
@@ -37,9 +60,35 @@ class AgentState(TypedDict):
     metadata: list
     statistics: list
     insights: list
-    df: list
+    df: DatasetHandle
     stage: list[WorkflowStage]
     history: list
+    task_results: Annotated[list, merge_task_results]
+    memo: list
+
+
+class PandasTaskState(TypedDict):
+    """
+    State sent to a fanned-out pandas task node.
+    """
+    task: str
+    index: int
+    total: int
+    df: DatasetHandle
+
+
+class TaskResult(TypedDict):
+    """
+    Outcome of a single Pandas DataFrame agent task.
+    """
+    task: str
+    output: str
+    error: str | None
+    sampling: dict | None
+    replayed: bool
+    guard: list
+    seconds: float
+    memoized: bool
 
 
 class ConfigSchema(TypedDict):
@@ -47,9 +96,37 @@ class ConfigSchema(TypedDict):
     Configuration for the agent graph.
     """
     uuid: str
-    agent_sleep_seconds: int
+    requests_per_minute: int
+    tokens_per_minute: int
     temperature: float
+    max_concurrency: int
+    sample_size: int
+    cache_mode: str
+    target_column: str
+    problem_type: str
+    use_profiler: bool
+    use_statistics_engine: bool
+    replay_plans: bool
+    fan_out_tasks: bool
+
+
+MODEL_NAME = "models/gemini-2.5-pro"
+"""The chat model used by every agent."""
+
+MODEL_MAX_RETRIES = int(os.getenv('MODEL_MAX_RETRIES', '6'))
+"""Retries of a single model call rejected by the provider, read from the `MODEL_MAX_RETRIES` environment variable."""
 
+TELEMETRY_CALLBACK = TelemetryCallbackHandler(MODEL_NAME)
+"""The callback handler recording model latency, tokens and cost into the open telemetry spans."""
+
+_thread_state = threading.local()
+"""Holds the event loop reused by the runs and agent calls of each thread."""
+
+_loop_pools: dict[asyncio.AbstractEventLoop | None, dict] = {}
+"""Model clients and agents bound to an event loop, keyed by the loop they were created on."""
+
+_loop_pools_lock = threading.Lock()
+"""Guards `_loop_pools` against the threads looking up their pools at the same time."""
 
 WORKFLOW_SEQUENCE = [
     WorkflowStage.METADATA_EXTRACTOR_AGENT,
@@ -61,25 +138,111 @@ WORKFLOW_SEQUENCE = [
     WorkflowStage.WEB_DEVELOPER_AGENT
 ]
 
-def get_model(temperature: float = 1.0):
+PLANNING_STAGES = [
+    WorkflowStage.METADATA_EXTRACTOR_AGENT,
+    WorkflowStage.STATISTICS_GENERATOR_AGENT
+]
+"""Stages whose task lists depend only on the dataset schema and can be replayed."""
+
+def get_running_loop() -> asyncio.AbstractEventLoop | None:
     """
-    Initializes and returns a chat model instance from a specified provider.
+    Returns the event loop running in the current thread.
+
+    Returns:
+        asyncio.AbstractEventLoop | None: The running loop, or None outside of a coroutine.
+    """
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the event loop of the current thread, creating it on first use.
+
+    Runs streamed from the same thread, and the synchronous agent wrappers
+    called from it, share the loop, so the pooled model clients and agents,
+    whose connections are bound to a loop, are reused from one call to the next.
+
+    Returns:
+        asyncio.AbstractEventLoop: The event loop of the thread.
+    """
+    if getattr(_thread_state, 'loop', None) is None or _thread_state.loop.is_closed():
+        _thread_state.loop = asyncio.new_event_loop()
+    return _thread_state.loop
+
+def get_loop_pool() -> dict:
+    """
+    Returns the objects pooled for the event loop running in the current thread.
+
+    Pools of loops that have since been closed are dropped, so neither the
+    loops nor the clients bound to them are kept alive.
+
+    Returns:
+        dict: The pooled objects of the running loop, or of synchronous callers outside of a coroutine.
+    """
+    loop = get_running_loop()
+    with _loop_pools_lock:
+        for closed in [key for key in _loop_pools if key is not None and key.is_closed()]:
+            del _loop_pools[closed]
+        return _loop_pools.setdefault(loop, {})
+
+def _get_pooled_model(model_name: str, temperature: float):
+    """Initializes one chat model client per model and temperature in the pool of the running event loop."""
+    pool = get_loop_pool()
+    key = ('model', model_name, temperature)
+    if key not in pool:
+        from langchain.chat_models import init_chat_model  # pylint: disable=import-outside-toplevel
+        pool[key] = init_chat_model(
+            model=model_name,
+            model_provider="google_genai",
+            temperature=temperature,
+            rate_limiter=RATE_LIMITER,
+            max_retries=MODEL_MAX_RETRIES,
+            callbacks=[RATE_LIMIT_CALLBACK, TELEMETRY_CALLBACK]
+        )
+    return pool[key]
+
+def get_quota_scope(model_name: str = MODEL_NAME) -> str:
+    """
+    Returns the key of the provider quota the calls of this process are counted against.
+
+    Args:
+        model_name (str, optional): The model called. Defaults to `MODEL_NAME`.
+
+    Returns:
+        str: A digest of the API key and the model, never the key itself.
+    """
+    return hashlib.sha256(f"{os.getenv('GOOGLE_API_KEY', '')}:{model_name}".encode('utf-8')).hexdigest()
+
+def get_model(temperature: float = 1.0, model_name: str = MODEL_NAME):
+    """
+    Returns a pooled chat model instance from a specified provider.
 
     This function configures and provides an LLM instance, specifically a
-    Google GenAI model, with a given temperature setting.
+    Google GenAI model, with a given temperature setting. Every instance shares
+    the process-wide `RATE_LIMITER`, so all agents draw from one requests and
+    tokens per minute budget, and reports its calls to the run telemetry. A
+    call rejected for exceeding the quota is retried by the client itself, up
+    to `MODEL_MAX_RETRIES` times, after pausing the limiter.
+
+    Clients are created once per model and temperature and reused by every
+    node and run, keeping their connections open. The asynchronous
+    connection of a client is bound to the event loop it was opened on, so
+    clients used from a coroutine are pooled per event loop as well (see
+    `get_loop_pool`), and are dropped with their loop once it is closed. The chat
+    model integrations are imported on the first call, so the Streamlit pages
+    importing this module do not load them.
 
     Args:
         temperature (float, optional): The temperature for the model's sampling,
                                        controlling randomness. Defaults to 1.0.
+        model_name (str, optional): The model to use. Defaults to `MODEL_NAME`.
 
     Returns:
         An initialized chat model instance.
     """
-    return init_chat_model(
-        model="models/gemini-2.5-pro",
-        model_provider="google_genai",
-        temperature=temperature
-    )
+    return _get_pooled_model(model_name, temperature)
 
 def get_next_stage_mapper(history_stage: list[WorkflowStage]) -> WorkflowStage:
     """
@@ -97,6 +260,7 @@ def get_next_stage_mapper(history_stage: list[WorkflowStage]) -> WorkflowStage:
         WorkflowStage | object: The next `WorkflowStage` enum member to execute, or
                                 `END` if the sequence is complete.
     """
+    from langgraph.graph import END  # pylint: disable=import-outside-toplevel
     for index, _ in enumerate(WORKFLOW_SEQUENCE):
         if ''.join(map(str, WORKFLOW_SEQUENCE[:index])) == ''.join(map(str, history_stage)):
             return WORKFLOW_SEQUENCE[index]
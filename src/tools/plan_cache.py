@@ -0,0 +1,145 @@
+"""Analysis Plan Cache"""
+import hashlib
+import json
+import sqlite3
+import time
+
+import pandas as pd
+
+from utils.sqlite_store import SQLiteStore
+
+
+PLAN_CACHE_PATH = './logs/.cache/plan_cache.sqlite'
+"""Location of the SQLite database holding analysis plans and captured pandas code."""
+
+
+def get_logical_dtype(dtype) -> str:
+    """
+    Returns the dtype a column had at ingestion, before `utils.ingestion.compact_dataset` narrowed it.
+
+    Compaction depends on the values of an extract: a column fits `int16` or
+    parses as dates one day and not the next. Fingerprinting the dtypes
+    compaction started from keeps daily extracts on one fingerprint.
+
+    Args:
+        dtype: The dtype of a column of the run's dataset.
+
+    Returns:
+        str: `int64` for integers, `float64` for floats, `object` for text,
+             categorical and datetime columns, which compaction only derives
+             from text, and the dtype name otherwise.
+    """
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'int64'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'float64'
+    if (isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(dtype)
+            or pd.api.types.is_datetime64_any_dtype(dtype)):
+        return 'object'
+    return str(dtype)
+
+
+def get_schema_fingerprint(df: pd.DataFrame, target_column: str | None, problem_type: str | None) -> str:
+    """
+    Fingerprints the schema of a dataset together with the run's modelling setup.
+
+    Unlike the dataset content hash, the fingerprint ignores row values, so
+    daily extracts with the same layout share one fingerprint.
+
+    Args:
+        df (pd.DataFrame): The dataset of the run.
+        target_column (str | None): The target column of the run.
+        problem_type (str | None): The `ModelClasses` value of the run.
+
+    Returns:
+        str: The hex digest of the column names, logical dtypes (see
+             `get_logical_dtype`), target and problem type.
+    """
+    schema = {
+        'columns': list(map(str, df.columns)),
+        'dtypes': list(map(get_logical_dtype, df.dtypes)),
+        'target_column': target_column,
+        'problem_type': problem_type,
+    }
+    return hashlib.sha256(json.dumps(schema).encode('utf-8')).hexdigest()
+
+
+class PlanCache(SQLiteStore):
+    """
+    On-disk store of the task lists planned per stage and of the code that answered each task.
+    """
+
+    autocommit = False
+    """The statements of a lookup or an insertion and its evictions commit together."""
+
+    def __init__(self, path: str = PLAN_CACHE_PATH):
+        super().__init__(path)
+
+    def create_schema(self, connection: sqlite3.Connection):
+        """Creates the plan and task code tables."""
+        connection.execute("CREATE TABLE IF NOT EXISTS plans "
+                           "(fingerprint TEXT, stage TEXT, tasks TEXT, created REAL, PRIMARY KEY (fingerprint, stage))")
+        connection.execute("CREATE TABLE IF NOT EXISTS task_code "
+                           "(fingerprint TEXT, task TEXT, code TEXT, created REAL, PRIMARY KEY (fingerprint, task))")
+
+    def get_plan(self, fingerprint: str, stage: str) -> list | None:
+        """
+        Looks up the tasks planned for a stage on a matching schema.
+
+        Args:
+            fingerprint (str): The fingerprint built by `get_schema_fingerprint`.
+            stage (str): The `WorkflowStage` value of the planning stage.
+
+        Returns:
+            list | None: The stored task list, or None if the stage was never planned.
+        """
+        with self._lock, self._connect() as connection:
+            row = connection.execute("SELECT tasks FROM plans WHERE fingerprint = ? AND stage = ?",
+                                     (fingerprint, stage)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set_plan(self, fingerprint: str, stage: str, tasks: list):
+        """
+        Stores the tasks planned for a stage.
+
+        Args:
+            fingerprint (str): The fingerprint built by `get_schema_fingerprint`.
+            stage (str): The `WorkflowStage` value of the planning stage.
+            tasks (list): The task list produced by the planning agent.
+        """
+        with self._lock, self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO plans VALUES (?, ?, ?, ?)",
+                               (fingerprint, stage, json.dumps(tasks), time.time()))
+
+    def get_code(self, fingerprint: str, task: str) -> list[str] | None:
+        """
+        Looks up the pandas code that answered a task on a matching schema.
+
+        Args:
+            fingerprint (str): The fingerprint built by `get_schema_fingerprint`.
+            task (str): The natural-language task.
+
+        Returns:
+            list[str] | None: The code snippets in execution order, or None if none were captured.
+        """
+        with self._lock, self._connect() as connection:
+            row = connection.execute("SELECT code FROM task_code WHERE fingerprint = ? AND task = ?",
+                                     (fingerprint, task)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set_code(self, fingerprint: str, task: str, code_list: list[str]):
+        """
+        Stores the pandas code that answered a task.
+
+        Args:
+            fingerprint (str): The fingerprint built by `get_schema_fingerprint`.
+            task (str): The natural-language task.
+            code_list (list[str]): The code snippets the agent ran successfully.
+        """
+        with self._lock, self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO task_code VALUES (?, ?, ?, ?)",
+                               (fingerprint, task, json.dumps(code_list), time.time()))
+
+
+PLAN_CACHE = PlanCache()
+"""The plan cache shared by every agent in the process."""
@@ -0,0 +1,137 @@
+"""Dataset Profiler"""
+import re
+
+import pandas as pd
+
+from utils.helper import ModelClasses
+
+
+QUANTILES = [0.0, 0.25, 0.5, 0.75, 1.0]
+"""Quantiles reported for every numeric column."""
+
+STANDARD_STEP_PREFIX = (r"(?:(?:calculate|compute|get|find|check|count|list|show|display|determine|identify|print|"
+                        r"obtain|generate|report|inspect|examine|view|retrieve|extract)\s+)?(?:(?:for|the|any|total)\s+)*")
+"""Matches the verb and articles opening a standard metadata step."""
+
+STANDARD_STEP_SCOPE = (r"(?:\s+(?:of|in|for|across|per|from|within)\s+(?:(?:each|every|all|the|numeric|numerical|categorical)\s+)*"
+                       r"(?:columns?|features?|variables?|dataset|dataframe|data))*")
+"""Matches the columns or dataset a standard metadata step applies to."""
+
+PROFILED_STEP_PATTERNS = [
+    re.compile(rf"{STANDARD_STEP_PREFIX}(?:{pattern}){STANDARD_STEP_SCOPE}") for pattern in (
+        r"shape|dimensions?|(?:number|count) of (?:rows|columns)(?: and (?:rows|columns))?",
+        r"data ?types?|dtypes?|column types?",
+        r"(?:(?:number|count|percentage|proportion) of )?(?:missing|null|nan)(?: values?)?(?: counts?| percentages?)?",
+        r"(?:(?:number|count) of )?(?:unique|distinct)(?: values?)?(?: counts?)?|cardinality|nunique",
+        r"(?:descriptive|summary|basic) statistics|describe|quantiles|percentiles|(?:min|minimum) and (?:max|maximum)(?: values?)?",
+        r"memory usage",
+        r"(?:(?:number|count) of )?duplicated? rows",
+        r"(?:distribution|value counts|class balance) of (?:the )?target(?: column| variable)?(?: \w+)?|"
+        r"target(?: column| variable)?(?: \w+)? (?:distribution|value counts|class balance)",
+    )
+]
+"""Patterns matching the whole of a metadata step already answered by `profile_dataset`."""
+
+
+def is_profiled_step(step: str) -> bool:
+    """
+    Checks whether a metadata step is already covered by the built-in profile.
+
+    Only steps asking for nothing but a standard computation are matched, so
+    follow-up steps mentioning the same words, such as identifier detection
+    or missing-value patterns, are kept.
+
+    Args:
+        step (str): A metadata extraction step proposed by the LLM.
+
+    Returns:
+        bool: True if the step asks for standard metadata computed by `profile_dataset`.
+    """
+    text = ' '.join(re.sub(r"[`'\"]|\bdf\.|\(\)|[.?!:;]+$", '', str(step).strip().lower()).split())
+    return any(pattern.fullmatch(text) for pattern in PROFILED_STEP_PATTERNS)
+
+
+def get_column_profile(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Builds a per-column profile table in a single vectorized pass over the frame.
+
+    Args:
+        df (pd.DataFrame): The dataset to profile.
+
+    Returns:
+        pd.DataFrame: One row per column with dtype, null counts, cardinality,
+                      memory usage and, for numeric columns, mean and quantiles.
+    """
+    row_count = max(len(df), 1)
+    null_count = df.isna().sum()
+    profile = pd.DataFrame({
+        'dtype': df.dtypes.astype(str),
+        'non_null': df.notna().sum(),
+        'nulls': null_count,
+        'null_pct': (null_count / row_count * 100).round(2),
+        'unique': df.nunique(dropna=True),
+        'memory_kb': (df.memory_usage(index=False, deep=True) / 1024).round(1),
+    })
+    numeric_df = df.select_dtypes(include='number')
+    if not numeric_df.empty:
+        quantiles = numeric_df.quantile(QUANTILES).T
+        quantiles.columns = ['min', 'p25', 'median', 'p75', 'max']
+        profile = profile.join(numeric_df.mean().rename('mean').to_frame().join(quantiles).round(4))
+    return profile
+
+
+def get_target_profile(df: pd.DataFrame, target_column: str, problem_type: str | None) -> str:
+    """
+    Describes the distribution of the target column according to the problem type.
+
+    Categorical-like targets (classification, or non-numeric columns) are
+    summarized with value counts and shares; numeric targets with
+    descriptive statistics, skewness and kurtosis.
+
+    Args:
+        df (pd.DataFrame): The dataset to profile.
+        target_column (str): The name of the target column.
+        problem_type (str | None): The `ModelClasses` value selected for the run.
+
+    Returns:
+        str: A markdown description of the target distribution.
+    """
+    target = df[target_column]
+    if problem_type == ModelClasses.CLASSIFICATION.value or not pd.api.types.is_numeric_dtype(target):
+        counts = target.value_counts(dropna=False)
+        distribution = pd.DataFrame({'count': counts, 'share_pct': (counts / max(len(target), 1) * 100).round(2)})
+        return (f"Target Column `{target_column}` Distribution ({counts.size} classes, top 20 shown):\n"
+                + distribution.head(20).to_markdown())
+    summary = target.describe().to_frame().T
+    summary['skew'] = target.skew()
+    summary['kurtosis'] = target.kurtosis()
+    return f"Target Column `{target_column}` Distribution:\n" + summary.round(4).to_markdown(index=False)
+
+
+def profile_dataset(df: pd.DataFrame, target_column: str | None = None, problem_type: str | None = None) -> list[str]:
+    """
+    Computes the standard metadata of a dataset deterministically, without any LLM calls.
+
+    The profile covers the dataset shape, memory usage, duplicate rows, a
+    per-column table of dtypes, null counts, cardinality and quantiles, and the
+    distribution of the target column. Each item is a self-contained string so
+    it can be placed in `AgentState['metadata']` alongside LLM-derived metadata.
+
+    Args:
+        df (pd.DataFrame): The dataset to profile.
+        target_column (str | None, optional): The target column of the run.
+        problem_type (str | None, optional): The `ModelClasses` value of the run.
+
+    Returns:
+        list[str]: The list of metadata items.
+    """
+    duplicate_count = int(df.duplicated().sum())
+    metadata = [
+        f"Dataset Dimensions: {df.shape[0]} rows x {df.shape[1]} columns",
+        f"Memory Usage: {df.memory_usage(index=True, deep=True).sum() / 1024 ** 2:.2f} MB",
+        f"Duplicate Rows: {duplicate_count} ({duplicate_count / max(len(df), 1) * 100:.2f}%)",
+        "Column Details:\n" + get_column_profile(df).to_markdown(),
+    ]
+    if target_column is not None and target_column in df.columns:
+        metadata.append(get_target_profile(df, target_column, problem_type))
+    return metadata
@@ -1,9 +1,10 @@
 """Prompt Structure"""
 from langchain_core.prompts import PromptTemplate
 
+from tools.context import ContextReport, build_context
 from tools.helper import AgentState, WorkflowStage
 from tools.schema import PARSER_MAPPER
-from tools.support_tools import common_tools
+from tools.support_tools import get_common_tools
 
 
 """Prompt for the Metadata Extractor Agent."""
@@ -12,11 +13,19 @@ METADATA_EXTRACTOR_PROMPT = PromptTemplate(
     template=(
         "ROLE : You are a proficient Data Analyst\n"
         "TOOLS : {tool_list}\n"
+        "{computed_metadata}"
         "GOAL: Write small steps of operations to extract metadata of the dataset\n"
         "OUTPUT FORMAT : {output_format}"
     ),
 )
 
+COMPUTED_METADATA_SECTION = (
+    "COMPUTED METADATA : {metadata}\n"
+    "EXCLUDE : Metadata already listed in the computed metadata, such as shape, data types, null counts, "
+    "cardinality, quantiles, memory usage, duplicate rows and target distribution.\n"
+)
+"""Lines of the Metadata Extractor prompt listing the built-in profile, rendered only when the profile was computed."""
+
 """Prompt for the Structured File Generator Agent."""
 STRUCTURED_FILE_PROMPT = PromptTemplate(
     input_variables=["content", "output_format"],
@@ -80,7 +89,42 @@ PROMPT_MAPPER = {
 }
 
 
-def get_prompt(state: AgentState):
+STAGE_DEFAULT_TASKS = {
+    WorkflowStage.METADATA_EXTRACTOR_AGENT: "Plan the metadata extraction steps for this dataset.",
+    WorkflowStage.STRUCTURE_CREATOR_AGENT: "Structure the computed metadata given in the content.",
+    WorkflowStage.STATISTICS_GENERATOR_AGENT: "Plan the statistical analysis steps for this dataset.",
+    WorkflowStage.BUSINESS_INSIGHTS_AGENT: "Derive the business insights supported by the metadata and statistics given above.",
+    WorkflowStage.WEB_DEVELOPER_AGENT: "Build the report from the insights, metadata and statistics given above.",
+}
+"""The task sent to a stage whose previous stage left no task, e.g. after the statistics engine computed every test."""
+
+STAGE_SECTIONS = {
+    WorkflowStage.METADATA_EXTRACTOR_AGENT: ['metadata'],
+    WorkflowStage.STRUCTURE_CREATOR_AGENT: ['content'],
+    WorkflowStage.STATISTICS_GENERATOR_AGENT: ['metadata'],
+    WorkflowStage.BUSINESS_INSIGHTS_AGENT: ['metadata', 'statistics'],
+    WorkflowStage.WEB_DEVELOPER_AGENT: ['insights', 'metadata', 'statistics']
+}
+"""The context sections of the state rendered into the prompt of each stage."""
+
+
+def get_task_message(stage: WorkflowStage, task_list: list) -> str:
+    """
+    Renders the tasks of a stage as the user message of its agent.
+
+    Args:
+        stage (WorkflowStage): The stage the message is sent to.
+        task_list (list): The tasks left by the previous stage.
+
+    Returns:
+        str: The non-empty tasks separated by blank lines, or the default task
+             of the stage from `STAGE_DEFAULT_TASKS` if there is none, since
+             the model rejects empty messages.
+    """
+    return '\n\n'.join(str(task) for task in task_list if str(task).strip()) or STAGE_DEFAULT_TASKS[stage]
+
+
+def get_prompt(state: AgentState) -> tuple[str, ContextReport]:
     """
     Dynamically generates a prompt for the current agent based on the workflow state.
 
@@ -88,48 +132,29 @@ def get_prompt(state: AgentState):
     the current `stage` in the `AgentState`. It then formats the template with
     relevant information from the state, such as the task, metadata, statistics,
     and insights, along with the parser instructions and a list of available tools.
+    The metadata, statistics and insights are compacted to the token budget of
+    the stage by `build_context`. The Metadata Extractor is only told to skip
+    the standard metadata when the built-in profile computed it.
 
     Args:
         state (AgentState): The current state of the agentic workflow, containing all
                             necessary context for generating the prompt.
 
     Returns:
-        str: A fully formatted prompt string ready to be sent to the language model.
+        tuple[str, ContextReport]: A fully formatted prompt string ready to be sent to the
+                                   language model, and the report of the items removed from its context.
     """
-    task = state['task']
     stage = state['stage'][-1]
-    metadata = state['metadata'] if state['metadata'] else {}
-    insights = state['insights'] if state['insights'] else {}
-    statistics = state['statistics'] if state['statistics'] else {}
-
+    values = {
+        'metadata': list(state['metadata']) if state['metadata'] else [],
+        'statistics': list(state['statistics']) if state['statistics'] else [],
+        'insights': list(state['insights']) if state['insights'] else [],
+        'content': (list(state['metadata']) if state['metadata'] else []) + list(state['task']),
+    }
+    context, report = build_context(stage, {section: values[section] for section in STAGE_SECTIONS[stage]})
     if stage == WorkflowStage.METADATA_EXTRACTOR_AGENT:
-        return PROMPT_MAPPER[stage].format(
-            output_format=PARSER_MAPPER[stage].get_format_instructions(),
-            tool_list=", ".join(tool.name for tool in common_tools)
-        )
-    if stage == WorkflowStage.STRUCTURE_CREATOR_AGENT:
-        return PROMPT_MAPPER[stage].format(
-            output_format=PARSER_MAPPER[stage].get_format_instructions(),
-            content=task
-        )
-    if stage == WorkflowStage.STATISTICS_GENERATOR_AGENT:
-        return PROMPT_MAPPER[stage].format(
-            output_format=PARSER_MAPPER[stage].get_format_instructions(),
-            tool_list=", ".join(tool.name for tool in common_tools),
-            metadata=metadata
-        )
-    if stage == WorkflowStage.BUSINESS_INSIGHTS_AGENT:
-        return PROMPT_MAPPER[stage].format(
-            output_format=PARSER_MAPPER[stage].get_format_instructions(),
-            tool_list=", ".join(tool.name for tool in common_tools),
-            metadata=metadata,
-            statistics=statistics
-        )
-    if stage == WorkflowStage.WEB_DEVELOPER_AGENT:
-        return PROMPT_MAPPER[stage].format(
-            output_format=PARSER_MAPPER[stage].get_format_instructions(),
-            tool_list=", ".join(tool.name for tool in common_tools),
-            insights=insights,
-            metadata=metadata,
-            statistics=statistics
-        )
+        context['computed_metadata'] = COMPUTED_METADATA_SECTION.format(**context) if context['metadata'] else ''
+    prompt = PROMPT_MAPPER[stage].format(output_format=PARSER_MAPPER[stage].get_format_instructions(),
+                                         tool_list=", ".join(tool.name for tool in get_common_tools()),
+                                         **context)
+    return prompt, report
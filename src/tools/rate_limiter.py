@@ -0,0 +1,376 @@
+"""Rate Limiter"""
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from tools.telemetry import add_metric
+from utils.sqlite_store import connect_database
+
+
+RATE_LIMIT_STATUS_CODE = 429
+"""HTTP status code of a rate-limit / quota error."""
+
+RATE_LIMIT_ERROR_NAMES = ('ResourceExhausted', 'TooManyRequests', 'RateLimitError')
+"""Exception classes raised by the provider clients for a rate-limit / quota error."""
+
+RETRY_AFTER_PATTERNS = (
+    re.compile(r"retry[_ -]?delay\W+(?:seconds:\s*)?(\d+(?:\.\d+)?)", re.IGNORECASE),
+    re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+    re.compile(r"retry[_ -]?after\W+(\d+(?:\.\d+)?)", re.IGNORECASE),
+)
+"""Patterns used to extract a retry-after hint from provider error messages."""
+
+SHARED_STATE_FIELDS = ('requests_per_minute', 'tokens_per_minute', '_request_bucket', '_token_bucket', '_last_refill',
+                       '_blocked_until', '_consecutive_errors')
+"""Attributes of the limiter kept in the shared database when it is shared between processes."""
+
+logger = logging.getLogger(__name__)
+
+current_run_id: ContextVar[str | None] = ContextVar('current_run_id', default=None)
+"""The run UUID that throttling time is attributed to in the current context."""
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """
+    Checks whether an exception raised by a model call is a rate-limit error.
+
+    The exception and the errors it was raised from are classified by their
+    type and HTTP status code only, never by their message, so an unrelated
+    error mentioning 429 is not retried.
+
+    Args:
+        error (BaseException): The exception raised by the provider client.
+
+    Returns:
+        bool: True if the error signals HTTP 429 / RESOURCE_EXHAUSTED.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        status_codes = [getattr(error, 'code', None), getattr(error, 'status_code', None),
+                        getattr(getattr(error, 'response', None), 'status_code', None)]
+        if (type(error).__name__ in RATE_LIMIT_ERROR_NAMES or RATE_LIMIT_STATUS_CODE in status_codes
+                or getattr(error, 'status', None) == 'RESOURCE_EXHAUSTED'):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def get_retry_after(error: BaseException) -> float | None:
+    """
+    Extracts the retry-after hint, in seconds, from a rate-limit error.
+
+    The `Retry-After` header of an attached HTTP response is preferred; otherwise
+    the error message is searched for the `retryDelay` / "retry in Ns" hints
+    returned by the Gemini API.
+
+    Args:
+        error (BaseException): The rate-limit exception.
+
+    Returns:
+        float | None: The number of seconds to wait, or None if no hint is present.
+    """
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    if headers.get('retry-after', '').replace('.', '', 1).isdigit():
+        return float(headers['retry-after'])
+    for pattern in RETRY_AFTER_PATTERNS:
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class TokenBucketRateLimiter(BaseRateLimiter):
+    """
+    Process-wide token-bucket limiter with requests and tokens per minute budgets.
+
+    Every chat client returned by `get_model` shares one instance. A request is
+    admitted when the request bucket holds a full token and the LLM-token bucket
+    is not in debt; token usage is charged after each call through
+    `RateLimitCallbackHandler`. Rate-limit errors reported through
+    `report_rate_limit` pause every client for the provider's retry-after hint,
+    or an exponential backoff when none is given. Once `share` is called, the
+    buckets live in a SQLite database, so processes sharing it also share one
+    budget instead of each spending a full budget of their own.
+    """
+
+    def __init__(self, requests_per_minute: int = 5, tokens_per_minute: int = 250000, max_backoff_seconds: float = 120.0):
+        self._lock = threading.Lock()
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_backoff_seconds = max_backoff_seconds
+        self._request_bucket = float(requests_per_minute)
+        self._token_bucket = float(tokens_per_minute)
+        self._last_refill = time.time()
+        self._blocked_until = 0.0
+        self._consecutive_errors = 0
+        self._throttled_seconds = defaultdict(float)
+        self.path = None
+        self.scope = None
+
+    def share(self, path: str, scope: str):
+        """
+        Moves the buckets to a SQLite database shared with other processes.
+
+        Buckets are kept per scope, the API key and model a quota is counted
+        against, so processes only share a budget when they share a quota. The
+        first process to share a scope seeds it with its budgets and bucket
+        levels; later processes adopt the state they find there.
+
+        Args:
+            path (str): The location of the SQLite database.
+            scope (str): The key of the quota the buckets track.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            self.path, self.scope = path, scope
+            with connect_database(self.path) as connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS rate_limit_buckets "
+                                   "(scope TEXT, name TEXT, value REAL, PRIMARY KEY (scope, name))")
+                connection.executemany("INSERT OR IGNORE INTO rate_limit_buckets VALUES (?, ?, ?)",
+                                       [(scope, name, getattr(self, name)) for name in SHARED_STATE_FIELDS])
+
+    @contextmanager
+    def _state(self) -> Iterator[None]:
+        """
+        Holds the limiter's lock, and when shared, loads the shared state and writes it back on exit.
+
+        The shared state is read and written in one immediate transaction, so
+        concurrent processes update the buckets one at a time.
+        """
+        with self._lock:
+            if self.path is None:
+                yield
+                return
+            with connect_database(self.path) as connection:
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    for name, value in connection.execute("SELECT name, value FROM rate_limit_buckets WHERE scope = ?",
+                                                          (self.scope,)):
+                        setattr(self, name, type(getattr(self, name))(value))
+                    yield
+                    connection.executemany("UPDATE rate_limit_buckets SET value = ? WHERE scope = ? AND name = ?",
+                                           [(getattr(self, name), self.scope, name) for name in SHARED_STATE_FIELDS])
+                    connection.execute("COMMIT")
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    raise
+
+    def configure(self, requests_per_minute: int | None = None, tokens_per_minute: int | None = None):
+        """
+        Updates the per-minute budgets, keeping the current bucket levels within them.
+
+        When the limiter is shared, the budgets apply to every process sharing
+        its quota; changing budgets another run set is logged as a warning.
+
+        Args:
+            requests_per_minute (int | None): The request budget; unchanged if None.
+            tokens_per_minute (int | None): The LLM-token budget; unchanged if None.
+        """
+        with self._state():
+            self._refill(time.time())
+            changed = [f"{name} {getattr(self, name)} -> {value}"
+                       for name, value in (('requests_per_minute', requests_per_minute), ('tokens_per_minute', tokens_per_minute))
+                       if value and value != getattr(self, name)]
+            if self.path is not None and changed:
+                logger.warning("Changing the rate limits shared by every worker of quota %s: %s",
+                               self.scope[:12], ', '.join(changed))
+            if requests_per_minute:
+                self.requests_per_minute = requests_per_minute
+                self._request_bucket = min(self._request_bucket, float(requests_per_minute))
+            if tokens_per_minute:
+                self.tokens_per_minute = tokens_per_minute
+                self._token_bucket = min(self._token_bucket, float(tokens_per_minute))
+
+    def _refill(self, now: float):
+        """Adds the budget accrued since the last refill to both buckets."""
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._request_bucket = min(float(self.requests_per_minute), self._request_bucket + elapsed * self.requests_per_minute / 60)
+        self._token_bucket = min(float(self.tokens_per_minute), self._token_bucket + elapsed * self.tokens_per_minute / 60)
+
+    def _try_acquire(self) -> float:
+        """Takes one request from the bucket, or returns the seconds to wait before retrying."""
+        with self._state():
+            now = time.time()
+            self._refill(now)
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            if self._request_bucket >= 1 and self._token_bucket > 0:
+                self._request_bucket -= 1
+                return 0.0
+            request_wait = max(0.0, 1 - self._request_bucket) * 60 / self.requests_per_minute
+            token_wait = max(0.0, 1 - self._token_bucket) * 60 / self.tokens_per_minute
+            return max(request_wait, token_wait)
+
+    def _record_wait(self, seconds: float):
+        """Attributes throttled time to the run and telemetry spans active in the current context."""
+        if seconds > 0:
+            with self._lock:
+                self._throttled_seconds[current_run_id.get()] += seconds
+            add_metric('limiter_seconds', seconds)
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        start = time.monotonic()
+        while (wait := self._try_acquire()) > 0:
+            if not blocking:
+                return False
+            time.sleep(wait)
+        self._record_wait(time.monotonic() - start)
+        return True
+
+    async def _atry_acquire(self) -> float:
+        """Runs `_try_acquire` off the event loop when it waits on the shared database."""
+        if self.path is None:
+            return self._try_acquire()
+        return await asyncio.to_thread(self._try_acquire)
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        start = time.monotonic()
+        while (wait := await self._atry_acquire()) > 0:
+            if not blocking:
+                return False
+            await asyncio.sleep(wait)
+        self._record_wait(time.monotonic() - start)
+        return True
+
+    def consume_tokens(self, tokens: int):
+        """
+        Charges LLM tokens used by a completed call against the tokens budget.
+
+        The bucket may go into debt, which delays the next request until the
+        budget has been earned back.
+
+        Args:
+            tokens (int): The total input and output tokens of the call.
+        """
+        with self._state():
+            self._refill(time.time())
+            self._token_bucket -= tokens
+            self._consecutive_errors = 0
+
+    def report_rate_limit(self, retry_after: float | None = None) -> float:
+        """
+        Pauses all clients after the provider rejected a call for exceeding its quota.
+
+        Args:
+            retry_after (float | None): The provider's retry-after hint in seconds.
+                                        Exponential backoff is used when None.
+
+        Returns:
+            float: The number of seconds every client is paused for.
+        """
+        with self._state():
+            self._consecutive_errors += 1
+            delay = retry_after if retry_after is not None else min(self.max_backoff_seconds, 2.0 ** self._consecutive_errors)
+            self._blocked_until = max(self._blocked_until, time.time() + delay)
+            self._request_bucket = min(self._request_bucket, 0.0)
+            return delay
+
+    def get_throttled_seconds(self, run_id: str | None) -> float:
+        """
+        Returns the total time calls of a run spent waiting on the limiter.
+
+        Args:
+            run_id (str | None): The run UUID.
+
+        Returns:
+            float: The throttled time in seconds.
+        """
+        with self._lock:
+            return self._throttled_seconds.get(run_id, 0.0)
+
+
+class RateLimitCallbackHandler(BaseCallbackHandler):
+    """
+    Charges the token usage of completed chat model calls against the shared
+    limiter, and pauses it when a call is rejected for exceeding the quota.
+    """
+
+    def __init__(self, rate_limiter: TokenBucketRateLimiter):
+        self.rate_limiter = rate_limiter
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> Any:
+        tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None) or {}
+                tokens += usage.get('total_tokens', 0)
+        self.rate_limiter.consume_tokens(tokens)
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> Any:
+        if is_rate_limit_error(error):
+            self.rate_limiter.report_rate_limit(get_retry_after(error))
+
+
+RATE_LIMITER = TokenBucketRateLimiter()
+"""The limiter shared by every chat client in the process, and by the worker processes of a job queue."""
+
+RATE_LIMIT_CALLBACK = RateLimitCallbackHandler(RATE_LIMITER)
+"""The callback handler attached to every chat client in the process."""
+
+
+def invoke_with_backoff(runnable: Runnable, payload: Any, max_attempts: int = 3, config: RunnableConfig | None = None) -> Any:
+    """
+    Invokes a single model call, retrying it when the provider rejects it with a rate-limit error.
+
+    The rejected call has already paused the shared limiter through
+    `RateLimitCallbackHandler`, so the retry and every other client are
+    admitted only once the provider's retry-after hint (or an exponential
+    backoff) has passed. The runnable is re-run whole, so it must be one model
+    call, such as a structured output chain: agents are invoked once and
+    rely on the retries of their chat client (see `tools.helper.MODEL_MAX_RETRIES`),
+    which never repeat the tool calls already made.
+
+    Args:
+        runnable (Runnable): The model call to invoke.
+        payload (Any): The input passed to `runnable.invoke`.
+        max_attempts (int, optional): The maximum number of attempts. Defaults to 3.
+        config (RunnableConfig | None, optional): The config passed to `runnable.invoke`. Defaults to None.
+
+    Returns:
+        Any: The output of the runnable.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return runnable.invoke(payload, config)
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            if attempt == max_attempts or not is_rate_limit_error(error):
+                raise
+    return None
+
+
+async def ainvoke_with_backoff(runnable: Runnable, payload: Any, max_attempts: int = 3, config: RunnableConfig | None = None) -> Any:
+    """
+    Asynchronously invokes a single model call, retrying it when the provider rejects it with a rate-limit error.
+
+    See `invoke_with_backoff`: the runnable must be one model call.
+
+    Args:
+        runnable (Runnable): The model call to invoke.
+        payload (Any): The input passed to `runnable.ainvoke`.
+        max_attempts (int, optional): The maximum number of attempts. Defaults to 3.
+        config (RunnableConfig | None, optional): The config passed to `runnable.ainvoke`. Defaults to None.
+
+    Returns:
+        Any: The output of the runnable.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return await runnable.ainvoke(payload, config)
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            if attempt == max_attempts or not is_rate_limit_error(error):
+                raise
+    return None
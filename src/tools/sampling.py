@@ -0,0 +1,172 @@
+"""Dataset Sampling"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from tools.code_guard import GuardReport
+from tools.dataset import DatasetHandle
+from tools.sandbox import SANDBOX_POOL
+from tools.telemetry import measure
+from utils.helper import ModelClasses
+
+
+REGRESSION_STRATA = 10
+"""Number of quantile bins used to stratify a numeric target."""
+
+ERROR_OUTPUT_PATTERN = re.compile(r"^\w+(Error|Exception|Exit|Interrupt)\b.*:", re.DOTALL)
+"""Matches the `<ExceptionType>: <message>` string returned by the Python REPL tool on failure."""
+
+NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?")
+"""Matches the numbers compared between sample and full-data outputs."""
+
+
+def stratified_sample(df: pd.DataFrame, target_column: str | None, problem_type: str | None,
+                      sample_size: int, random_state: int = 0) -> pd.DataFrame:
+    """
+    Draws a sample of the dataset that preserves the distribution of the target.
+
+    Classification targets (and non-numeric ones) are stratified on their
+    classes and numeric targets on quantile bins, with proportional allocation
+    and at least one row per stratum. Time series are sampled at evenly spaced
+    positions so the sample stays time-ordered and spans the full period.
+
+    Args:
+        df (pd.DataFrame): The full dataset.
+        target_column (str | None): The target column of the run.
+        problem_type (str | None): The `ModelClasses` value of the run.
+        sample_size (int): The requested number of rows.
+        random_state (int, optional): Seed for the row selection. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: The sample, or `df` itself if it is not larger than `sample_size`.
+    """
+    if sample_size <= 0 or len(df) <= sample_size:
+        return df
+    if problem_type == ModelClasses.TIME_SERIES.value:
+        return df.iloc[np.unique(np.linspace(0, len(df) - 1, sample_size).round().astype(int))]
+    if target_column is None or target_column not in df.columns:
+        return df.sample(sample_size, random_state=random_state)
+
+    target = df[target_column]
+    if problem_type == ModelClasses.CLASSIFICATION.value or not pd.api.types.is_numeric_dtype(target):
+        strata = target.astype(str)
+    else:
+        strata = pd.qcut(target.rank(method='first'), q=REGRESSION_STRATA, labels=False).fillna(-1)
+    random_key = pd.Series(np.random.default_rng(random_state).random(len(df)), index=df.index)
+    position = random_key.groupby(strata).rank(method='first')
+    quota = (strata.map(strata.value_counts()) * sample_size / len(df)).round().clip(lower=1)
+    return df[position <= quota]
+
+
+def is_error_output(output: str) -> bool:
+    """
+    Checks whether a Python REPL tool output is an error message.
+
+    Args:
+        output (str): The observation returned by the tool.
+
+    Returns:
+        bool: True if the code raised an exception.
+    """
+    return bool(ERROR_OUTPUT_PATTERN.match(str(output).strip()))
+
+
+def get_accepted_steps(intermediate_steps: list) -> list[tuple[str, str]]:
+    """
+    Extracts the code snippets the agent ran successfully, in execution order.
+
+    Args:
+        intermediate_steps (list): The `(AgentAction, observation)` pairs returned
+                                   by an agent created with `return_intermediate_steps`.
+
+    Returns:
+        list[tuple[str, str]]: The code and output of every Python REPL call that did not fail.
+    """
+    accepted = []
+    for action, observation in intermediate_steps:
+        tool_input = action.tool_input.get('query') if isinstance(action.tool_input, dict) else action.tool_input
+        if action.tool == 'python_repl_ast' and tool_input and not is_error_output(observation):
+            accepted.append((tool_input, str(observation)))
+    return accepted
+
+
+def run_code(dataset: DatasetHandle, code_list: list[str]) -> tuple[str, list[GuardReport]]:
+    """
+    Runs code snippets in order against a dataset bound to `df`, as the pandas agent does.
+
+    The snippets run in a sandbox process of `SANDBOX_POOL`, under its CPU
+    time and memory limits and its performance guard.
+
+    Args:
+        dataset (DatasetHandle): The handle of the dataset to run the code against.
+        code_list (list[str]): The code snippets to run.
+
+    Returns:
+        tuple[str, list[GuardReport]]: The output of the last snippet, and the
+                                       guard reports of the snippets that were
+                                       rewritten, found slow or rejected.
+    """
+    output = ''
+    with measure('pandas_seconds'), SANDBOX_POOL.session(dataset) as session:
+        for code in code_list:
+            output = session.run(code)
+            if is_error_output(output):
+                break
+    return output, session.reports
+
+
+def get_agreement_metrics(sample_output: str, full_output: str) -> dict:
+    """
+    Compares the output of code run on the sample with its output on the full dataset.
+
+    Args:
+        sample_output (str): The output of the accepted code on the sample.
+        full_output (str): The output of the same code on the full dataset.
+
+    Returns:
+        dict: Whether the outputs match exactly, how many numbers were compared
+              and their mean relative agreement (1.0 means identical numbers).
+    """
+    sample_numbers = np.array(NUMBER_PATTERN.findall(sample_output), dtype=float)
+    full_numbers = np.array(NUMBER_PATTERN.findall(full_output), dtype=float)
+    metrics = {'exact_match': sample_output == full_output, 'numbers_compared': 0, 'numeric_agreement': None}
+    if len(sample_numbers) and len(sample_numbers) == len(full_numbers):
+        relative_difference = np.abs(sample_numbers - full_numbers) / np.maximum(np.abs(full_numbers), 1e-12)
+        metrics['numbers_compared'] = len(full_numbers)
+        metrics['numeric_agreement'] = round(float(1 - np.clip(relative_difference, 0, 1).mean()), 4)
+    return metrics
+
+
+def rerun_on_full_data(dataset: DatasetHandle, df: pd.DataFrame, sample_df: pd.DataFrame,
+                       response: dict) -> tuple[str, dict]:
+    """
+    Re-runs the code a pandas agent accepted on the sample against the full dataset.
+
+    Exploratory and failed attempts only ever touch the sample; the successful
+    snippets are replayed once on `df`, and the full-data result replaces the
+    agent's answer, whose counts and sums are on the sample's scale, so later
+    stages reason on exact figures only. If the code cannot be replayed, the
+    answer is kept and labelled as computed on the sample.
+
+    Args:
+        dataset (DatasetHandle): The handle of the full dataset.
+        df (pd.DataFrame): The full dataset.
+        sample_df (pd.DataFrame): The sample the agent explored.
+        response (dict): The agent response, including `intermediate_steps`.
+
+    Returns:
+        tuple[str, dict]: The answer to keep and the sample-vs-full agreement
+                          metrics, with the guard reports of the replayed code.
+    """
+    accepted_steps = get_accepted_steps(response['intermediate_steps'])
+    metrics = {'sample_rows': len(sample_df), 'full_rows': len(df), 'replayed_steps': len(accepted_steps)}
+    sample_answer = f"Result on a sample of {len(sample_df)} of the {len(df)} rows:\n{response['output']}"
+    if not accepted_steps:
+        return sample_answer, metrics | {'status': 'no_code'}
+    full_output, guard = run_code(dataset, [code for code, _ in accepted_steps])
+    metrics['guard'] = guard
+    if is_error_output(full_output):
+        return sample_answer, metrics | {'status': 'full_data_error', 'full_output': full_output}
+    metrics |= {'status': 'replayed', **get_agreement_metrics(accepted_steps[-1][1], full_output)}
+    return f"Result on all {len(df)} rows:\n{full_output}", metrics
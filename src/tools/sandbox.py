@@ -0,0 +1,418 @@
+"""Code Sandbox"""
+import asyncio
+import atexit
+import math
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Type
+
+from langchain_core.tools import BaseTool
+from langchain_experimental.tools.python.tool import PythonAstREPLTool, PythonInputs
+from pydantic import BaseModel, ConfigDict
+
+from tools.code_guard import GuardReport, get_rejection_message, guard_code
+from tools.dataset import DatasetHandle, load_dataset
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+SANDBOX_WORKERS = int(os.getenv('SANDBOX_WORKERS', '4'))
+"""Maximum number of code snippets a worker runs at the same time, read from the `SANDBOX_WORKERS` environment variable."""
+
+SANDBOX_CPU_SECONDS = int(os.getenv('SANDBOX_CPU_SECONDS', '60'))
+"""CPU time a single code snippet may use, read from the `SANDBOX_CPU_SECONDS` environment variable."""
+
+SANDBOX_MEMORY_MB = int(os.getenv('SANDBOX_MEMORY_MB', '4096'))
+"""Resident memory a sandbox process may reach, read from the `SANDBOX_MEMORY_MB` environment variable."""
+
+SANDBOX_TIMEOUT_SECONDS = 2 * SANDBOX_CPU_SECONDS
+"""Wall time after which a code snippet is cancelled, for code that waits without using CPU."""
+
+MAX_RESULT_CHARS = 8000
+"""Maximum length of the output returned by a code snippet; longer outputs keep their head and tail."""
+
+MONITOR_SECONDS = 0.1
+"""Delay between two memory checks of a sandbox process running a snippet."""
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else None
+"""Size of a memory page, converting the resident pages of a process to bytes; None where the platform has no `sysconf`."""
+
+CPU_LIMIT_SUPPORTED = resource is not None and hasattr(signal, 'SIGXCPU')
+"""Whether the platform can interrupt a snippet at its CPU time limit; elsewhere only the wall time limit applies."""
+
+
+def compact_result(output) -> str:
+    """
+    Converts the output of a code snippet to text of at most `MAX_RESULT_CHARS` characters.
+
+    Args:
+        output: The value or printed text returned by the Python REPL tool.
+
+    Returns:
+        str: The text, with its middle replaced by the number of omitted characters if it is too long.
+    """
+    text = str(output)
+    if len(text) <= MAX_RESULT_CHARS:
+        return text
+    half = MAX_RESULT_CHARS // 2
+    return f"{text[:half]}\n... ({len(text) - 2 * half} characters omitted) ...\n{text[-half:]}"
+
+
+def raise_cpu_limit(signum: int, frame):  # pylint: disable=unused-argument
+    """Interrupts a code snippet that used up its CPU time."""
+    raise TimeoutError(f"The code used more than {SANDBOX_CPU_SECONDS} seconds of CPU time")
+
+
+def get_cpu_seconds() -> float:
+    """Returns the CPU time used by the current process."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+@contextmanager
+def limit_cpu_time() -> Iterator[None]:
+    """
+    Raises `TimeoutError` in the block once it used `SANDBOX_CPU_SECONDS` of CPU time.
+
+    The limit is only enforced where `CPU_LIMIT_SUPPORTED`; the block then
+    restores the process limit on exit.
+    """
+    if not CPU_LIMIT_SUPPORTED:
+        yield
+        return
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_CPU)
+    soft_limit = math.ceil(get_cpu_seconds()) + SANDBOX_CPU_SECONDS
+    resource.setrlimit(resource.RLIMIT_CPU, (soft_limit if hard_limit == resource.RLIM_INFINITY
+                                             else min(soft_limit, hard_limit), hard_limit))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (hard_limit, hard_limit))
+
+
+def serve_sandbox(connection):
+    """
+    Runs code snippets received from the parent process until the connection is closed.
+
+    The process handles two requests: `('load', handle)` binds a shallow copy
+    of a registered dataset to `df` with fresh variables, and `('run', code)`
+    checks a snippet with `tools.code_guard.guard_code`, runs its vectorized
+    version as the pandas agent's Python tool does, under a CPU time limit
+    where the platform supports one (see `limit_cpu_time`), and replies with its compacted output and the guard report. Snippets
+    over the cost budget are not run: the reply explains how to rewrite them.
+    Datasets are memory-mapped once per process (see `tools.dataset.load_dataset`),
+    so loading the dataset of a new task is free.
+
+    Args:
+        connection: The child end of the pipe to the parent process.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if CPU_LIMIT_SUPPORTED:
+        signal.signal(signal.SIGXCPU, raise_cpu_limit)
+    repl_tool = PythonAstREPLTool()
+    while True:
+        try:
+            action, payload = connection.recv()
+        except EOFError:
+            return
+        if action == 'load':
+            repl_tool.globals, repl_tool.locals = {}, {'df': load_dataset(payload)}
+            connection.send(None)
+            continue
+        report = None
+        try:
+            with limit_cpu_time():
+                code, report = guard_code(payload, repl_tool.locals)
+                output = get_rejection_message(report) if report['rejected'] else compact_result(repl_tool.run(code))
+        except TimeoutError as error:
+            output = f"TimeoutError: {error}"
+        connection.send((output, report))
+
+
+def get_resident_bytes(pid: int) -> int | None:
+    """
+    Returns the resident memory of a process.
+
+    It is read from `/proc` where available, and from `psutil` otherwise, if installed.
+
+    Args:
+        pid (int): The process id.
+
+    Returns:
+        int | None: The resident bytes, or None if neither is available, in
+                    which case no memory limit is applied.
+    """
+    if PAGE_SIZE is not None and os.path.exists(f'/proc/{pid}/statm'):
+        try:
+            with open(f'/proc/{pid}/statm', 'r', encoding='utf-8') as f:
+                return int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            return None
+    try:
+        import psutil  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return None
+    try:
+        return psutil.Process(pid).memory_info().rss
+    except psutil.Error:
+        return None
+
+
+class SandboxProcess:
+    """
+    A long-lived process running the code snippets of one task at a time.
+    """
+
+    def __init__(self):
+        context = multiprocessing.get_context('spawn')
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=serve_sandbox, args=(child_connection,), daemon=True,
+                                       name='eda-sandbox')
+        self.process.start()
+        child_connection.close()
+        self.datasets = set()
+        self._cancelled = threading.Event()
+
+    def is_alive(self) -> bool:
+        """Checks whether the process can run code."""
+        return self.process.is_alive()
+
+    def load(self, dataset: DatasetHandle):
+        """
+        Binds a registered dataset to `df` and clears the variables of the previous task.
+
+        Args:
+            dataset (DatasetHandle): The handle of the dataset.
+        """
+        self._cancelled.clear()
+        self.connection.send(('load', dataset))
+        self.connection.recv()
+        self.datasets.add(dataset['hash'])
+
+    def run(self, code: str) -> tuple[str, GuardReport | None]:
+        """
+        Runs a code snippet and waits for its output.
+
+        The process is killed if the snippet exceeds `SANDBOX_MEMORY_MB` of
+        resident memory or `SANDBOX_TIMEOUT_SECONDS` of wall time, or if the
+        task is cancelled; the snippet then fails with an error message.
+
+        Args:
+            code (str): The code snippet.
+
+        Returns:
+            tuple[str, GuardReport | None]: The compacted output of the snippet,
+                                            or its error message, and its guard
+                                            report, or None if the process was killed.
+        """
+        if not self.is_alive():
+            return "SandboxError: The sandbox process exited, the variables of the previous snippets are lost", None
+        self.connection.send(('run', code))
+        started = time.monotonic()
+        while not self.connection.poll(MONITOR_SECONDS):
+            resident_bytes = get_resident_bytes(self.process.pid)
+            if self._cancelled.is_set():
+                error = "CancelledError: The task was cancelled"
+            elif resident_bytes is not None and resident_bytes > SANDBOX_MEMORY_MB * 2 ** 20:
+                error = f"MemoryError: The code used more than {SANDBOX_MEMORY_MB} MB of memory"
+            elif time.monotonic() - started > SANDBOX_TIMEOUT_SECONDS:
+                error = f"TimeoutError: The code ran for more than {SANDBOX_TIMEOUT_SECONDS} seconds"
+            elif not self.is_alive():
+                error = "SandboxError: The sandbox process exited while running the code"
+            else:
+                continue
+            self.kill()
+            return error, None
+        try:
+            return self.connection.recv()
+        except EOFError:
+            return "SandboxError: The sandbox process exited while running the code", None
+
+    def cancel(self):
+        """Stops the snippet being run, if any."""
+        self._cancelled.set()
+
+    def kill(self):
+        """Terminates the process."""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class SandboxSession:
+    """
+    The sandbox process lent to one task, taken from the pool when the task runs its first snippet.
+
+    The process keeps the variables of the task until it completes, but a
+    slot of the pool is only held while one of its snippets runs, so a task
+    waiting on the model does not hold up the snippets of the others.
+    """
+
+    def __init__(self, pool: "SandboxPool", dataset: DatasetHandle):
+        self.pool = pool
+        self.dataset = dataset
+        self.sandbox = None
+        self.cancelled = False
+        self.reports: list[GuardReport] = []
+        self._lock = threading.Lock()
+
+    def run(self, code: str) -> str:
+        """
+        Runs a code snippet of the task against its dataset.
+
+        The guard reports of the snippets that were rewritten or found slow
+        are kept in `reports`.
+
+        Args:
+            code (str): The code snippet.
+
+        Returns:
+            str: The compacted output of the snippet, or its error message.
+        """
+        with self._lock:
+            if self.sandbox is None:
+                self.sandbox = self.pool.acquire(self.dataset)
+            if self.cancelled:
+                return "CancelledError: The task was cancelled"
+            output, report = self.pool.run(self.sandbox, code)
+            if report is not None and (report['rewrites'] or report['findings']):
+                self.reports.append(report)
+            return output
+
+    def cancel(self):
+        """Stops the snippet being run by the task, if any, and the snippets it would run next."""
+        self.cancelled = True
+        if self.sandbox is not None:
+            self.sandbox.cancel()
+
+    def close(self):
+        """Returns the sandbox process to the pool."""
+        with self._lock:
+            if self.sandbox is not None:
+                self.pool.release(self.sandbox)
+                self.sandbox = None
+
+
+class SandboxPool:
+    """
+    Sandbox processes kept alive across tasks and runs, each running the snippets of one task at a time.
+
+    A process is lent to a task for its duration, while at most `max_workers`
+    processes run a snippet at the same time.
+    """
+
+    def __init__(self, max_workers: int = SANDBOX_WORKERS):
+        self.max_workers = max_workers
+        self._idle: list[SandboxProcess] = []
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+
+    def acquire(self, dataset: DatasetHandle) -> SandboxProcess:
+        """
+        Takes an idle sandbox process, or starts one, and loads a dataset into it.
+
+        Processes that already mapped the dataset are preferred.
+
+        Args:
+            dataset (DatasetHandle): The handle of the dataset the task works on.
+
+        Returns:
+            SandboxProcess: The process, with `df` bound to the dataset and no other variables.
+        """
+        with self._lock:
+            self._idle = [sandbox for sandbox in self._idle if sandbox.is_alive()]
+            ready = [sandbox for sandbox in self._idle if dataset['hash'] in sandbox.datasets]
+            sandbox = (ready or self._idle or [None])[-1]
+            if sandbox is not None:
+                self._idle.remove(sandbox)
+        sandbox = sandbox or SandboxProcess()
+        sandbox.load(dataset)
+        return sandbox
+
+    def run(self, sandbox: SandboxProcess, code: str) -> tuple[str, GuardReport | None]:
+        """
+        Runs a code snippet in a lent process, blocking while `max_workers` snippets run in other processes.
+
+        Args:
+            sandbox (SandboxProcess): The process returned by `acquire`.
+            code (str): The code snippet.
+
+        Returns:
+            tuple[str, GuardReport | None]: The output and guard report returned by `SandboxProcess.run`.
+        """
+        with self._slots:
+            return sandbox.run(code)
+
+    def release(self, sandbox: SandboxProcess):
+        """
+        Returns a sandbox process to the pool once its task completes.
+
+        Args:
+            sandbox (SandboxProcess): The process returned by `acquire`.
+        """
+        with self._lock:
+            if sandbox.is_alive():
+                self._idle.append(sandbox)
+
+    @contextmanager
+    def session(self, dataset: DatasetHandle) -> Iterator[SandboxSession]:
+        """
+        Opens the sandbox session of a task.
+
+        Args:
+            dataset (DatasetHandle): The handle of the dataset the task works on.
+
+        Yields:
+            SandboxSession: The session, whose process returns to the pool when the task completes.
+        """
+        session = SandboxSession(self, dataset)
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def shutdown(self):
+        """Terminates the idle sandbox processes."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sandbox in idle:
+            sandbox.kill()
+
+
+class SandboxedPythonTool(BaseTool):
+    """
+    Python tool of the pandas agents running their code in a sandbox process.
+
+    It keeps the name, description and input of the Python REPL tool it
+    replaces, so the agent prompt, the telemetry and the captured code are unchanged.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    name: str = PythonAstREPLTool.model_fields['name'].default
+    description: str = PythonAstREPLTool.model_fields['description'].default
+    args_schema: Type[BaseModel] = PythonInputs
+    session: SandboxSession
+
+    def _run(self, query: str, run_manager=None) -> str:  # pylint: disable=arguments-differ,unused-argument
+        return self.session.run(query)
+
+    async def _arun(self, query: str, run_manager=None) -> str:  # pylint: disable=arguments-differ,unused-argument
+        try:
+            return await asyncio.to_thread(self.session.run, query)
+        except asyncio.CancelledError:
+            self.session.cancel()
+            raise
+
+
+SANDBOX_POOL = SandboxPool()
+"""The sandbox processes shared in the process."""
+
+atexit.register(SANDBOX_POOL.shutdown)
@@ -0,0 +1,329 @@
+"""Statistics Engine"""
+import numpy as np
+import pandas as pd
+from scipy import stats
+from sklearn.feature_selection import f_classif, f_regression, mutual_info_classif, mutual_info_regression
+from statsmodels.tsa.stattools import adfuller
+
+from utils.helper import ModelClasses
+
+
+TOP_PAIRS = 15
+"""Number of strongest correlated column pairs reported."""
+
+MUTUAL_INFO_MAX_ROWS = 20000
+"""Row cap for the nearest-neighbour based mutual information estimate."""
+
+MAX_CATEGORY_LEVELS = 50
+"""Maximum cardinality for a non-numeric column to be treated as categorical."""
+
+AUTOCORRELATION_LAGS = (1, 2, 3, 7, 12, 24)
+"""Lags at which the autocorrelation of a time series target is reported."""
+
+ADF_MAX_ROWS = 5000
+"""Number of most recent observations of a time series target tested for stationarity, bounding the lag search of the ADF test."""
+
+
+def _to_markdown(df: pd.DataFrame, title: str) -> str:
+    """Formats a result table as a titled markdown block."""
+    return f"{title}:\n" + df.round(4).to_markdown()
+
+
+def get_target_features(numeric_df: pd.DataFrame, mask: pd.Series) -> pd.DataFrame:
+    """
+    Prepares the numeric features tested against the target.
+
+    Args:
+        numeric_df (pd.DataFrame): The numeric feature columns.
+        mask (pd.Series): The rows where the target is known.
+
+    Returns:
+        pd.DataFrame: The features of the masked rows without the columns that
+                      are missing or constant on those rows, which the F-tests
+                      and mutual information cannot score, with the remaining
+                      missing and infinite values replaced by the column median.
+    """
+    features = numeric_df[mask].replace([np.inf, -np.inf], np.nan)
+    features = features.loc[:, features.nunique() > 1]
+    return features.fillna(features.median())
+
+
+def get_tie_sum(values: pd.Series) -> float:
+    """Returns the sum of t^3 - t over the groups of t tied values of a column, used by the Kruskal-Wallis tie correction."""
+    counts = values.value_counts().to_numpy(dtype=float)
+    return float((counts ** 3 - counts).sum())
+
+
+def get_kruskal_statistics(features: pd.DataFrame, target: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """
+    Computes the Kruskal-Wallis H-test of every feature against a categorical target at once.
+
+    The features are ranked on the rows where both the feature and the target
+    are known, the group rank sums are computed with one groupby, and H is
+    divided by the tie correction, as in `scipy.stats.kruskal`.
+
+    Args:
+        features (pd.DataFrame): The numeric features, before imputation.
+        target (pd.Series): The target, without missing values, aligned with `features`.
+
+    Returns:
+        tuple[pd.Series, pd.Series]: The H statistic and its p-value for each feature.
+    """
+    ranks = features.rank()
+    group_rank_sums = ranks.groupby(target, observed=True).sum()
+    group_counts = ranks.notna().groupby(target, observed=True).sum()
+    total = group_counts.sum()
+    h_statistic = 12 / (total * (total + 1)) * (group_rank_sums ** 2 / group_counts.clip(lower=1)).sum() - 3 * (total + 1)
+    correction = 1 - features.apply(get_tie_sum) / (total ** 3 - total).clip(lower=1)
+    h_statistic = h_statistic / correction.where(correction > 0)
+    return h_statistic, pd.Series(stats.chi2.sf(h_statistic, (group_counts > 0).sum() - 1), index=features.columns)
+
+
+def get_correlation_statistics(numeric_df: pd.DataFrame, ranks: pd.DataFrame) -> list[str]:
+    """
+    Computes Pearson and Spearman correlation matrices and reports the strongest pairs.
+
+    Spearman correlations reuse the column ranks shared by every rank-based test.
+
+    Args:
+        numeric_df (pd.DataFrame): The numeric columns of the dataset.
+        ranks (pd.DataFrame): The per-column ranks of `numeric_df`.
+
+    Returns:
+        list[str]: The strongest correlated pairs as a markdown table.
+    """
+    if numeric_df.shape[1] < 2:
+        return []
+    pearson = numeric_df.corr()
+    spearman = ranks.corr()
+    upper = np.triu(np.ones(pearson.shape, dtype=bool), k=1)
+    pairs = pd.DataFrame({
+        'pearson': pearson.where(upper).stack(),
+        'spearman': spearman.where(upper).stack(),
+    })
+    pairs = pairs.reindex(pairs['pearson'].abs().sort_values(ascending=False).index).head(TOP_PAIRS)
+    return [_to_markdown(pairs, f"Strongest Correlated Pairs (top {TOP_PAIRS} by |Pearson r|)")]
+
+
+def get_distribution_statistics(numeric_df: pd.DataFrame) -> list[str]:
+    """
+    Runs Jarque-Bera normality tests and IQR outlier counts for all numeric columns at once.
+
+    Args:
+        numeric_df (pd.DataFrame): The numeric columns of the dataset.
+
+    Returns:
+        list[str]: The normality and outlier results as a markdown table.
+    """
+    if numeric_df.empty:
+        return []
+    count = numeric_df.count()
+    skew = numeric_df.skew()
+    kurtosis = numeric_df.kurt()
+    jarque_bera = count / 6 * (skew ** 2 + kurtosis ** 2 / 4)
+    quantiles = numeric_df.quantile([0.25, 0.75])
+    iqr = quantiles.loc[0.75] - quantiles.loc[0.25]
+    outliers = ((numeric_df < quantiles.loc[0.25] - 1.5 * iqr) | (numeric_df > quantiles.loc[0.75] + 1.5 * iqr)).sum()
+    result = pd.DataFrame({
+        'skew': skew,
+        'excess_kurtosis': kurtosis,
+        'jarque_bera': jarque_bera,
+        'jb_p_value': stats.chi2.sf(jarque_bera, 2),
+        'iqr_outliers_pct': outliers / count.clip(lower=1) * 100,
+    })
+    return [_to_markdown(result, "Normality (Jarque-Bera) and IQR Outliers")]
+
+
+def get_multicollinearity_statistics(numeric_df: pd.DataFrame) -> list[str]:
+    """
+    Computes the variance inflation factor of every numeric feature from one matrix inverse.
+
+    The VIF of each column is the corresponding diagonal element of the
+    inverse of the correlation matrix.
+
+    Args:
+        numeric_df (pd.DataFrame): The numeric feature columns of the dataset.
+
+    Returns:
+        list[str]: The VIF values as a markdown table.
+    """
+    numeric_df = numeric_df.loc[:, numeric_df.std() > 0]
+    if numeric_df.shape[1] < 2:
+        return []
+    inverse = np.linalg.pinv(numeric_df.corr().fillna(0).to_numpy())
+    vif = pd.DataFrame({'vif': np.diag(inverse)}, index=numeric_df.columns).sort_values('vif', ascending=False)
+    return [_to_markdown(vif, "Variance Inflation Factors")]
+
+
+def get_classification_statistics(df: pd.DataFrame, numeric_df: pd.DataFrame,
+                                  categorical_columns: list[str], target_column: str) -> list[str]:
+    """
+    Tests every feature against a categorical target in batch.
+
+    Numeric features get ANOVA F-tests, tie-corrected Kruskal-Wallis H-tests
+    computed with vectorized group rank sums, and mutual information.
+    Categorical features get chi-square tests of independence on their
+    observed levels, and are skipped when a test cannot be computed.
+
+    Args:
+        df (pd.DataFrame): The dataset.
+        numeric_df (pd.DataFrame): The numeric feature columns.
+        categorical_columns (list[str]): The low-cardinality non-numeric feature columns.
+        target_column (str): The target column.
+
+    Returns:
+        list[str]: The feature-vs-target test results as markdown tables.
+    """
+    results = []
+    target = df[target_column]
+    mask = target.notna()
+    features = get_target_features(numeric_df, mask)
+    if not features.empty and target[mask].nunique() > 1:
+        f_statistic, f_p_value = f_classif(features, target[mask])
+        h_statistic, h_p_value = get_kruskal_statistics(numeric_df.loc[mask, features.columns], target[mask])
+        sample = features.sample(min(len(features), MUTUAL_INFO_MAX_ROWS), random_state=0)
+        mutual_info = mutual_info_classif(sample, target[mask].loc[sample.index], random_state=0)
+        result = pd.DataFrame({
+            'anova_f': f_statistic,
+            'anova_p_value': f_p_value,
+            'kruskal_h': h_statistic,
+            'kruskal_p_value': h_p_value,
+            'mutual_info': mutual_info,
+        }, index=features.columns).sort_values('mutual_info', ascending=False)
+        results.append(_to_markdown(result, f"Numeric Features vs Target `{target_column}`"))
+    chi_square = {}
+    for column in categorical_columns:
+        table = pd.crosstab(df[column], target)
+        table = table.loc[table.sum(axis=1) > 0, table.sum(axis=0) > 0]
+        if min(table.shape) < 2:
+            continue
+        try:
+            statistic, p_value, dof, _ = stats.chi2_contingency(table)
+        except ValueError:
+            continue
+        chi_square[column] = {'chi2': statistic, 'dof': dof, 'p_value': p_value}
+    if chi_square:
+        results.append(_to_markdown(pd.DataFrame(chi_square).T, f"Categorical Features vs Target `{target_column}` (Chi-square)"))
+    return results
+
+
+def get_regression_statistics(df: pd.DataFrame, numeric_df: pd.DataFrame, ranks: pd.DataFrame,
+                              categorical_columns: list[str], target_column: str) -> list[str]:
+    """
+    Tests every feature against a numeric target in batch.
+
+    Numeric features get Pearson and Spearman correlations with the target,
+    univariate F-tests and mutual information. Categorical features get one-way
+    ANOVA computed from vectorized group counts, means and variances.
+
+    Args:
+        df (pd.DataFrame): The dataset.
+        numeric_df (pd.DataFrame): The numeric feature columns.
+        ranks (pd.DataFrame): The per-column ranks of `numeric_df`, reused for the
+                              Spearman correlations when the target has no
+                              missing values; otherwise the features are ranked
+                              again on the rows where the target is known.
+        categorical_columns (list[str]): The low-cardinality non-numeric feature columns.
+        target_column (str): The target column.
+
+    Returns:
+        list[str]: The feature-vs-target test results as markdown tables.
+    """
+    results = []
+    target = pd.to_numeric(df[target_column], errors='coerce')
+    mask = target.notna()
+    features = get_target_features(numeric_df, mask)
+    if not features.empty:
+        f_statistic, f_p_value = f_regression(features, target[mask])
+        feature_ranks = ranks[features.columns] if mask.all() else numeric_df.loc[mask, features.columns].rank()
+        sample = features.sample(min(len(features), MUTUAL_INFO_MAX_ROWS), random_state=0)
+        mutual_info = mutual_info_regression(sample, target[mask].loc[sample.index], random_state=0)
+        result = pd.DataFrame({
+            'pearson_r': numeric_df[features.columns].corrwith(target),
+            'spearman_rho': feature_ranks.corrwith(target[mask].rank()),
+            'f_statistic': f_statistic,
+            'f_p_value': f_p_value,
+            'mutual_info': mutual_info,
+        }, index=features.columns).sort_values('mutual_info', ascending=False)
+        results.append(_to_markdown(result, f"Numeric Features vs Target `{target_column}`"))
+    anova = {}
+    grand_mean = target.mean()
+    for column in categorical_columns:
+        groups = target.groupby(df[column], observed=True).agg(['count', 'mean', 'var']).dropna()
+        between = (groups['count'] * (groups['mean'] - grand_mean) ** 2).sum() / max(len(groups) - 1, 1)
+        within = ((groups['count'] - 1) * groups['var']).sum() / max(groups['count'].sum() - len(groups), 1)
+        f_value = between / within if within > 0 else np.nan
+        anova[column] = {'anova_f': f_value, 'groups': len(groups),
+                         'p_value': stats.f.sf(f_value, len(groups) - 1, groups['count'].sum() - len(groups))}
+    if anova:
+        results.append(_to_markdown(pd.DataFrame(anova).T, f"Categorical Features vs Target `{target_column}` (One-way ANOVA)"))
+    return results
+
+
+def get_time_series_statistics(df: pd.DataFrame, target_column: str) -> list[str]:
+    """
+    Reports autocorrelation, trend and stationarity of a time series target.
+
+    The ADF test fits one regression per candidate lag, so it runs on the last
+    `ADF_MAX_ROWS` observations, a contiguous window keeping the lag structure.
+
+    Args:
+        df (pd.DataFrame): The dataset, in time order.
+        target_column (str): The target column.
+
+    Returns:
+        list[str]: The time series results as markdown tables.
+    """
+    target = pd.to_numeric(df[target_column], errors='coerce').dropna()
+    if len(target) <= max(AUTOCORRELATION_LAGS):
+        return []
+    values = target.to_numpy(dtype=float)
+    centered = values - values.mean()
+    variance = (centered ** 2).sum()
+    autocorrelation = pd.DataFrame({
+        'autocorrelation': [(centered[lag:] * centered[:-lag]).sum() / variance for lag in AUTOCORRELATION_LAGS]
+    }, index=pd.Index(AUTOCORRELATION_LAGS, name='lag'))
+    trend_rho, trend_p_value = stats.spearmanr(np.arange(len(values)), values)
+    adf_statistic, adf_p_value, *_ = adfuller(values[-ADF_MAX_ROWS:], autolag='AIC')
+    summary = pd.DataFrame({'value': [trend_rho, trend_p_value, adf_statistic, adf_p_value, min(len(values), ADF_MAX_ROWS)]},
+                           index=['trend_spearman_rho', 'trend_p_value', 'adf_statistic', 'adf_p_value', 'adf_observations'])
+    return [_to_markdown(autocorrelation, f"Autocorrelation of Target `{target_column}`"),
+            _to_markdown(summary, f"Trend and Stationarity (ADF) of Target `{target_column}`")]
+
+
+def compute_statistics(df: pd.DataFrame, target_column: str | None, problem_type: str | None) -> list[str]:
+    """
+    Computes a battery of statistical tests chosen by problem type, in batch over all columns.
+
+    Every run gets correlation matrices, normality and outlier tests and
+    variance inflation factors. Classification and regression runs add
+    feature-vs-target tests, and time series runs add autocorrelation, trend
+    and stationarity tests of the target. Numeric columns are ranked once and
+    the ranks are shared by the Spearman correlations.
+
+    Args:
+        df (pd.DataFrame): The dataset.
+        target_column (str | None): The target column of the run.
+        problem_type (str | None): The `ModelClasses` value of the run.
+
+    Returns:
+        list[str]: Compact, titled result tables for `AgentState['statistics']`.
+    """
+    has_target = target_column is not None and target_column in df.columns
+    features = df.drop(columns=[target_column]) if has_target else df
+    numeric_df = features.select_dtypes(include='number').astype(float)
+    ranks = numeric_df.rank()
+    categorical_columns = [column for column in features.columns.difference(numeric_df.columns)
+                           if 1 < features[column].nunique() <= MAX_CATEGORY_LEVELS]
+
+    results = []
+    results.extend(get_correlation_statistics(numeric_df, ranks))
+    results.extend(get_distribution_statistics(numeric_df))
+    results.extend(get_multicollinearity_statistics(numeric_df))
+    if has_target and problem_type == ModelClasses.CLASSIFICATION.value:
+        results.extend(get_classification_statistics(df, numeric_df, categorical_columns, target_column))
+    elif has_target and problem_type == ModelClasses.REGRESSION.value:
+        results.extend(get_regression_statistics(df, numeric_df, ranks, categorical_columns, target_column))
+    elif has_target and problem_type == ModelClasses.TIME_SERIES.value:
+        results.extend(get_time_series_statistics(df, target_column))
+    return results
@@ -1,12 +1,25 @@
 """Support Tools"""
+from functools import lru_cache
+
 from langchain_community.agent_toolkits.load_tools import load_tools
 from langchain_community.tools import DuckDuckGoSearchResults
 
-# A tool for searching and retrieving information from arXiv.
-arxiv_tool = load_tools(["arxiv"])
 
-# A tool for performing web searches using DuckDuckGo.
-duckduckgo_tool = DuckDuckGoSearchResults(output_type="json")
+@lru_cache(maxsize=1)
+def get_common_tools() -> tuple:
+    """
+    Builds the tools available to the agents once per process.
+
+    The tools are created on the first call rather than at import time, so
+    modules that only need the agent definitions do not pay for them.
+
+    Returns:
+        tuple: The arXiv search tool and the DuckDuckGo web search tool.
+    """
+    # A tool for searching and retrieving information from arXiv.
+    arxiv_tool = load_tools(["arxiv"])
+
+    # A tool for performing web searches using DuckDuckGo.
+    duckduckgo_tool = DuckDuckGoSearchResults(output_type="json")
 
-# A list of common tools available to the agents.
-common_tools = arxiv_tool + [duckduckgo_tool]
+    return tuple(arxiv_tool + [duckduckgo_tool])
@@ -0,0 +1,241 @@
+"""Task Memo"""
+import re
+
+from typing_extensions import TypedDict
+
+from tools.helper import TaskResult
+from tools.sampling import is_error_output
+
+
+SIMILARITY_THRESHOLD = 0.8
+"""Smallest Jaccard similarity of the intent words of two tasks about the same columns and numbers to treat them as one request."""
+
+TASK_SYNONYMS = [
+    (re.compile(pattern), replacement) for pattern, replacement in (
+        (r">=|≥|\b(greater than or equal to|at least|no less than)\b", ' op_ge '),
+        (r"<=|≤|\b(less than or equal to|at most|no more than)\b", ' op_le '),
+        (r"!=|<>|≠|\b(not equal to|different from)\b", ' op_ne '),
+        (r"==?|\b(equal to|equals)\b", ' op_eq '),
+        (r">|\b(greater|more|larger|higher) than\b|\b(above|exceed(s|ing)?)\b", ' op_gt '),
+        (r"<|\b(less|fewer|smaller|lower) than\b|\bbelow\b", ' op_lt '),
+        (r"\b(not|without|except|excluding|exclude|non|no)\b", ' not '),
+        (r"\b(top|highest|largest|max|maximum|most)\b", ' high '),
+        (r"\b(bottom|lowest|smallest|min|minimum|least)\b", ' low '),
+        (r"\b(descriptive|summary|basic) statistics\b|\bdescribe(\(\))?", ' describe '),
+        (r"\bvalue[ _]counts?\b|\bfrequenc(y|ies)\b|\bclass balance\b", ' distribution '),
+        (r"\b(null|nan|na|empty|missing)( values?| entries| cells)?\b", ' missing '),
+        (r"\b(number|count|total number) of\b|\bhow many\b", ' count '),
+        (r"\b(average|avg|mean value)\b", ' mean '),
+        (r"\b(distinct|unique|nunique|cardinality)\b", ' unique '),
+        (r"\b(correlat\w*|corr(\(\))?)\b", ' correlation '),
+        (r"\b(std|standard deviation)\b", ' std '),
+        (r"\b(rows?|records?|observations?|entries|samples?)\b", ' row '),
+        (r"\b(data ?types?|dtypes?)\b", ' dtype '),
+        (r"\bnumer(ic|ical)\b", ' numeric '),
+    )
+]
+"""Phrases rewritten to a canonical word before tasks are compared, applied in order to the lowercased task; comparison operators, negations and directions become words such as `op_gt`, so they survive the punctuation."""
+
+POLARITY_WORDS = {'op_ge', 'op_le', 'op_ne', 'op_eq', 'op_gt', 'op_lt', 'not', 'high', 'low'}
+"""Intent words that reverse or change the filter of a task; two tasks are only the same request if they share all of them."""
+
+STOP_WORDS = {
+    'a', 'an', 'the', 'of', 'for', 'in', 'on', 'to', 'and', 'or', 'by', 'with', 'from', 'at', 'as', 'is', 'are',
+    'be', 'this', 'that', 'these', 'those', 'its', 'it', 'their', 'each', 'every', 'all', 'any', 'what', 'which',
+    'calculate', 'compute', 'find', 'determine', 'get', 'show', 'display', 'list', 'identify', 'provide', 'report',
+    'check', 'generate', 'obtain', 'print', 'return', 'give', 'perform', 'analyze', 'analyse', 'examine', 'using',
+    'dataset', 'dataframe', 'data', 'df', 'table', 'value', 'values', 'column', 'columns', 'variable', 'variables',
+    'feature', 'features', 'field', 'fields', 'please', 'also', 'between', 'among', 'across', 'per', 'against',
+    'versus', 'vs', 'where', 'whose', 'have', 'has', 'having',
+}
+"""Words carrying no intent of their own; columns only matter through the names a task mentions."""
+
+GROUP_PATTERN = r"\b(?:grouped by|group by|groupby|broken down by|split by|per|for each|for every|by|across)\s+[`'\"]?"
+"""Matches the words introducing the column a task groups by, whatever the phrasing."""
+
+WORD_PATTERN = re.compile(r"[a-z0-9_]+")
+"""Matches the words of a lowercased task."""
+
+NUMBER_PATTERN = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?![\w.])")
+"""Matches the standalone numbers of a task, such as the `10` of a top 10."""
+
+
+class MemoEntry(TypedDict):
+    """
+    A task answered earlier in the run, kept to answer repeated requests.
+    """
+    task: str
+    intent: str
+    anchors: list[str]
+    output: str
+    seconds: float
+
+
+class TaskSource(TypedDict):
+    """
+    How one task of a coder stage is answered: by running it, or from an earlier answer.
+    """
+    task: str
+    intent: str
+    anchors: list[str]
+    duplicate_of: int | None
+    memo: MemoEntry | None
+
+
+def stem_word(word: str) -> str:
+    """Reduces the plural forms of a word to its singular."""
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def get_task_anchors(task: str, columns: list) -> list[str]:
+    """
+    Returns the columns and numbers a task refers to.
+
+    Two tasks can only be the same request if they name the same columns and numbers.
+
+    Args:
+        task (str): The task.
+        columns (list): The columns of the dataset.
+
+    Returns:
+        list[str]: The sorted lowercased column names and numbers found in the task.
+    """
+    text = task.lower()
+    anchors = {str(column).lower() for column in columns
+               if re.search(rf"(?<![\w]){re.escape(str(column).lower())}(?![\w])", text)}
+    return sorted(anchors | set(NUMBER_PATTERN.findall(text)))
+
+
+def normalize_task(task: str, anchors: list[str]) -> str:
+    """
+    Reduces a task to the words of its intent.
+
+    The task is lowercased, a column it groups by is marked with a `group_by_`
+    word, its synonyms are rewritten by `TASK_SYNONYMS`, the column names and
+    numbers it refers to are removed, and the remaining words are stemmed,
+    deduplicated and sorted, ignoring `STOP_WORDS`.
+
+    Args:
+        task (str): The task.
+        anchors (list[str]): The columns and numbers returned by `get_task_anchors`.
+
+    Returns:
+        str: The intent words, separated by spaces.
+    """
+    text = task.lower()
+    for index, anchor in enumerate(sorted(anchors, key=len, reverse=True)):
+        text = re.sub(rf"{GROUP_PATTERN}{re.escape(anchor)}(?![\w])", f' group_by_{index} ', text)
+        text = re.sub(rf"(?<![\w]){re.escape(anchor)}(?![\w])", ' ', text)
+    for pattern, replacement in TASK_SYNONYMS:
+        text = pattern.sub(replacement, text)
+    words = {stem_word(word) for word in WORD_PATTERN.findall(text) if word not in STOP_WORDS}
+    return ' '.join(sorted(words))
+
+
+def is_same_request(intent: str, anchors: list[str], other_intent: str, other_anchors: list[str]) -> bool:
+    """
+    Checks whether two normalized tasks ask for the same result.
+
+    Args:
+        intent (str): The intent words of the first task.
+        anchors (list[str]): The columns and numbers of the first task.
+        other_intent (str): The intent words of the second task.
+        other_anchors (list[str]): The columns and numbers of the second task.
+
+    Returns:
+        bool: True if the tasks refer to the same columns and numbers, have the
+              same `POLARITY_WORDS`, and their intent words are equal or overlap
+              by at least `SIMILARITY_THRESHOLD`.
+    """
+    if anchors != other_anchors:
+        return False
+    if intent == other_intent:
+        return True
+    words, other_words = set(intent.split()), set(other_intent.split())
+    if words & POLARITY_WORDS != other_words & POLARITY_WORDS:
+        return False
+    if not words or not other_words:
+        return False
+    return len(words & other_words) / len(words | other_words) >= SIMILARITY_THRESHOLD
+
+
+def plan_tasks(task_list: list, memo: list[MemoEntry], columns: list) -> list[TaskSource]:
+    """
+    Decides which tasks of a coder stage must run and which repeat an earlier request.
+
+    A task repeating an earlier task of the same list is answered by that
+    task, and a task repeating a task answered earlier in the run is answered
+    from the memo, so neither costs a pandas agent round trip.
+
+    Args:
+        task_list (list): The tasks of the stage, in plan order.
+        memo (list[MemoEntry]): The tasks answered earlier in the run.
+        columns (list): The columns of the dataset.
+
+    Returns:
+        list[TaskSource]: One source per task, in plan order; the tasks to run
+                          have neither `duplicate_of` nor `memo` set.
+    """
+    sources = []
+    for task in task_list:
+        anchors = get_task_anchors(str(task), columns)
+        intent = normalize_task(str(task), anchors)
+        duplicate_of = next((index for index, source in enumerate(sources)
+                             if source['duplicate_of'] is None and source['memo'] is None
+                             and is_same_request(intent, anchors, source['intent'], source['anchors'])), None)
+        entry = None if duplicate_of is not None else next(
+            (entry for entry in memo if is_same_request(intent, anchors, entry['intent'], entry['anchors'])), None)
+        sources.append(TaskSource(task=task, intent=intent, anchors=anchors, duplicate_of=duplicate_of, memo=entry))
+    return sources
+
+
+def get_tasks_to_run(sources: list[TaskSource]) -> list[int]:
+    """Returns the plan positions of the tasks that are not answered by an earlier one."""
+    return [index for index, source in enumerate(sources) if source['duplicate_of'] is None and source['memo'] is None]
+
+
+def get_task_results(sources: list[TaskSource], results: dict[int, TaskResult]) -> list[TaskResult]:
+    """
+    Completes the results of the tasks that ran with the answers of the tasks that did not.
+
+    A repeated task receives the output of the task or memo entry answering
+    it, and the run time of that answer as the time it saved.
+
+    Args:
+        sources (list[TaskSource]): The sources returned by `plan_tasks`.
+        results (dict[int, TaskResult]): The results of the tasks that ran, keyed by plan position.
+
+    Returns:
+        list[TaskResult]: The result of every task, in plan order.
+    """
+    task_results = []
+    for index, source in enumerate(sources):
+        if index in results:
+            task_results.append(results[index])
+            continue
+        answer = source['memo'] or results[source['duplicate_of']]
+        task_results.append(TaskResult(task=source['task'], output=answer['output'], error=None, sampling=None,
+                                       replayed=False, guard=[], seconds=answer['seconds'], memoized=True))
+    return task_results
+
+
+def get_memo_entries(sources: list[TaskSource], results: list[TaskResult]) -> list[MemoEntry]:
+    """
+    Turns the successful results of the tasks that ran into memo entries.
+
+    Args:
+        sources (list[TaskSource]): The sources returned by `plan_tasks`.
+        results (list[TaskResult]): The result of every task, in plan order.
+
+    Returns:
+        list[MemoEntry]: The entries answering later repeats of these tasks.
+    """
+    return [MemoEntry(task=source['task'], intent=source['intent'], anchors=source['anchors'],
+                      output=result['output'], seconds=result['seconds'])
+            for source, result in zip(sources, results)
+            if not result['memoized'] and result['error'] is None and result['output'] != 'None'
+            and not is_error_output(str(result['output']))]
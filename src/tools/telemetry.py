@@ -0,0 +1,330 @@
+"""Run Telemetry"""
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Iterator
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from typing_extensions import TypedDict
+
+from utils.sqlite_store import SQLiteStore
+
+
+TELEMETRY_PATH = './logs/.telemetry/telemetry.sqlite'
+"""Location of the SQLite database holding the spans of every run."""
+
+PROMETHEUS_PATH = './logs/.telemetry/metrics.prom'
+"""Location of the Prometheus text file written by the `prometheus` exporter."""
+
+TELEMETRY_EXPORTER = os.getenv('TELEMETRY_EXPORTER', '').lower()
+"""Optional exporter of finished spans: `prometheus`, `otel`, or empty for the local store only."""
+
+MODEL_PRICES = {
+    "models/gemini-2.5-pro": (1.25, 10.0),
+    "models/gemini-2.5-flash": (0.30, 2.50),
+}
+"""Estimated USD price per million input and output tokens, by model name."""
+
+PANDAS_TOOL_NAME = 'python_repl_ast'
+"""Name of the tool executing the pandas code written by the coder agents."""
+
+SPAN_METRICS = ['wall_seconds', 'llm_seconds', 'llm_calls', 'limiter_seconds', 'pandas_seconds',
+                'input_tokens', 'output_tokens', 'cost']
+"""Metrics recorded for every span, in table column order."""
+
+logger = logging.getLogger(__name__)
+
+
+class Span(TypedDict):
+    """
+    The telemetry of one node execution, or of one task within a node.
+    """
+    run_id: str | None
+    node: str
+    task: str | None
+    started: float
+    wall_seconds: float
+    llm_seconds: float
+    llm_calls: int
+    limiter_seconds: float
+    pandas_seconds: float
+    input_tokens: int
+    output_tokens: int
+    cost: float
+
+
+open_spans: ContextVar[tuple[Span, ...]] = ContextVar('open_spans', default=())
+"""The spans open in the current context, outermost first. Metrics are added to all of them."""
+
+
+def add_metric(name: str, value: float):
+    """
+    Adds a measurement to every span open in the current context.
+
+    Args:
+        name (str): The metric, one of `SPAN_METRICS`.
+        value (float): The amount to add.
+    """
+    for span in open_spans.get():
+        span[name] += value
+
+
+def get_cost(model_name: str, input_tokens: int, output_tokens: int) -> float:
+    """
+    Estimates the price of a model call.
+
+    Args:
+        model_name (str): The model name.
+        input_tokens (int): The prompt tokens.
+        output_tokens (int): The completion tokens.
+
+    Returns:
+        float: The estimated cost in USD, 0 for models without a known price.
+    """
+    input_price, output_price = MODEL_PRICES.get(model_name, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """
+    Measures model latency, token usage and pandas tool time of the spans open in the calling context.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._started = {}
+
+    def on_chat_model_start(self, serialized: dict, messages: list, *, run_id: UUID, **kwargs: Any) -> Any:
+        self._started[run_id] = time.monotonic()
+
+    def on_llm_start(self, serialized: dict, prompts: list, *, run_id: UUID, **kwargs: Any) -> Any:
+        self._started[run_id] = time.monotonic()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> Any:
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None) or {}
+                input_tokens += usage.get('input_tokens', 0)
+                output_tokens += usage.get('output_tokens', 0)
+        add_metric('llm_seconds', time.monotonic() - started)
+        add_metric('llm_calls', 1)
+        add_metric('input_tokens', input_tokens)
+        add_metric('output_tokens', output_tokens)
+        add_metric('cost', get_cost(self.model_name, input_tokens, output_tokens))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> Any:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            add_metric('llm_seconds', time.monotonic() - started)
+            add_metric('llm_calls', 1)
+
+    def on_tool_start(self, serialized: dict, input_str: str, *, run_id: UUID, **kwargs: Any) -> Any:
+        if (serialized or {}).get('name') == PANDAS_TOOL_NAME:
+            self._started[run_id] = time.monotonic()
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> Any:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            add_metric('pandas_seconds', time.monotonic() - started)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> Any:
+        self.on_tool_end(None, run_id=run_id)
+
+
+class TelemetryStore(SQLiteStore):
+    """
+    SQLite store of the spans of every run, with Prometheus text and OpenTelemetry exports.
+    """
+
+    def __init__(self, path: str = TELEMETRY_PATH, exporter: str = TELEMETRY_EXPORTER):
+        super().__init__(path)
+        self.exporter = exporter
+        self._tracer = None
+
+    def create_schema(self, connection: sqlite3.Connection):
+        """Creates the span table and its run index."""
+        connection.execute("CREATE TABLE IF NOT EXISTS spans "
+                           "(run_id TEXT, node TEXT, task TEXT, started REAL, wall_seconds REAL, llm_seconds REAL, "
+                           "llm_calls INTEGER, limiter_seconds REAL, pandas_seconds REAL, input_tokens INTEGER, "
+                           "output_tokens INTEGER, cost REAL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS spans_run ON spans (run_id, started)")
+
+    def add_span(self, span: Span):
+        """
+        Stores a finished span and passes it to the configured exporter.
+
+        Args:
+            span (Span): The finished span.
+        """
+        with self._lock, self._connect() as connection:
+            connection.execute("INSERT INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               (span['run_id'], span['node'], span['task'], span['started'],
+                                *[span[metric] for metric in SPAN_METRICS]))
+        try:
+            if self.exporter == 'prometheus' and span['task'] is None:
+                self.write_prometheus()
+            elif self.exporter == 'otel':
+                self.export_otel(span)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.warning("Telemetry export failed", exc_info=True)
+
+    def get_spans(self, run_id: str) -> list[Span]:
+        """
+        Returns the spans of a run in start order.
+
+        Args:
+            run_id (str): The run UUID.
+
+        Returns:
+            list[Span]: The node spans (`task` is None) and task spans of the run.
+        """
+        with self._lock, self._connect() as connection:
+            rows = connection.execute("SELECT * FROM spans WHERE run_id = ? ORDER BY started", (run_id,)).fetchall()
+        return [Span(**dict(row)) for row in rows]
+
+    def get_node_summary(self, run_id: str | None = None) -> list[dict]:
+        """
+        Aggregates the node spans by node.
+
+        Args:
+            run_id (str | None, optional): The run UUID, or None for every run. Defaults to None.
+
+        Returns:
+            list[dict]: One dictionary per node with its execution count and summed metrics.
+        """
+        totals = ', '.join(f"SUM({metric}) AS {metric}" for metric in SPAN_METRICS)
+        query = f"SELECT node, COUNT(*) AS executions, {totals} FROM spans WHERE task IS NULL"
+        with self._lock, self._connect() as connection:
+            if run_id is None:
+                rows = connection.execute(query + " GROUP BY node ORDER BY MIN(started)").fetchall()
+            else:
+                rows = connection.execute(query + " AND run_id = ? GROUP BY node ORDER BY MIN(started)", (run_id,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def export_prometheus(self) -> str:
+        """
+        Renders the node totals of every run in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics, one counter per span metric labelled by node.
+        """
+        summary = self.get_node_summary()
+        lines = []
+        for metric in ['executions'] + SPAN_METRICS:
+            name = f"cognitoeda_node_{metric}_total"
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(f'{name}{{node="{row["node"]}"}} {row[metric]}' for row in summary)
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self):
+        """Writes `export_prometheus` atomically to `PROMETHEUS_PATH`, for a node exporter textfile collector."""
+        os.makedirs(os.path.dirname(PROMETHEUS_PATH), exist_ok=True)
+        with open(PROMETHEUS_PATH + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(self.export_prometheus())
+        os.replace(PROMETHEUS_PATH + '.tmp', PROMETHEUS_PATH)
+
+    def export_otel(self, span: Span):
+        """
+        Emits a finished span through the OpenTelemetry tracer provider of the process.
+
+        An OTLP exporter is installed when `opentelemetry-exporter-otlp` is
+        available; otherwise spans go to whichever provider the process configured.
+
+        Args:
+            span (Span): The finished span.
+        """
+        if self._tracer is None:
+            from opentelemetry import trace  # pylint: disable=import-outside-toplevel
+            try:
+                from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter  # pylint: disable=import-outside-toplevel
+                from opentelemetry.sdk.trace import TracerProvider  # pylint: disable=import-outside-toplevel
+                from opentelemetry.sdk.trace.export import BatchSpanProcessor  # pylint: disable=import-outside-toplevel
+                provider = TracerProvider()
+                provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+                trace.set_tracer_provider(provider)
+            except ImportError:
+                logger.info("opentelemetry-exporter-otlp is not installed, using the configured tracer provider")
+            self._tracer = trace.get_tracer('cognitoeda')
+        start_ns = int(span['started'] * 1e9)
+        otel_span = self._tracer.start_span(span['node'] if span['task'] is None else f"{span['node']}: {span['task'][:80]}",
+                                            start_time=start_ns)
+        otel_span.set_attributes({'run_id': span['run_id'] or '', **{metric: span[metric] for metric in SPAN_METRICS}})
+        otel_span.end(end_time=start_ns + int(span['wall_seconds'] * 1e9))
+
+
+TELEMETRY = TelemetryStore()
+"""The telemetry store shared in the process."""
+
+
+@contextmanager
+def record_span(run_id: str | None = None, node: str | None = None, task: str | None = None) -> Iterator[Span]:
+    """
+    Measures a node or task and stores its span when it exits.
+
+    Model calls, limiter waits and pandas execution in the block, including in
+    tasks it starts, are added to this span and to the spans enclosing it.
+
+    Args:
+        run_id (str | None, optional): The run UUID, or None to use the one of the
+                                       enclosing span. Defaults to None.
+        node (str | None, optional): The graph node name, or None to use the one of
+                                     the enclosing span. Defaults to None.
+        task (str | None, optional): The task within the node, or None for the node itself. Defaults to None.
+
+    Yields:
+        Span: The open span.
+    """
+    parent = open_spans.get()[-1] if open_spans.get() else None
+    span = Span(run_id=run_id or (parent and parent['run_id']), node=node or (parent and parent['node']) or 'unknown',
+                task=task, started=time.time(),
+                **{metric: 0 for metric in SPAN_METRICS})
+    token = open_spans.set(open_spans.get() + (span,))
+    started = time.monotonic()
+    try:
+        yield span
+    finally:
+        open_spans.reset(token)
+        span['wall_seconds'] = time.monotonic() - started
+        TELEMETRY.add_span(span)
+
+
+@contextmanager
+def measure(metric: str) -> Iterator[None]:
+    """
+    Adds the duration of a block to a time metric of the open spans.
+
+    Args:
+        metric (str): The time metric, such as 'pandas_seconds'.
+    """
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        add_metric(metric, time.monotonic() - started)
+
+
+def traced_node(node_function: Callable) -> Callable:
+    """
+    Decorates an asynchronous graph node so every execution is recorded as a node span.
+
+    Args:
+        node_function (Callable): The node, called with the state and the runnable config.
+
+    Returns:
+        Callable: The node recording a span named after the executing graph node.
+    """
+    @wraps(node_function)
+    async def traced(state, config):
+        with record_span(config.get('metadata').get("uuid"), config.get('metadata').get("langgraph_node")):
+            return await node_function(state, config)
+    return traced
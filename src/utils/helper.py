@@ -1,9 +1,12 @@
 """Helper Functions"""
+import ast
+import json
 from enum import Enum
-import glob
-from datetime import datetime
 import pandas as pd
 
+from utils.run_index import RUN_INDEX
+from utils.stage_log import STAGE_LOG_EXTENSION
+
 
 class ModelClasses(Enum):
     """
@@ -16,37 +19,72 @@ class ModelClasses(Enum):
     ANOMALY_DETECTION = "Anomaly Detection"
 
 
-def get_logs_info():
+def write_run_config(run_id: str, config: dict):
+    """
+    Saves the configuration of a run as './logs/<uuid>/config.json'.
+
+    Args:
+        run_id (str): The run UUID, whose directory must exist.
+        config (dict): The JSON-serializable configuration, dataset handle and compaction report.
+    """
+    with open(f'./logs/{run_id}/config.json', 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+
+
+def read_run_config(path: str) -> dict:
     """
-    Scans the log directory, parses file information, and returns a structured DataFrame.
+    Reads a configuration saved by `write_run_config`.
+
+    Args:
+        path (str): The location of the 'config.json' file.
+
+    Returns:
+        dict: The configuration, also for the runs saved by earlier versions as a Python dict literal.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return ast.literal_eval(text)
+
+
+def read_file_bytes(path: str) -> bytes:
+    """
+    Returns the content of a run file, for a download button.
+
+    Args:
+        path (str): The location of the file.
+
+    Returns:
+        bytes: The content of the file.
+    """
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def get_logs_info(run_ids: list[str]) -> pd.DataFrame:
+    """
+    Returns the files of some runs from the run index as a structured DataFrame.
+
+    The files are read from the run index (`utils.run_index`) rather than by
+    scanning './logs/', so only the requested runs are looked up. Each row
+    describes a file with the run `uuid`, `file_name`, `path`, `stage_name`,
+    `timestamp` and `size`, and the success status of the run, which is set
+    when the run directory holds an 'index.html' file.
 
-    This function performs the following steps:
-    1.  Searches for all files within the subdirectories of the './logs/' directory.
-    2.  Creates a pandas DataFrame where each row corresponds to a found file.
-    3.  Parses file paths to extract metadata such as the run `uuid`, `file_name`,
-        `stage_name`, and `timestamp`.
-    4.  Determines the success status of each run by checking for the presence of an
-        'index.html' file within the run's directory.
-    5.  Sorts the resulting DataFrame by `uuid` and `timestamp`.
+    Args:
+        run_ids (list[str]): The run UUIDs, typically the runs of one history page.
 
     Returns:
         pd.DataFrame: A DataFrame containing detailed information about each log file,
                       including parsed metadata and the success status of the run.
     """
-    logs_info = glob.glob('.\\logs\\*\\*', recursive=True)
-    log_info_df = pd.DataFrame(index=logs_info)
-    log_info_df['uuid'] = log_info_df.index.str.split('\\').str[-2]
-    log_info_df['file_name'] = log_info_df.index.str.split('\\').str[-1]
-    log_info_df['path'] = log_info_df.index
-    log_info_df['stage_name'] = log_info_df['file_name'].str.split('.').str[0].replace(r'\d', '', regex=True).map(lambda x:x[:-1] if x[-1] == '-' else x)
-    log_info_df['stage_check'] = log_info_df['file_name'].str.split('.').str[1] == 'log'
-    log_info_df['timestamp'] = log_info_df['file_name'].str.split('-').str[-1].str.split('.').str[0].map(lambda x:x if x.isdigit() else None)
-    log_info_df['formatted_time'] = log_info_df['timestamp'].apply(lambda x: datetime.strptime(x, "%Y%m%d%H%M%S").strftime("%Y-%m-%d %H:%M:%S") if x is not None else None)
-    log_info_df['success'] = False
-    grouped_df = log_info_df.groupby('uuid')
-    for uuid, group in grouped_df:
-        if 'index.html' in group['file_name'].values:
-            log_info_df.loc[log_info_df[log_info_df['uuid'] == uuid].index, 'success'] = True
+    log_info_df = pd.DataFrame(RUN_INDEX.get_files(run_ids) if run_ids else [],
+                               columns=['uuid', 'file_name', 'stage_name', 'path', 'size', 'timestamp'])
+    log_info_df['stage_check'] = log_info_df['file_name'].str.endswith(('.log', STAGE_LOG_EXTENSION))
+    log_info_df['formatted_time'] = pd.to_datetime(log_info_df['timestamp'], format="%Y%m%d%H%M%S").dt.strftime("%Y-%m-%d %H:%M:%S")
+    log_info_df['success'] = log_info_df['uuid'].isin(log_info_df.loc[log_info_df['file_name'] == 'index.html', 'uuid'])
     log_info_df.sort_values(by=['formatted_time', 'uuid'], inplace=True, ascending=False)
     log_info_df.reset_index(drop=True, inplace=True)
     return log_info_df
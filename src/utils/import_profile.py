@@ -0,0 +1,117 @@
+"""Import Time Profiling"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+from typing_extensions import TypedDict
+
+
+SRC_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+"""Directory holding the application modules, added to the path of the profiled interpreter."""
+
+STARTUP_MODULES = [
+    'page_section.intro_page',
+    'page_section.agent_page',
+    'page_section.history_page',
+]
+"""Modules imported by the Streamlit app when a page is opened."""
+
+DEFERRED_MODULES = [
+    'graph',
+    'tools.agents',
+    'langchain.chat_models',
+    'langchain_community',
+    'langchain_experimental',
+    'mlflow',
+    'sklearn',
+    'statsmodels',
+]
+"""Modules only the worker processes running an EDA job may import."""
+
+IMPORT_TIME_PATTERN = re.compile(r'^import time:\s+(?P<self>\d+)\s+\|\s+(?P<cumulative>\d+)\s+\|(?P<indent>\s*)(?P<module>\S+)$')
+"""Parses a line of the `-X importtime` report: self and cumulative microseconds, and the module name."""
+
+
+class ImportTiming(TypedDict):
+    """
+    The import time of one module, as reported by `python -X importtime`.
+    """
+    module: str
+    self_seconds: float
+    cumulative_seconds: float
+
+
+def profile_imports(module: str) -> list[ImportTiming]:
+    """
+    Imports a module in a fresh interpreter and collects the import time of every module it loads.
+
+    Args:
+        module (str): The dotted name of the module to import.
+
+    Returns:
+        list[ImportTiming]: One timing per loaded module, in import completion order.
+    """
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [SRC_PATH, os.getenv('PYTHONPATH')]))}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=SRC_PATH, env=env, capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing `{module}` failed:\n{result.stderr}")
+    timings = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            timings.append(ImportTiming(module=match.group('module'),
+                                        self_seconds=int(match.group('self')) / 1e6,
+                                        cumulative_seconds=int(match.group('cumulative')) / 1e6))
+    return timings
+
+
+def get_deferred_imports(timings: list[ImportTiming]) -> list[str]:
+    """
+    Returns the deferred modules loaded by an import.
+
+    Args:
+        timings (list[ImportTiming]): The timings returned by `profile_imports`.
+
+    Returns:
+        list[str]: The entries of `DEFERRED_MODULES` that were imported.
+    """
+    loaded = {timing['module'] for timing in timings}
+    return [module for module in DEFERRED_MODULES if module in loaded]
+
+
+def main():
+    """
+    Reports the import time of the Streamlit pages and fails on a startup regression.
+
+    Every page module is imported in a fresh interpreter. The exit status is 1
+    if a page imports one of the `DEFERRED_MODULES`, or takes longer than
+    `--budget-seconds` to import.
+    """
+    parser = argparse.ArgumentParser(description="Profile the import time of the CognitoEDA Streamlit pages.")
+    parser.add_argument("modules", nargs="*", default=STARTUP_MODULES, help="Modules to profile")
+    parser.add_argument("--budget-seconds", type=float, default=None, help="Maximum import time of each module")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports listed per module")
+    args = parser.parse_args()
+
+    regressions = []
+    for module in args.modules:
+        timings = profile_imports(module)
+        total = next(timing['cumulative_seconds'] for timing in timings if timing['module'] == module)
+        print(f"{module}: {total:.2f} seconds")
+        for timing in sorted(timings, key=lambda timing: timing['self_seconds'], reverse=True)[:args.top]:
+            print(f"    {timing['self_seconds']:8.3f} s  {timing['module']}")
+        deferred = get_deferred_imports(timings)
+        if deferred:
+            regressions.append(f"{module} imports {', '.join(deferred)}")
+        if args.budget_seconds is not None and total > args.budget_seconds:
+            regressions.append(f"{module} takes {total:.2f} seconds to import (budget {args.budget_seconds:.2f})")
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
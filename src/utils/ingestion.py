@@ -0,0 +1,436 @@
+"""Dataset Ingestion"""
+import io
+import os
+import uuid
+from functools import lru_cache
+from typing import BinaryIO
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pandas.tseries.api import guess_datetime_format
+from pyarrow import feather
+from typing_extensions import TypedDict
+
+from tools.dataset import DATASET_DIR, DatasetHandle, get_dataset_path, new_dataset_digest, update_dataset_digest
+
+
+CHUNK_SIZE = 100000
+"""Number of CSV rows read and converted at a time."""
+
+PREVIEW_ROWS = 1000
+"""Number of leading rows kept in memory for the UI."""
+
+DISTINCT_LIMIT = 1000
+"""Number of distinct values tracked per column before cardinality is reported as a lower bound."""
+
+CATEGORY_MAX_RATIO = 0.5
+"""Largest share of distinct values among the non-null values of a text column converted to a categorical."""
+
+INTEGER_DTYPES = ('int8', 'int16', 'int32')
+"""Integer dtypes a 64-bit integer column is narrowed to, narrowest first."""
+
+FLOAT32_RTOL = 1e-6
+"""Largest relative change of a value for a float column to be narrowed to `float32`; rounding to its 24-bit mantissa stays well within it, values out of its range do not."""
+
+DATE_DIRECTIVES = (('%Y', '%y'), ('%m', '%b', '%B'))
+"""Groups of strftime directives a guessed date format must each contain, so codes such as `2020` stay text."""
+
+
+class IngestionResult(TypedDict):
+    """
+    Outcome of streaming a CSV upload into the dataset registry.
+    """
+    dataset: DatasetHandle
+    preview: pd.DataFrame
+    profile: pd.DataFrame
+    columns: list
+    row_count: int
+
+
+class ColumnCompaction(TypedDict):
+    """
+    The dtype change of one column of a compacted dataset.
+    """
+    column: str
+    dtype_before: str
+    dtype_after: str
+
+
+class CompactionReport(TypedDict):
+    """
+    Outcome of compacting the dtypes of a registered dataset, recorded in the run configuration.
+    """
+    memory_before: int
+    memory_after: int
+    columns: list[ColumnCompaction]
+
+
+class ColumnProfiler:
+    """
+    Accumulates per-column statistics chunk by chunk in bounded memory.
+    """
+
+    def __init__(self, columns: pd.Index):
+        self.columns = columns
+        self.row_count = 0
+        self.null_count = pd.Series(0, index=columns, dtype='int64')
+        self.numeric_stats = pd.DataFrame({'count': 0.0, 'sum': 0.0, 'sum_sq': 0.0, 'min': np.nan, 'max': np.nan}, index=columns)
+        self.distinct_values = {column: set() for column in columns}
+
+    def update(self, chunk: pd.DataFrame):
+        """
+        Adds a chunk of rows to the running statistics.
+
+        Args:
+            chunk (pd.DataFrame): The next chunk of the dataset.
+        """
+        self.row_count += len(chunk)
+        self.null_count += chunk.isna().sum()
+        numeric_chunk = chunk.select_dtypes(include='number').astype(float)
+        numeric_columns = numeric_chunk.columns
+        self.numeric_stats.loc[numeric_columns, 'count'] += numeric_chunk.count()
+        self.numeric_stats.loc[numeric_columns, 'sum'] += numeric_chunk.sum()
+        self.numeric_stats.loc[numeric_columns, 'sum_sq'] += (numeric_chunk ** 2).sum()
+        self.numeric_stats.loc[numeric_columns, 'min'] = np.fmin(self.numeric_stats.loc[numeric_columns, 'min'], numeric_chunk.min())
+        self.numeric_stats.loc[numeric_columns, 'max'] = np.fmax(self.numeric_stats.loc[numeric_columns, 'max'], numeric_chunk.max())
+        for column, values in self.distinct_values.items():
+            if len(values) < DISTINCT_LIMIT:
+                values.update(chunk[column].dropna().unique()[:DISTINCT_LIMIT].tolist())
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Returns the column profile accumulated so far.
+
+        Returns:
+            pd.DataFrame: One row per column with null counts, cardinality and,
+                          for numeric columns, mean, standard deviation, min and max.
+        """
+        unique = pd.Series({column: len(values) for column, values in self.distinct_values.items()})
+        profile = pd.DataFrame({
+            'nulls': self.null_count,
+            'null_pct': (self.null_count / max(self.row_count, 1) * 100).round(2),
+            'unique': unique.where(unique < DISTINCT_LIMIT).astype('Int64').astype(str).replace('<NA>', f'{DISTINCT_LIMIT}+'),
+        }, index=self.columns)
+        count = self.numeric_stats['count'].where(self.numeric_stats['count'] > 0)
+        mean = self.numeric_stats['sum'] / count
+        variance = (self.numeric_stats['sum_sq'] / count - mean ** 2).clip(lower=0) * count / (count - 1).clip(lower=1)
+        return profile.join(pd.DataFrame({
+            'mean': mean,
+            'std': np.sqrt(variance),
+            'min': self.numeric_stats['min'],
+            'max': self.numeric_stats['max'],
+        }).round(4))
+
+
+def _find_incompatible_columns(chunk: pd.DataFrame, schema: pa.Schema) -> list[str]:
+    """Returns the columns of a chunk that cannot be converted to the established Arrow schema."""
+    incompatible = []
+    for field in schema:
+        try:
+            pa.array(chunk[field.name], type=field.type, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, ValueError, TypeError):
+            incompatible.append(field.name)
+    return incompatible
+
+
+def _stream_csv(file: BinaryIO, path: str, chunk_size: int, preview_rows: int, string_columns: list[str]) -> tuple[IngestionResult | None, list[str]]:
+    """
+    Streams a CSV into an Arrow file once, with the given columns read as strings.
+
+    Returns the ingestion result together with any columns whose type changed
+    after the first chunk; when that list is not empty the file is incomplete
+    and the caller must stream again with those columns read as strings.
+    """
+    file.seek(0)
+    text_file = io.TextIOWrapper(file, encoding='utf-8', newline='')
+    dtype = {column: str for column in string_columns}
+    writer, profiler, digest = None, None, None
+    preview = pd.DataFrame()
+    try:
+        for chunk in pd.read_csv(text_file, chunksize=chunk_size, dtype=dtype):
+            if writer is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                writer = pa.ipc.new_file(path, schema)
+                profiler = ColumnProfiler(chunk.columns)
+                digest = new_dataset_digest(chunk)
+            incompatible = _find_incompatible_columns(chunk, schema)
+            if incompatible:
+                return None, incompatible
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            update_dataset_digest(digest, chunk)
+            profiler.update(chunk)
+            if len(preview) < preview_rows:
+                preview = pd.concat([preview, chunk.head(preview_rows - len(preview))])
+    finally:
+        text_file.detach()
+        if writer is not None:
+            writer.close()
+    if writer is None or profiler.row_count == 0:
+        raise ValueError("The uploaded CSV file contains no rows")
+    return IngestionResult(
+        dataset=DatasetHandle(hash=digest.hexdigest(), path=path),
+        preview=preview.reset_index(drop=True),
+        profile=profiler.to_frame(),
+        columns=list(profiler.columns),
+        row_count=profiler.row_count
+    ), []
+
+
+def ingest_csv(file: BinaryIO, chunk_size: int = CHUNK_SIZE, preview_rows: int = PREVIEW_ROWS) -> IngestionResult:
+    """
+    Streams a CSV file into the dataset registry in bounded memory.
+
+    The CSV is read `chunk_size` rows at a time and each chunk is appended to an
+    uncompressed Arrow file, while the content hash, the column profile and a
+    preview of the first `preview_rows` rows are accumulated. The Arrow schema
+    is taken from the first chunk; if a later chunk does not fit it (e.g. text
+    appearing in a column that started out numeric), the file is streamed again
+    with the offending columns read as strings.
+
+    Args:
+        file (BinaryIO): A seekable binary file object holding the CSV, such as
+                         a Streamlit `UploadedFile` or an opened file path.
+        chunk_size (int, optional): Rows per chunk. Defaults to `CHUNK_SIZE`.
+        preview_rows (int, optional): Rows kept for the UI. Defaults to `PREVIEW_ROWS`.
+
+    Returns:
+        IngestionResult: The dataset handle, the preview, the column profile,
+                         the column list for target selection and the row count.
+    """
+    os.makedirs(DATASET_DIR, exist_ok=True)
+    tmp_path = os.path.join(DATASET_DIR, f'{uuid.uuid4()}.arrow.tmp')
+    string_columns = []
+    try:
+        while True:
+            result, incompatible = _stream_csv(file, tmp_path, chunk_size, preview_rows, string_columns)
+            if not incompatible:
+                break
+            string_columns.extend(incompatible)
+        path = get_dataset_path(result['dataset']['hash'])
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    result['dataset'] = DatasetHandle(hash=result['dataset']['hash'], path=path)
+    return result
+
+
+def get_date_format(values: pd.Series) -> str | None:
+    """
+    Guesses the format of a text column holding dates.
+
+    Args:
+        values (pd.Series): The non-null values of the column in a chunk.
+
+    Returns:
+        str | None: The strftime format parsing the first value, or None if it
+                    is not a date with a year and a month.
+    """
+    date_format = guess_datetime_format(values.iloc[0]) if len(values) else None
+    if date_format is None or not all(any(directive in date_format for directive in group) for group in DATE_DIRECTIVES):
+        return None
+    return date_format
+
+
+def is_date_column(values: pd.Series, date_format: str) -> bool:
+    """Checks whether every value of a text column chunk parses with a date format."""
+    try:
+        parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+    except (ValueError, TypeError, OverflowError):
+        return False
+    return bool(parsed.notna().all())
+
+
+class CompactionPlanner:
+    """
+    Chooses the narrowest lossless dtype of each column chunk by chunk in bounded memory.
+
+    Integers are narrowed to the narrowest of `INTEGER_DTYPES` holding every
+    value, floats to `float32` when every value survives the round trip within
+    `FLOAT32_RTOL`, and text columns become datetimes when one format parses
+    every value, and optionally categoricals when they have at most
+    `DISTINCT_LIMIT` distinct values, or Arrow strings. Both are opt-in because
+    code written for text columns, such as `df[c].fillna('Unknown')`, fails on
+    a categorical column. Reductions of narrowed integers accumulate in 64
+    bits, but element-wise arithmetic keeps their width; the dtype of every
+    narrowed column is recorded in the compaction report.
+    """
+
+    def __init__(self, columns: pd.Index, keep_columns: set, arrow_strings: bool, categories: bool):
+        self.columns = [column for column in columns if column not in keep_columns]
+        self.arrow_strings = arrow_strings
+        self.categories = categories
+        self.value_count = dict.fromkeys(self.columns, 0)
+        self.int_range = {}
+        self.lossless_floats = {}
+        self.text_columns = {}
+        self.distinct_values = {}
+        self.date_formats = {}
+
+    def update(self, chunk: pd.DataFrame):
+        """
+        Narrows the candidate dtypes with a chunk of rows.
+
+        Args:
+            chunk (pd.DataFrame): The next chunk of the dataset, with its original dtypes.
+        """
+        for column in self.columns:
+            values = chunk[column].dropna()
+            self.value_count[column] += len(values)
+            dtype = chunk[column].dtype
+            if dtype == np.int64 and len(values):
+                low, high = self.int_range.get(column, (values.min(), values.max()))
+                self.int_range[column] = (min(low, values.min()), max(high, values.max()))
+            elif dtype == np.float64:
+                narrowed = values.to_numpy().astype(np.float32).astype(np.float64)
+                self.lossless_floats[column] = (self.lossless_floats.get(column, True)
+                                                and bool(np.allclose(narrowed, values.to_numpy(), rtol=FLOAT32_RTOL, atol=0)))
+            elif dtype == object:
+                is_text = pd.api.types.infer_dtype(values, skipna=True) in ('string', 'empty')
+                self.text_columns[column] = self.text_columns.get(column, True) and is_text
+                if self.text_columns[column]:
+                    self._update_text(column, values)
+
+    def _update_text(self, column: str, values: pd.Series):
+        """Tracks the date format and the distinct values of a text column chunk."""
+        if column not in self.date_formats and len(values):
+            self.date_formats[column] = get_date_format(values)
+        if self.date_formats.get(column) is not None and not is_date_column(values, self.date_formats[column]):
+            self.date_formats[column] = None
+        distinct = self.distinct_values.setdefault(column, set() if self.categories else None)
+        if distinct is not None:
+            distinct.update(values.unique().tolist())
+            if len(distinct) > DISTINCT_LIMIT:
+                self.distinct_values[column] = None
+
+    def get_dtypes(self) -> dict:
+        """
+        Returns the compacted dtype of every column that can be narrowed.
+
+        Returns:
+            dict: The target dtype of each column, a date format string for date
+                  columns, or a `pd.CategoricalDtype` with the sorted categories.
+        """
+        dtypes = {}
+        for column, (low, high) in self.int_range.items():
+            fitting = [dtype for dtype in INTEGER_DTYPES if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max]
+            if fitting:
+                dtypes[column] = fitting[0]
+        for column, lossless in self.lossless_floats.items():
+            if lossless and self.value_count[column]:
+                dtypes[column] = 'float32'
+        for column, is_text in self.text_columns.items():
+            if not is_text or not self.value_count[column]:
+                continue
+            distinct = self.distinct_values[column]
+            if self.date_formats.get(column) is not None:
+                dtypes[column] = self.date_formats[column]
+            elif self.categories and distinct is not None and len(distinct) <= CATEGORY_MAX_RATIO * self.value_count[column]:
+                dtypes[column] = pd.CategoricalDtype(sorted(distinct))
+            elif self.arrow_strings:
+                dtypes[column] = 'string[pyarrow]'
+        return dtypes
+
+
+def convert_chunk(chunk: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """
+    Converts a chunk of rows to the dtypes chosen by `CompactionPlanner`.
+
+    Args:
+        chunk (pd.DataFrame): The chunk with its original dtypes.
+        dtypes (dict): The dtypes returned by `CompactionPlanner.get_dtypes`.
+
+    Returns:
+        pd.DataFrame: The chunk with its columns narrowed.
+    """
+    chunk = chunk.copy(deep=False)
+    for column, dtype in dtypes.items():
+        if isinstance(dtype, str) and dtype.startswith('%'):
+            chunk[column] = pd.to_datetime(chunk[column], format=dtype)
+        else:
+            chunk[column] = chunk[column].astype(dtype)
+    return chunk
+
+
+def get_memory_bytes(chunk: pd.DataFrame) -> int:
+    """Returns the memory of a chunk, counting only the codes of its categorical columns."""
+    memory = chunk.memory_usage(index=False, deep=True)
+    for column in chunk.select_dtypes(include='category').columns:
+        memory[column] = chunk[column].cat.codes.nbytes
+    return int(memory.sum())
+
+
+@lru_cache(maxsize=16)
+def _compact_dataset(dataset_hash: str, path: str, target_column: str | None,
+                     arrow_strings: bool, categories: bool) -> tuple[DatasetHandle, CompactionReport]:
+    """Compacts a registered dataset once per content hash, target column and text options."""
+    table = feather.read_table(path, memory_map=True)
+    planner = CompactionPlanner(pd.Index(table.column_names), {target_column}, arrow_strings, categories)
+    memory_before = 0
+    for batch in table.to_batches(CHUNK_SIZE):
+        chunk = batch.to_pandas(split_blocks=True)
+        planner.update(chunk)
+        memory_before += int(chunk.memory_usage(index=False, deep=True).sum())
+    dtypes = planner.get_dtypes()
+    if not dtypes:
+        return (DatasetHandle(hash=dataset_hash, path=path),
+                CompactionReport(memory_before=memory_before, memory_after=memory_before, columns=[]))
+
+    tmp_path = os.path.join(DATASET_DIR, f'{uuid.uuid4()}.arrow.tmp')
+    writer, digest, memory_after, columns = None, None, 0, []
+    try:
+        for batch in table.to_batches(CHUNK_SIZE):
+            original = batch.to_pandas(split_blocks=True)
+            chunk = convert_chunk(original, dtypes)
+            if writer is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                writer = pa.ipc.new_file(tmp_path, schema)
+                digest = new_dataset_digest(chunk)
+                columns.extend(ColumnCompaction(column=column, dtype_before=str(dtype), dtype_after=str(chunk[column].dtype))
+                               for column, dtype in original.dtypes.items() if column in dtypes)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            update_dataset_digest(digest, chunk)
+            memory_after += get_memory_bytes(chunk)
+        writer.close()
+        compacted_path = get_dataset_path(digest.hexdigest())
+        os.replace(tmp_path, compacted_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    for column, dtype in dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            memory_after += int(dtype.categories.memory_usage(deep=True))
+    return (DatasetHandle(hash=digest.hexdigest(), path=compacted_path),
+            CompactionReport(memory_before=memory_before, memory_after=memory_after, columns=columns))
+
+
+def compact_dataset(dataset: DatasetHandle, target_column: str | None,
+                    arrow_strings: bool = False, categories: bool = False) -> tuple[DatasetHandle, CompactionReport]:
+    """
+    Registers a copy of a dataset with the narrowest lossless dtypes.
+
+    The registered Arrow file is read twice, `CHUNK_SIZE` rows at a time,
+    from its memory map: once to choose the dtypes with `CompactionPlanner`,
+    once to convert and write the compacted file under its own content hash.
+    The target column keeps its dtype, so the problem type, the stratified
+    samples and the target statistics are unchanged. Every node, pandas agent
+    and sandbox process of the run then loads the compacted dataset.
+
+    Args:
+        dataset (DatasetHandle): The handle of the ingested dataset.
+        target_column (str | None): The target column of the run.
+        arrow_strings (bool, optional): Whether the text columns not stored as
+                                        categoricals are stored as Arrow strings.
+                                        Defaults to False.
+        categories (bool, optional): Whether low-cardinality text columns are
+                                     stored as categoricals. Defaults to False.
+
+    Returns:
+        tuple[DatasetHandle, CompactionReport]: The handle of the compacted
+                                                dataset, the input handle if no
+                                                column can be narrowed, and the
+                                                memory of the dataset before and
+                                                after with the changed dtypes.
+    """
+    return _compact_dataset(dataset['hash'], dataset['path'], target_column, arrow_strings, categories)
@@ -0,0 +1,473 @@
+"""Background Jobs"""
+import atexit
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from enum import Enum
+from functools import partial
+
+from typing_extensions import TypedDict
+
+from tools.cache import RESPONSE_CACHE
+from tools.dataset import DatasetHandle
+from tools.helper import ConfigSchema, get_quota_scope
+from tools.rate_limiter import RATE_LIMITER
+from utils.sqlite_store import SQLiteStore
+
+
+JOBS_PATH = './logs/.jobs/jobs.sqlite'
+"""Location of the SQLite database holding the job queue."""
+
+DEFAULT_QUEUE = 'app'
+"""Name of the queue holding the jobs submitted from the Streamlit app."""
+
+WORKER_COUNT = int(os.getenv('JOB_WORKERS', '2'))
+"""Number of worker processes started by `start_workers`, read from the `JOB_WORKERS` environment variable."""
+
+POLL_SECONDS = 1.0
+"""Delay between queue polls of an idle worker."""
+
+HEARTBEAT_SECONDS = 10.0
+"""Delay between the heartbeats a worker records for the job it runs."""
+
+ORPHAN_SECONDS = 60.0
+"""Age of the last heartbeat after which a running job is considered abandoned by its worker."""
+
+MAX_JOB_ATTEMPTS = int(os.getenv('MAX_JOB_ATTEMPTS', '3'))
+"""Number of times a job may be claimed before abandoning it marks it as failed, read from the `MAX_JOB_ATTEMPTS` environment variable."""
+
+
+class JobStatus(Enum):
+    """
+    Enum for the lifecycle of a background job.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class Job(TypedDict):
+    """
+    A queued EDA run and its status record.
+    """
+    uuid: str
+    queue: str
+    status: str
+    params: dict
+    error: str | None
+    worker_pid: int | None
+    created: float
+    started: float | None
+    finished: float | None
+    heartbeat: float | None
+    attempts: int
+
+
+class JobQueue(SQLiteStore):
+    """
+    SQLite-backed queue of EDA runs shared by the UI and the worker processes.
+
+    Several named queues can live in one database: jobs are submitted to and
+    claimed from the queue of the instance only, so the workers of a batch run
+    never take the jobs of the app, and the other way round.
+    """
+
+    def __init__(self, path: str = JOBS_PATH, name: str = DEFAULT_QUEUE):
+        super().__init__(path)
+        self.name = name
+
+    def create_schema(self, connection: sqlite3.Connection):
+        """Creates the job, event and output tables, adding the columns of earlier versions to an existing job table."""
+        connection.execute("CREATE TABLE IF NOT EXISTS jobs "
+                           "(uuid TEXT PRIMARY KEY, status TEXT, params TEXT, error TEXT, worker_pid INTEGER, "
+                           "created REAL, started REAL, finished REAL, heartbeat REAL)")
+        columns = {row['name'] for row in connection.execute("PRAGMA table_info(jobs)")}
+        if 'heartbeat' not in columns:
+            connection.execute("ALTER TABLE jobs ADD COLUMN heartbeat REAL")
+        if 'queue' not in columns:
+            connection.execute(f"ALTER TABLE jobs ADD COLUMN queue TEXT NOT NULL DEFAULT '{DEFAULT_QUEUE}'")
+        if 'attempts' not in columns:
+            connection.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+        connection.execute("CREATE TABLE IF NOT EXISTS job_events "
+                           "(uuid TEXT, message TEXT, details TEXT, created REAL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS job_events_uuid ON job_events (uuid, created)")
+        connection.execute("CREATE TABLE IF NOT EXISTS job_outputs "
+                           "(uuid TEXT, name TEXT, text TEXT, updated REAL, PRIMARY KEY (uuid, name))")
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row | None) -> Job | None:
+        """Converts a `jobs` row to a `Job`."""
+        if row is None:
+            return None
+        return Job(uuid=row['uuid'], queue=row['queue'], status=row['status'], params=json.loads(row['params']), error=row['error'],
+                   worker_pid=row['worker_pid'], created=row['created'], started=row['started'], finished=row['finished'],
+                   heartbeat=row['heartbeat'], attempts=row['attempts'])
+
+    def submit(self, runnable_config: ConfigSchema, dataset: DatasetHandle, resume: bool = False) -> Job:
+        """
+        Queues a saved run for the worker processes.
+
+        A run that is already queued or running is left untouched, so submitting
+        it twice neither requeues it under its worker nor clears its progress.
+
+        Args:
+            runnable_config (ConfigSchema): The configuration of the run.
+            dataset (DatasetHandle): The handle of the registered dataset.
+            resume (bool, optional): Whether to restart a failed run from its last
+                                     completed node, keeping its progress records and
+                                     outputs. Defaults to False.
+
+        Returns:
+            Job: The job of the run, with the status of the existing job if it was
+                 already queued or running.
+        """
+        params = json.dumps({'config': dict(runnable_config), 'dataset': dict(dataset), 'resume': resume})
+        with self._lock, self._connect() as connection:
+            cursor = connection.execute("INSERT INTO jobs (uuid, status, params, created, queue) VALUES (?, ?, ?, ?, ?) "
+                                        "ON CONFLICT (uuid) DO UPDATE SET status = excluded.status, params = excluded.params, "
+                                        "created = excluded.created, queue = excluded.queue, error = NULL, worker_pid = NULL, "
+                                        "started = NULL, finished = NULL, heartbeat = NULL, attempts = 0 "
+                                        "WHERE jobs.status IN (?, ?)",
+                                        (runnable_config['uuid'], JobStatus.QUEUED.value, params, time.time(), self.name,
+                                         JobStatus.COMPLETED.value, JobStatus.FAILED.value))
+            if cursor.rowcount and not resume:
+                connection.execute("DELETE FROM job_events WHERE uuid = ?", (runnable_config['uuid'],))
+                connection.execute("DELETE FROM job_outputs WHERE uuid = ?", (runnable_config['uuid'],))
+            row = connection.execute("SELECT * FROM jobs WHERE uuid = ?", (runnable_config['uuid'],)).fetchone()
+        return self._to_job(row)
+
+    def claim(self, worker_pid: int) -> Job | None:
+        """
+        Atomically takes the oldest queued job of this queue for a worker.
+
+        Args:
+            worker_pid (int): The process id of the claiming worker.
+
+        Returns:
+            Job | None: The claimed job, or None if the queue is empty.
+        """
+        started = time.time()
+        with self._lock, self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute("SELECT * FROM jobs WHERE status = ? AND queue = ? ORDER BY created LIMIT 1",
+                                         (JobStatus.QUEUED.value, self.name)).fetchone()
+                if row is not None:
+                    connection.execute("UPDATE jobs SET status = ?, worker_pid = ?, started = ?, heartbeat = ?, "
+                                       "attempts = attempts + 1 WHERE uuid = ?",
+                                       (JobStatus.RUNNING.value, worker_pid, started, started, row['uuid']))
+                connection.execute("COMMIT")
+            except sqlite3.Error:
+                connection.execute("ROLLBACK")
+                raise
+        job = self._to_job(row)
+        if job is not None:
+            job['status'], job['worker_pid'], job['started'] = JobStatus.RUNNING.value, worker_pid, started
+            job['heartbeat'], job['attempts'] = started, job['attempts'] + 1
+        return job
+
+    def beat(self, worker_pid: int):
+        """
+        Records that a worker is still running its claimed job.
+
+        Args:
+            worker_pid (int): The process id of the worker.
+        """
+        with self._lock, self._connect() as connection:
+            connection.execute("UPDATE jobs SET heartbeat = ? WHERE worker_pid = ? AND status = ?",
+                               (time.time(), worker_pid, JobStatus.RUNNING.value))
+
+    def add_event(self, run_id: str, message: str, details: dict):
+        """
+        Records the progress of a running job.
+
+        Args:
+            run_id (str): The run UUID.
+            message (str): The completed stage or task.
+            details (dict): The JSON-serializable timings and counters at completion.
+        """
+        with self._lock, self._connect() as connection:
+            connection.execute("INSERT INTO job_events VALUES (?, ?, ?, ?)",
+                               (run_id, message, json.dumps(details), time.time()))
+
+    def set_output(self, run_id: str, name: str, text: str):
+        """
+        Records the latest output of a node or task of a running job.
+
+        Args:
+            run_id (str): The run UUID.
+            name (str): The node name, or the completion message of a fanned-out task.
+            text (str): The text streamed by the node so far, or the task result.
+        """
+        with self._lock, self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO job_outputs VALUES (?, ?, ?, ?)", (run_id, name, text, time.time()))
+
+    def get_outputs(self, run_id: str) -> dict[str, str]:
+        """
+        Returns the latest outputs of the nodes and tasks of a job.
+
+        Args:
+            run_id (str): The run UUID.
+
+        Returns:
+            dict[str, str]: The text of each node or task, in the order they were last updated.
+        """
+        with self._lock, self._connect() as connection:
+            rows = connection.execute("SELECT name, text FROM job_outputs WHERE uuid = ? ORDER BY updated",
+                                      (run_id,)).fetchall()
+        return {row['name']: row['text'] for row in rows}
+
+    def finish(self, run_id: str, status: JobStatus, error: str | None = None):
+        """
+        Marks a job as completed or failed.
+
+        Args:
+            run_id (str): The run UUID.
+            status (JobStatus): The final status.
+            error (str | None, optional): The failure description. Defaults to None.
+        """
+        with self._lock, self._connect() as connection:
+            connection.execute("UPDATE jobs SET status = ?, error = ?, finished = ? WHERE uuid = ?",
+                               (status.value, error, time.time(), run_id))
+
+    def get_job(self, run_id: str) -> Job | None:
+        """
+        Returns the status record of a job.
+
+        Args:
+            run_id (str): The run UUID.
+
+        Returns:
+            Job | None: The job, or None if it was never submitted.
+        """
+        with self._lock, self._connect() as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE uuid = ?", (run_id,)).fetchone()
+        return self._to_job(row)
+
+    def get_events(self, run_id: str) -> list[dict]:
+        """
+        Returns the progress records of a job in completion order.
+
+        Args:
+            run_id (str): The run UUID.
+
+        Returns:
+            list[dict]: One dictionary per completed stage or task, with its
+                        message, completion time and details.
+        """
+        with self._lock, self._connect() as connection:
+            rows = connection.execute("SELECT message, details, created FROM job_events WHERE uuid = ? ORDER BY created",
+                                      (run_id,)).fetchall()
+        return [{'message': row['message'], 'created': row['created'], **json.loads(row['details'])} for row in rows]
+
+    def list_jobs(self, limit: int = 20) -> list[Job]:
+        """
+        Returns the most recently submitted jobs.
+
+        Args:
+            limit (int, optional): The maximum number of jobs. Defaults to 20.
+
+        Returns:
+            list[Job]: The jobs, newest first.
+        """
+        with self._lock, self._connect() as connection:
+            rows = connection.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def requeue_orphaned(self, worker_pids: list[int] | None = None) -> int:
+        """
+        Puts back in the queue running jobs whose worker stopped sending heartbeats.
+
+        A job is abandoned once its last heartbeat is older than `ORPHAN_SECONDS`,
+        which holds whatever the platform and even if its worker's process id
+        was reused, or as soon as its worker is known to have exited. The
+        requeued jobs resume from the last node their worker completed; jobs
+        abandoned `MAX_JOB_ATTEMPTS` times, which likely crash their worker,
+        are marked as failed instead.
+
+        Args:
+            worker_pids (list[int] | None, optional): The process ids of workers known
+                                                      to have exited. Defaults to None.
+
+        Returns:
+            int: The number of requeued or failed jobs.
+        """
+        worker_pids = worker_pids or []
+        with self._lock, self._connect() as connection:
+            rows = connection.execute("SELECT uuid, params, attempts FROM jobs WHERE status = ? "
+                                      f"AND (heartbeat IS NULL OR heartbeat < ? OR worker_pid IN ({', '.join('?' * len(worker_pids))}))",
+                                      (JobStatus.RUNNING.value, time.time() - ORPHAN_SECONDS, *worker_pids)).fetchall()
+            for row in rows:
+                if row['attempts'] >= MAX_JOB_ATTEMPTS:
+                    connection.execute("UPDATE jobs SET status = ?, error = ?, finished = ? WHERE uuid = ?",
+                                       (JobStatus.FAILED.value, f"The job was abandoned by its worker {row['attempts']} times",
+                                        time.time(), row['uuid']))
+                    continue
+                params = json.dumps({**json.loads(row['params']), 'resume': True})
+                connection.execute("UPDATE jobs SET status = ?, params = ?, worker_pid = NULL, started = NULL, "
+                                   "heartbeat = NULL WHERE uuid = ?", (JobStatus.QUEUED.value, params, row['uuid']))
+        return len(rows)
+
+
+def send_heartbeats(queue: JobQueue, worker_pid: int):
+    """
+    Records a heartbeat for the job of a worker every `HEARTBEAT_SECONDS`, for the life of the worker.
+
+    Args:
+        queue (JobQueue): The queue the worker claims jobs from.
+        worker_pid (int): The process id of the worker.
+    """
+    while True:
+        time.sleep(HEARTBEAT_SECONDS)
+        try:
+            queue.beat(worker_pid)
+        except sqlite3.Error:
+            continue
+
+
+def run_job(queue: JobQueue, job: Job):
+    """
+    Runs a claimed job to completion, recording each completed stage and the
+    output streamed by each node.
+
+    Args:
+        queue (JobQueue): The queue the job was claimed from.
+        job (Job): The claimed job.
+    """
+    from graph import run_agent  # pylint: disable=import-outside-toplevel
+    run_id = job['uuid']
+    started = lapsed = time.monotonic()
+    for message in run_agent(ConfigSchema(**job['params']['config']), DatasetHandle(**job['params']['dataset']),
+                             resume=job['params'].get('resume', False), on_output=partial(queue.set_output, run_id)):
+        if message == 'ERROR':
+            queue.finish(run_id, JobStatus.FAILED, error=f'Please check logs for {run_id}')
+            return
+        now = time.monotonic()
+        queue.add_event(run_id, message, {'seconds': round(now - lapsed, 2),
+                                          'total_seconds': round(now - started, 2),
+                                          'throttled_seconds': round(RATE_LIMITER.get_throttled_seconds(run_id), 2),
+                                          **RESPONSE_CACHE.get_stats(run_id)})
+        lapsed = now
+    queue.finish(run_id, JobStatus.COMPLETED)
+
+
+def worker_loop(path: str, name: str, parent_pid: int):
+    """
+    Claims and runs jobs until the process that started the worker exits.
+
+    The workers of a pool share one rate limiter budget through the job
+    database, and a background thread keeps the heartbeat of the running job.
+    Idle workers requeue the jobs whose worker stopped sending heartbeats.
+
+    Args:
+        path (str): The location of the job database.
+        name (str): The name of the queue the worker claims jobs from.
+        parent_pid (int): The process id of the process owning the pool.
+    """
+    from graph import set_mlflow  # pylint: disable=import-outside-toplevel
+    set_mlflow()
+    RATE_LIMITER.share(path, get_quota_scope())
+    queue = JobQueue(path, name)
+    threading.Thread(target=send_heartbeats, args=(queue, os.getpid()), daemon=True).start()
+    while os.getppid() == parent_pid:
+        job = queue.claim(os.getpid())
+        if job is None:
+            queue.requeue_orphaned()
+            time.sleep(POLL_SECONDS)
+            continue
+        try:
+            run_job(queue, job)
+        except Exception:  # pylint: disable=broad-exception-caught
+            queue.finish(job['uuid'], JobStatus.FAILED, error=traceback.format_exc())
+
+
+def start_worker(path: str, name: str, index: int) -> multiprocessing.Process:
+    """
+    Starts a worker process running queued jobs.
+
+    Workers are spawned rather than forked, so they do not inherit the threads
+    of the process that starts them.
+
+    Args:
+        path (str): The location of the job database.
+        name (str): The name of the queue the worker claims jobs from.
+        index (int): The position of the worker in its pool.
+
+    Returns:
+        multiprocessing.Process: The started worker process.
+    """
+    worker = multiprocessing.get_context('spawn').Process(target=worker_loop, args=(path, name, os.getpid()),
+                                                          name=f'eda-worker-{index}')
+    worker.start()
+    return worker
+
+
+def start_workers(worker_count: int = WORKER_COUNT, path: str = JOBS_PATH,
+                  name: str = DEFAULT_QUEUE) -> list[multiprocessing.Process]:
+    """
+    Starts the pool of worker processes running queued jobs.
+
+    Workers are terminated when the process that started them exits, and exit
+    on their own if it is killed; the jobs they were running are requeued once
+    their heartbeats stop, the next time a pool is started.
+
+    Args:
+        worker_count (int, optional): The number of workers. Defaults to `WORKER_COUNT`.
+        path (str, optional): The location of the job database. Defaults to `JOBS_PATH`.
+        name (str, optional): The name of the queue the workers claim jobs from. Defaults to `DEFAULT_QUEUE`.
+
+    Returns:
+        list[multiprocessing.Process]: The started worker processes.
+    """
+    JobQueue(path).requeue_orphaned()
+    workers = [start_worker(path, name, index) for index in range(worker_count)]
+    atexit.register(stop_workers, workers)
+    return workers
+
+
+def replace_dead_workers(workers: list[multiprocessing.Process], path: str = JOBS_PATH,
+                         name: str = DEFAULT_QUEUE) -> int:
+    """
+    Starts a replacement for every worker of a pool that exited, and requeues
+    the jobs they were running without waiting for their heartbeats to expire.
+
+    Args:
+        workers (list[multiprocessing.Process]): The workers returned by `start_workers`,
+                                                 updated in place.
+        path (str, optional): The location of the job database. Defaults to `JOBS_PATH`.
+        name (str, optional): The name of the queue the workers claim jobs from. Defaults to `DEFAULT_QUEUE`.
+
+    Returns:
+        int: The number of replaced workers.
+    """
+    dead = [index for index, worker in enumerate(workers) if not worker.is_alive()]
+    if dead:
+        JobQueue(path).requeue_orphaned([workers[index].pid for index in dead])
+    for index in dead:
+        workers[index].join()
+        workers[index] = start_worker(path, name, index)
+    return len(dead)
+
+
+def stop_workers(workers: list[multiprocessing.Process]):
+    """
+    Terminates worker processes and waits for them to exit.
+
+    Args:
+        workers (list[multiprocessing.Process]): The workers returned by `start_workers`.
+    """
+    for worker in workers:
+        if worker.is_alive():
+            worker.terminate()
+    for worker in workers:
+        worker.join()
+
+
+JOB_QUEUE = JobQueue()
+"""The job queue shared by the UI in the process."""
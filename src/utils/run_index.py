@@ -0,0 +1,208 @@
+"""Run Index"""
+import json
+import os
+import re
+import sqlite3
+import time
+from enum import Enum
+
+from typing_extensions import TypedDict
+
+from utils.sqlite_store import SQLiteStore
+
+
+LOGS_PATH = './logs'
+"""Directory holding one sub-directory of logs per run."""
+
+RUN_INDEX_PATH = './logs/.index/runs.sqlite'
+"""Location of the SQLite database indexing the run directories."""
+
+LOG_FILE_PATTERN = re.compile(r'^(?P<stage>.*?)[-_]?(?P<timestamp>\d{14})?\.(?P<extension>[\w.]+)$')
+"""Splits a run file name such as 'Statistician Agent-20250101120000.jsonl.gz' into stage, timestamp and extension."""
+
+
+class RunStatus(Enum):
+    """
+    Enum for the outcome of a run, as seen from its log directory.
+    """
+    SUCCESS = "success"
+    FAILED = "failed"
+    IN_PROGRESS = "in progress"
+
+
+class RunFile(TypedDict):
+    """
+    A file of a run directory.
+    """
+    uuid: str
+    file_name: str
+    stage_name: str
+    path: str
+    size: int
+    timestamp: str | None
+
+
+class RunRecord(TypedDict):
+    """
+    The summary of a run directory.
+    """
+    uuid: str
+    status: str
+    created: float
+    updated: float
+    stages: list[str]
+    size: int
+
+
+def parse_run_file(run_id: str, entry: os.DirEntry) -> RunFile:
+    """
+    Describes a file of a run directory from its name and size.
+
+    Args:
+        run_id (str): The run UUID.
+        entry (os.DirEntry): The directory entry of the file.
+
+    Returns:
+        RunFile: The stage name, timestamp and size of the file.
+    """
+    match = LOG_FILE_PATTERN.match(entry.name)
+    stage_name = match.group('stage') if match else entry.name
+    return RunFile(uuid=run_id, file_name=entry.name, stage_name=stage_name, path=entry.path,
+                   size=entry.stat().st_size, timestamp=match.group('timestamp') if match else None)
+
+
+def get_run_status(files: list[RunFile]) -> RunStatus:
+    """
+    Derives the outcome of a run from its files.
+
+    Args:
+        files (list[RunFile]): The files of the run directory.
+
+    Returns:
+        RunStatus: SUCCESS if the report was written after the last logged
+                   error, FAILED if an error was logged, IN_PROGRESS otherwise.
+    """
+    reports = [file for file in files if file['file_name'] == 'index.html']
+    errors = [file for file in files if file['stage_name'] == 'error']
+    if reports and not any(os.path.getmtime(error['path']) > os.path.getmtime(reports[0]['path']) for error in errors):
+        return RunStatus.SUCCESS
+    if errors:
+        return RunStatus.FAILED
+    return RunStatus.IN_PROGRESS
+
+
+class RunIndex(SQLiteStore):
+    """
+    SQLite index of the run directories, updated as stages finish so the history does not rescan the logs.
+    """
+
+    def __init__(self, path: str = RUN_INDEX_PATH, logs_path: str = LOGS_PATH):
+        super().__init__(path)
+        self.logs_path = logs_path
+
+    def create_schema(self, connection: sqlite3.Connection):
+        """Creates the run and run file tables."""
+        connection.execute("CREATE TABLE IF NOT EXISTS runs "
+                           "(uuid TEXT PRIMARY KEY, status TEXT, created REAL, updated REAL, stages TEXT, size INTEGER)")
+        connection.execute("CREATE INDEX IF NOT EXISTS runs_updated ON runs (updated)")
+        connection.execute("CREATE TABLE IF NOT EXISTS run_files "
+                           "(uuid TEXT, file_name TEXT, stage_name TEXT, path TEXT, size INTEGER, timestamp TEXT, "
+                           "PRIMARY KEY (uuid, file_name))")
+
+    def index_run(self, run_id: str) -> RunRecord | None:
+        """
+        Scans the directory of a single run and stores its summary and files.
+
+        Args:
+            run_id (str): The run UUID.
+
+        Returns:
+            RunRecord | None: The updated summary, or None if the run directory does not exist.
+        """
+        run_dir = os.path.join(self.logs_path, run_id)
+        if not os.path.isdir(run_dir):
+            return None
+        with os.scandir(run_dir) as entries:
+            files = [parse_run_file(run_id, entry) for entry in entries if entry.is_file()]
+        modified = [os.path.getmtime(file['path']) for file in files] or [time.time()]
+        stages = list(dict.fromkeys(file['stage_name'] for file in sorted(files, key=lambda file: file['timestamp'] or '')
+                                    if file['timestamp'] is not None))
+        record = RunRecord(uuid=run_id, status=get_run_status(files).value, created=min(modified), updated=max(modified),
+                           stages=stages, size=sum(file['size'] for file in files))
+        with self._lock, self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, COALESCE((SELECT created FROM runs WHERE uuid = ?), ?), ?, ?, ?)",
+                               (run_id, record['status'], run_id, record['created'], record['updated'],
+                                json.dumps(record['stages']), record['size']))
+            connection.execute("DELETE FROM run_files WHERE uuid = ?", (run_id,))
+            connection.executemany("INSERT INTO run_files VALUES (?, ?, ?, ?, ?, ?)",
+                                   [(file['uuid'], file['file_name'], file['stage_name'], file['path'], file['size'],
+                                     file['timestamp']) for file in files])
+            connection.execute("COMMIT")
+        return record
+
+    def index_new_runs(self) -> int:
+        """
+        Indexes the run directories that are not in the index yet, such as runs created before it existed.
+
+        Only the names of the run directories are listed; the files of already
+        indexed runs are not read.
+
+        Returns:
+            int: The number of newly indexed runs.
+        """
+        if not os.path.isdir(self.logs_path):
+            return 0
+        with os.scandir(self.logs_path) as entries:
+            run_ids = {entry.name for entry in entries if entry.is_dir() and not entry.name.startswith('.')}
+        with self._lock, self._connect() as connection:
+            indexed = {row['uuid'] for row in connection.execute("SELECT uuid FROM runs").fetchall()}
+        new_runs = sorted(run_ids - indexed)
+        for run_id in new_runs:
+            self.index_run(run_id)
+        return len(new_runs)
+
+    def count_runs(self) -> int:
+        """
+        Returns the number of indexed runs.
+
+        Returns:
+            int: The number of runs.
+        """
+        with self._lock, self._connect() as connection:
+            return connection.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def list_runs(self, limit: int = 20, offset: int = 0) -> list[RunRecord]:
+        """
+        Returns one page of runs, most recently updated first.
+
+        Args:
+            limit (int, optional): The page size. Defaults to 20.
+            offset (int, optional): The number of runs to skip. Defaults to 0.
+
+        Returns:
+            list[RunRecord]: The runs of the page.
+        """
+        with self._lock, self._connect() as connection:
+            rows = connection.execute("SELECT * FROM runs ORDER BY updated DESC LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+        return [RunRecord(uuid=row['uuid'], status=row['status'], created=row['created'], updated=row['updated'],
+                          stages=json.loads(row['stages']), size=row['size']) for row in rows]
+
+    def get_files(self, run_ids: list[str]) -> list[RunFile]:
+        """
+        Returns the indexed files of some runs.
+
+        Args:
+            run_ids (list[str]): The run UUIDs.
+
+        Returns:
+            list[RunFile]: The files of the runs.
+        """
+        with self._lock, self._connect() as connection:
+            rows = connection.execute(f"SELECT * FROM run_files WHERE uuid IN ({', '.join('?' * len(run_ids))})",
+                                      run_ids).fetchall()
+        return [RunFile(**dict(row)) for row in rows]
+
+
+RUN_INDEX = RunIndex()
+"""The run index shared in the process."""
@@ -0,0 +1,73 @@
+"""SQLite Stores"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+
+BUSY_TIMEOUT_SECONDS = 30
+"""Time a connection waits for another process to release the write lock of a database."""
+
+
+@contextmanager
+def connect_database(path: str, autocommit: bool = True) -> Iterator[sqlite3.Connection]:
+    """
+    Opens a connection to a SQLite database shared by the processes of the application.
+
+    Args:
+        path (str): The location of the database, in an existing directory.
+        autocommit (bool, optional): Whether every statement commits on its own;
+                                     otherwise the statements of the block are
+                                     committed together on exit. Defaults to True.
+
+    Yields:
+        sqlite3.Connection: The connection, returning `sqlite3.Row` rows, closed on exit.
+    """
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None if autocommit else '')
+    connection.row_factory = sqlite3.Row
+    try:
+        yield connection
+        if not autocommit:
+            connection.commit()
+    finally:
+        connection.close()
+
+
+class SQLiteStore:
+    """
+    Base of the stores persisted in a SQLite database, creating the database on first use.
+
+    Subclasses create their tables and run their migrations in `create_schema`.
+    The lock serializes the connections of the threads of a process; the
+    database is in WAL mode, so readers in other processes are not blocked by a writer.
+    """
+
+    autocommit = True
+    """Whether every statement commits on its own, rather than the statements of a `_connect` block together."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def create_schema(self, connection: sqlite3.Connection):
+        """
+        Creates the tables and indexes of the store if they do not exist.
+
+        Args:
+            connection (sqlite3.Connection): The first connection of the instance.
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Opens a connection to the store database, creating its directory and schema on first use."""
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with connect_database(self.path, self.autocommit) as connection:
+            if not self._initialized:
+                connection.execute("PRAGMA journal_mode=WAL")
+                self.create_schema(connection)
+                self._initialized = True
+            yield connection
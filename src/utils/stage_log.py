@@ -0,0 +1,193 @@
+"""Stage Logs"""
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+from enum import Enum
+
+from typing_extensions import TypedDict
+
+from tools.dataset import DatasetHandle, get_dataset_path
+from tools.helper import AgentState, WorkflowStage, merge_task_results
+
+
+STAGE_LOG_EXTENSION = '.jsonl.gz'
+"""Extension of the compressed JSONL stage logs."""
+
+INITIAL_STATE_NAME = 'Initial State'
+"""Node name of the record holding the input state of a run."""
+
+STATE_REDUCERS = {'task_results': merge_task_results}
+"""Reducers of the `AgentState` fields that are not overwritten by node updates."""
+
+
+class StageRecord(TypedDict):
+    """
+    One line of a stage log: the fields of the state changed by a node update.
+    """
+    node: str
+    time: float
+    seconds: float
+    changed: dict
+    appended: dict
+
+
+def to_json(value):
+    """Serializes the values `json` does not handle, writing enums by value."""
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+def apply_update(state: dict, update: dict) -> dict:
+    """
+    Applies a node update to a state, using the reducers of `AgentState`.
+
+    Args:
+        state (dict): The state before the update.
+        update (dict): The fields written by the node.
+
+    Returns:
+        dict: The state after the update.
+    """
+    new_state = dict(state)
+    for field, value in update.items():
+        new_state[field] = STATE_REDUCERS[field](state.get(field, []), value) if field in STATE_REDUCERS else value
+    return new_state
+
+
+def get_state_delta(previous: dict, current: dict) -> tuple[dict, dict]:
+    """
+    Computes the fields that differ between two states.
+
+    Lists that only grew, such as `history`, are recorded by their new items.
+    The dataset is recorded by its hash.
+
+    Args:
+        previous (dict): The state before the update.
+        current (dict): The state after the update.
+
+    Returns:
+        tuple[dict, dict]: The replaced fields, and the items appended to list fields.
+    """
+    changed, appended = {}, {}
+    for field, value in current.items():
+        old_value = previous.get(field)
+        if value == old_value:
+            continue
+        if field == 'df':
+            changed[field] = value['hash']
+        elif isinstance(old_value, list) and isinstance(value, list) and value[:len(old_value)] == old_value:
+            appended[field] = value[len(old_value):]
+        else:
+            changed[field] = value
+    return changed, appended
+
+
+def get_stage_log_path(run_dir: str, node: str, timestamp: str) -> str:
+    """
+    Returns the location of the stage log of a node.
+
+    Args:
+        run_dir (str): The directory of the run.
+        node (str): The node name.
+        timestamp (str): The completion time, formatted as '%Y%m%d%H%M%S'.
+
+    Returns:
+        str: The path of the compressed JSONL file.
+    """
+    return os.path.join(run_dir, f'{node}-{timestamp}{STAGE_LOG_EXTENSION}')
+
+
+def write_stage_record(path: str, record: StageRecord):
+    """
+    Appends a record to a stage log.
+
+    Args:
+        path (str): The path of the compressed JSONL file.
+        record (StageRecord): The record to append.
+    """
+    with gzip.open(path, 'at', encoding='utf-8') as f:
+        f.write(json.dumps(record, default=to_json) + '\n')
+
+
+def log_stage_update(run_dir: str, node: str, previous_state: dict, update: dict | None, seconds: float) -> dict:
+    """
+    Writes the fields changed by a node update to the stage log of the node.
+
+    Args:
+        run_dir (str): The directory of the run.
+        node (str): The node name.
+        previous_state (dict): The state before the update.
+        update (dict | None): The fields written by the node.
+        seconds (float): The time since the previous update.
+
+    Returns:
+        dict: The state after the update, to pass as `previous_state` of the next update.
+    """
+    current_state = apply_update(previous_state, update or {})
+    changed, appended = get_state_delta(previous_state, current_state)
+    now = time.time()
+    write_stage_record(get_stage_log_path(run_dir, node, datetime.fromtimestamp(now).strftime("%Y%m%d%H%M%S")),
+                       StageRecord(node=node, time=now, seconds=round(seconds, 3), changed=changed, appended=appended))
+    return current_state
+
+
+def read_stage_file(path: str) -> list[StageRecord]:
+    """
+    Reads the records of one stage log.
+
+    Args:
+        path (str): The path of the compressed JSONL file.
+
+    Returns:
+        list[StageRecord]: The records, in write order.
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def read_stage_records(run_dir: str) -> list[StageRecord]:
+    """
+    Reads the records of every stage log of a run.
+
+    Args:
+        run_dir (str): The directory of the run.
+
+    Returns:
+        list[StageRecord]: The records of the run, in completion order.
+    """
+    with os.scandir(run_dir) as entries:
+        paths = [entry.path for entry in entries if entry.name.endswith(STAGE_LOG_EXTENSION)]
+    return sorted((record for path in paths for record in read_stage_file(path)), key=lambda record: record['time'])
+
+
+def rebuild_state(run_dir: str, until: float | None = None) -> AgentState:
+    """
+    Rebuilds the state of a run by replaying its stage logs.
+
+    Args:
+        run_dir (str): The directory of the run.
+        until (float | None, optional): The completion time of the last record to
+                                        replay, or None for the latest state. Defaults to None.
+
+    Returns:
+        AgentState: The state after the last replayed record, with the dataset
+                    handle resolved from its hash and the stages as `WorkflowStage`,
+                    except the end marker of a completed run.
+    """
+    state = {}
+    for record in read_stage_records(run_dir):
+        if until is not None and record['time'] > until:
+            break
+        state.update(record['changed'])
+        for field, items in record['appended'].items():
+            state[field] = state.get(field, []) + items
+    if isinstance(state.get('df'), str):
+        state['df'] = DatasetHandle(hash=state['df'], path=get_dataset_path(state['df']))
+    stage_values = {stage.value for stage in WorkflowStage}
+    state['stage'] = [WorkflowStage(stage) if stage in stage_values else stage for stage in state.get('stage', [])]
+    state['history'] = [{**item, 'stage': WorkflowStage(item['stage'])} if 'stage' in item else item
+                        for item in state.get('history', [])]
+    return AgentState(**state)
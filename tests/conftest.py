@@ -0,0 +1,8 @@
+"""Test Configuration"""
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def run_in_tmp_path(tmp_path, monkeypatch):
+    """Runs every test from an empty directory, so the './logs/' stores it touches are its own."""
+    monkeypatch.chdir(tmp_path)
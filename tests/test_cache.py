@@ -0,0 +1,50 @@
+"""Response Cache Tests"""
+import time
+
+from tools.cache import CacheMode, ResponseCache, get_cache_key
+
+
+def test_use_mode_misses_then_hits():
+    cache, key = ResponseCache(), get_cache_key(prompt='describe', model='m')
+    assert cache.lookup(CacheMode.USE, 'run', key) is None
+    cache.store(CacheMode.USE, key, {'output': 'x'})
+    assert cache.lookup(CacheMode.USE, 'run', key) == {'output': 'x'}
+    assert cache.get_stats('run') == {'hits': 1, 'misses': 1}
+
+
+def test_refresh_mode_overwrites_without_reading():
+    cache, key = ResponseCache(), get_cache_key(prompt='describe')
+    cache.store(CacheMode.USE, key, 'old')
+    assert cache.lookup(CacheMode.REFRESH, 'run', key) is None
+    cache.store(CacheMode.REFRESH, key, 'new')
+    assert cache.get(key) == 'new'
+    assert cache.get_stats('run') == {'hits': 0, 'misses': 1}
+
+
+def test_bypass_mode_neither_reads_nor_writes():
+    cache, key = ResponseCache(), get_cache_key(prompt='describe')
+    cache.store(CacheMode.BYPASS, key, 'value')
+    assert cache.get(key) is None
+    cache.set(key, 'value')
+    assert cache.lookup(CacheMode.BYPASS, 'run', key) is None
+    assert cache.get_stats('run') == {'hits': 0, 'misses': 0}
+
+
+def test_expired_entries_are_misses():
+    cache = ResponseCache(ttl_seconds=0)
+    cache.set('key', 'value')
+    time.sleep(0.01)
+    assert cache.get('key') is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(max_size_bytes=30)
+    cache.set('first', 'a' * 10)
+    time.sleep(0.01)
+    cache.set('second', 'b' * 10)
+    time.sleep(0.01)
+    assert cache.get('first') == 'a' * 10
+    time.sleep(0.01)
+    cache.set('third', 'c' * 10)
+    assert cache.get('second') is None
+    assert cache.get('first') == 'a' * 10 and cache.get('third') == 'c' * 10
@@ -0,0 +1,70 @@
+"""Code Guard Tests"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.code_guard import guard_code
+
+
+@pytest.fixture(name='namespace')
+def fixture_namespace() -> dict:
+    """A REPL session bound to a 200,000 rows DataFrame."""
+    return {'df': pd.DataFrame({'a': np.arange(200000), 'b': np.arange(200000) % 7})}
+
+
+def get_patterns(code: str, namespace: dict) -> list[str]:
+    """Returns the slow patterns found in a snippet."""
+    _, report = guard_code(code, namespace)
+    return [finding['pattern'] for finding in report['findings']]
+
+
+@pytest.mark.parametrize('code', [
+    "out = []\nfor column in df.columns:\n    out.append(column)",
+    "counts = {}\nfor i in range(1000):\n    snapshot = counts.copy()",
+    "names = ['a']\nfor i in range(1000):\n    names = names.copy()",
+    "x = []\nfor i in range(1000):\n    x.append(i)\nx = df.copy()",
+])
+def test_list_and_dict_calls_in_loops_are_not_costed(code, namespace):
+    assert not get_patterns(code, namespace)
+
+
+@pytest.mark.parametrize('code', [
+    "result = pd.DataFrame()\nfor i in range(1000):\n    result = pd.concat([result, df.head()])",
+    "part = df.head(10)\nfor i in range(1000):\n    part = part.merge(df, on='a')",
+    "for i in range(1000):\n    frame = pd.merge(df, df, on='a')",
+])
+def test_frame_concatenation_in_loops_is_costed(code, namespace):
+    assert get_patterns(code, namespace) == ['concat_in_loop']
+
+
+def test_frame_copy_in_loop_is_costed(namespace):
+    assert get_patterns("for i in range(1000):\n    frame = df.copy()", namespace) == ['copy_in_loop']
+
+
+def test_pd_bound_to_another_object_is_not_pandas(namespace):
+    namespace['pd'] = {'concat': list}
+    assert not get_patterns("for i in range(1000):\n    pd.concat([1])", namespace)
+
+
+@pytest.mark.parametrize('code, rewritten', [
+    ("df.apply(lambda row: row['a'] * row['b'], axis=1)", "df['a'] * df['b']"),
+    ("df['a'].apply(lambda v: v * 2 + 1)", "df['a'] * 2 + 1"),
+    ("df['a'].map(lambda v: v > 5)", "df['a'] > 5"),
+    ("df['b'].apply(str)", "df['b'].astype(str)"),
+])
+def test_rewrites_compute_the_same_values(code, rewritten, namespace):
+    new_code, report = guard_code(code, namespace)
+    assert new_code == rewritten and report['rewrites']
+    pd.testing.assert_series_equal(eval(code, {}, namespace), eval(new_code, {}, namespace),  # pylint: disable=eval-used
+                                   check_names=False)
+
+
+@pytest.mark.parametrize('code', [
+    "df.apply(lambda row: row['a'] if row['b'] else 0, axis=1)",
+    "df['a'].apply(lambda v: len(str(v)))",
+    "df.apply(lambda row: row['missing'] * 2, axis=1)",
+    "values.apply(lambda v: v * 2)",
+])
+def test_calls_without_a_vectorized_equivalent_are_kept(code, namespace):
+    new_code, report = guard_code(code, namespace)
+    assert new_code == code and not report['rewrites']
@@ -0,0 +1,39 @@
+"""Context Compaction Tests"""
+from tools.context import deduplicate_items, estimate_tokens, fit_section
+
+
+def test_deduplicate_items_removes_repeats_and_low_value_items():
+    kept, duplicates, low_value = deduplicate_items(["Rows: 5", "rows:  5.", "None", "Columns: 3"])
+    assert kept == ["Rows: 5", "Columns: 3"]
+    assert (duplicates, low_value) == (1, 1)
+
+
+def test_deduplicate_items_drops_items_repeated_as_whole_lines():
+    kept, duplicates, _ = deduplicate_items(["Rows: 5", "Shape of the data\nRows: 5\nColumns: 3"])
+    assert kept == ["Shape of the data\nRows: 5\nColumns: 3"]
+    assert duplicates == 1
+
+
+def test_deduplicate_items_keeps_items_that_are_only_substrings():
+    items = ["Mean: 1", "Mean: 10", "Rows: 5 of 7", "Missing rows: 5 of 70"]
+    assert deduplicate_items(items) == (items, 0, 0)
+
+
+def test_fit_section_keeps_everything_within_budget():
+    items = ["Rows: 5", "Columns: 3"]
+    assert fit_section(items, 100) == (items, [], [])
+
+
+def test_fit_section_prefers_dense_items_and_keeps_their_order():
+    dense, sparse = "Mean 1, median 2, max 3", "A long description of the dataset without any figure " * 4
+    kept, dropped, truncated = fit_section([sparse, dense], estimate_tokens(dense) + 1)
+    assert (kept, dropped, truncated) == ([dense], [sparse], [])
+
+
+def test_fit_section_truncates_the_best_item_that_does_not_fit():
+    table = '\n'.join(f"| row {index} | {index * 3} |" for index in range(400))
+    kept, dropped, truncated = fit_section(["Rows: 400", table], 300)
+    assert kept[0] == "Rows: 400"
+    assert kept[1].startswith("| row 0 | 0 |") and len(kept[1]) < len(table)
+    assert (dropped, truncated) == ([], [table])
+    assert sum(estimate_tokens(text) for text in kept) <= 300
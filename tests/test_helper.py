@@ -0,0 +1,15 @@
+"""Helper Functions Tests"""
+import os
+
+from utils.helper import read_run_config, write_run_config
+
+
+def test_run_config_round_trips_and_legacy_configs_are_read():
+    config = {'uuid': 'a', 'target_column': "owner's name", 'use_profiler': True, 'job_id': None,
+              'compaction': {'memory_before': 10, 'columns': []}}
+    os.makedirs('./logs/a')
+    write_run_config('a', config)
+    assert read_run_config('./logs/a/config.json') == config
+    with open('./logs/a/legacy.json', 'w', encoding='utf-8') as f:
+        f.write(str(config))
+    assert read_run_config('./logs/a/legacy.json') == config
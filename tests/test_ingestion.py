@@ -0,0 +1,38 @@
+"""Dataset Ingestion Tests"""
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.dataset import DATASET_DIR, load_dataset, register_dataset
+from utils.ingestion import compact_dataset, ingest_csv
+
+
+def test_compaction_picks_the_narrowest_close_dtypes():
+    df = pd.DataFrame({'flag': [0, 1, 1], 'year': [1999, 2020, 2024], 'id': [1, 2, 2 ** 40],
+                       'price': [0.1, 2.5, 19.99], 'tiny': [0.1, 1e-300, 3.0], 'target': [1, 0, 1]})
+    dataset, report = compact_dataset(register_dataset(df), 'target')
+    compacted = load_dataset(dataset)
+    assert compacted.dtypes.astype(str).to_dict() == {'flag': 'int8', 'year': 'int16', 'id': 'int64', 'price': 'float32',
+                                                      'tiny': 'float64', 'target': 'int64'}
+    assert {column['column']: column['dtype_after'] for column in report['columns']} == \
+        {'flag': 'int8', 'year': 'int16', 'price': 'float32'}
+    np.testing.assert_allclose(compacted['price'], df['price'], rtol=1e-6)
+
+
+def test_columns_changing_type_after_the_first_chunk_are_streamed_again_as_text():
+    csv = b"code,price\n1,1.5\n2,2.5\nA1,3.5\n4,\n"
+    result = ingest_csv(io.BytesIO(csv), chunk_size=2, preview_rows=3)
+    df = load_dataset(result['dataset'])
+    assert df['code'].tolist() == ['1', '2', 'A1', '4'] and df['price'].dtype == np.float64
+    assert (result['row_count'], len(result['preview']), result['columns']) == (4, 3, ['code', 'price'])
+    assert result['dataset'] == ingest_csv(io.BytesIO(csv))['dataset']
+    assert not [name for name in os.listdir(DATASET_DIR) if name.endswith('.tmp')]
+
+
+def test_empty_csv_is_rejected():
+    with pytest.raises(ValueError):
+        ingest_csv(io.BytesIO(b"code,price\n"))
+    assert not [name for name in os.listdir(DATASET_DIR) if name.endswith('.tmp')]
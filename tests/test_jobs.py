@@ -0,0 +1,113 @@
+"""Background Jobs Tests"""
+import sqlite3
+import time
+
+from utils import jobs
+from utils.jobs import JOBS_PATH, MAX_JOB_ATTEMPTS, ORPHAN_SECONDS, JobQueue, JobStatus, replace_dead_workers
+
+
+def submit(queue: JobQueue, run_id: str) -> str:
+    """Queues a run with a minimal configuration."""
+    return queue.submit({'uuid': run_id}, {'hash': 'h', 'path': 'p'})
+
+
+def test_job_lifecycle():
+    queue = JobQueue()
+    submit(queue, 'a')
+    assert queue.get_job('a')['status'] == JobStatus.QUEUED.value
+    job = queue.claim(worker_pid=11)
+    assert (job['uuid'], job['status'], job['worker_pid']) == ('a', JobStatus.RUNNING.value, 11)
+    assert queue.claim(worker_pid=12) is None
+    queue.add_event('a', 'stage', {'seconds': 1.0})
+    queue.finish('a', JobStatus.COMPLETED)
+    job = queue.get_job('a')
+    assert job['status'] == JobStatus.COMPLETED.value and job['finished'] is not None
+    assert [event['message'] for event in queue.get_events('a')] == ['stage']
+
+
+def test_jobs_are_claimed_oldest_first_and_only_from_their_queue():
+    app, batch = JobQueue(), JobQueue(name='cli-1')
+    submit(app, 'a')
+    submit(batch, 'b')
+    submit(batch, 'c')
+    assert [batch.claim(1)['uuid'], batch.claim(1)['uuid'], batch.claim(1)] == ['b', 'c', None]
+    assert app.claim(2)['uuid'] == 'a'
+
+
+def test_submit_without_resume_clears_progress():
+    queue = JobQueue()
+    submit(queue, 'a')
+    queue.add_event('a', 'stage', {})
+    queue.set_output('a', 'node', 'text')
+    queue.finish('a', JobStatus.FAILED)
+    queue.submit({'uuid': 'a'}, {'hash': 'h', 'path': 'p'}, resume=True)
+    assert queue.get_events('a') and queue.get_outputs('a') == {'node': 'text'}
+    queue.finish('a', JobStatus.FAILED)
+    submit(queue, 'a')
+    assert not queue.get_events('a') and not queue.get_outputs('a')
+
+
+def test_only_jobs_without_recent_heartbeat_are_requeued():
+    queue = JobQueue()
+    submit(queue, 'alive')
+    submit(queue, 'dead')
+    queue.claim(1)
+    queue.claim(2)
+    queue.beat(1)
+    with sqlite3.connect(JOBS_PATH) as connection:
+        connection.execute("UPDATE jobs SET heartbeat = ? WHERE uuid = 'dead'", (time.time() - 2 * ORPHAN_SECONDS,))
+    assert queue.requeue_orphaned() == 1
+    assert queue.get_job('alive')['status'] == JobStatus.RUNNING.value
+    dead = queue.get_job('dead')
+    assert (dead['status'], dead['worker_pid'], dead['params']['resume']) == (JobStatus.QUEUED.value, None, True)
+
+
+def test_submit_leaves_active_jobs_untouched():
+    queue = JobQueue()
+    submit(queue, 'a')
+    queue.claim(1)
+    queue.add_event('a', 'stage', {})
+    job = queue.submit({'uuid': 'a'}, {'hash': 'h', 'path': 'p'})
+    assert (job['status'], job['worker_pid']) == (JobStatus.RUNNING.value, 1)
+    assert queue.get_events('a') and queue.claim(2) is None
+    queue.finish('a', JobStatus.FAILED, error='boom')
+    job = queue.submit({'uuid': 'a'}, {'hash': 'h', 'path': 'p'})
+    assert (job['status'], job['error'], job['attempts']) == (JobStatus.QUEUED.value, None, 0)
+    assert not queue.get_events('a')
+
+
+def test_jobs_abandoned_too_often_fail():
+    queue = JobQueue()
+    submit(queue, 'a')
+    for attempt in range(1, MAX_JOB_ATTEMPTS + 1):
+        assert queue.claim(attempt)['attempts'] == attempt
+        assert queue.requeue_orphaned([attempt]) == 1
+    job = queue.get_job('a')
+    assert job['status'] == JobStatus.FAILED.value and 'abandoned' in job['error']
+    assert queue.claim(99) is None
+
+
+def test_dead_workers_are_replaced(monkeypatch):
+    started = []
+
+    class Worker:
+        """A stand-in for a worker process."""
+
+        def __init__(self, pid: int, alive: bool):
+            self.pid, self.alive = pid, alive
+
+        def is_alive(self) -> bool:
+            """Whether the worker is running."""
+            return self.alive
+
+        def join(self):
+            """Waits for the worker to exit."""
+
+    monkeypatch.setattr(jobs, 'start_worker', lambda path, name, index: started.append(index) or Worker(100 + index, True))
+    queue = JobQueue()
+    submit(queue, 'a')
+    queue.claim(2)
+    workers = [Worker(1, True), Worker(2, False)]
+    assert replace_dead_workers(workers) == 1
+    assert started == [1] and workers[1].pid == 101 and workers[0].pid == 1
+    assert queue.get_job('a')['status'] == JobStatus.QUEUED.value
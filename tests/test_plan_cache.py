@@ -0,0 +1,21 @@
+"""Analysis Plan Cache Tests"""
+import numpy as np
+import pandas as pd
+
+from tools.plan_cache import get_schema_fingerprint
+
+
+def test_fingerprint_ignores_compacted_dtypes():
+    ingested = pd.DataFrame({'id': np.arange(3), 'price': np.ones(3), 'city': list('abc'),
+                             'day': ['2024-01-01', '2024-01-02', 'n/a'], 'target': [0, 1, 0]})
+    compacted = pd.DataFrame({'id': np.arange(3, dtype='int32'), 'price': np.ones(3, dtype='float32'),
+                              'city': pd.Categorical(list('abc')), 'day': pd.to_datetime(['2024-01-01'] * 3),
+                              'target': [0, 1, 0]})
+    assert get_schema_fingerprint(ingested, 'target', 'classification') == \
+        get_schema_fingerprint(compacted, 'target', 'classification')
+
+
+def test_fingerprint_changes_with_the_layout():
+    df = pd.DataFrame({'id': np.arange(3), 'price': np.ones(3)})
+    assert get_schema_fingerprint(df, 'price', 'regression') != get_schema_fingerprint(df[['price', 'id']], 'price', 'regression')
+    assert get_schema_fingerprint(df, 'price', 'regression') != get_schema_fingerprint(df.astype({'price': str}), 'price', 'regression')
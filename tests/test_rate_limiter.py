@@ -0,0 +1,109 @@
+"""Rate Limiter Tests"""
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from tools.rate_limiter import TokenBucketRateLimiter, get_retry_after, is_rate_limit_error
+
+
+class ResourceExhausted(Exception):
+    """Stands for the quota error class of the Google API client."""
+
+
+class ClientError(Exception):
+    """An error carrying an HTTP status code, like the errors of the Gemini client."""
+
+    def __init__(self, message: str, code: int):
+        super().__init__(message)
+        self.code = code
+
+
+@pytest.mark.parametrize('error', [
+    ResourceExhausted("Quota exceeded"),
+    ClientError("Too many requests", 429),
+])
+def test_quota_errors_are_rate_limit_errors(error):
+    assert is_rate_limit_error(error)
+
+
+def test_quota_errors_are_found_through_the_wrapping_error():
+    try:
+        try:
+            raise ClientError("Quota exceeded", 429)
+        except ClientError as error:
+            raise RuntimeError("Invalid argument provided to Gemini") from error
+    except RuntimeError as wrapped:
+        assert is_rate_limit_error(wrapped)
+
+
+@pytest.mark.parametrize('error', [
+    KeyError("429"),
+    ValueError("Length of values (429) does not match length of index (430)"),
+    ConnectionError("rate limit of the port 4290 exceeded"),
+    ClientError("Bad request", 400),
+])
+def test_errors_mentioning_429_are_not_rate_limit_errors(error):
+    assert not is_rate_limit_error(error)
+
+
+def test_retry_after_is_read_from_the_message():
+    assert get_retry_after(ResourceExhausted("429 Quota exceeded. retry_delay { seconds: 17 }")) == 17.0
+    assert get_retry_after(ResourceExhausted("Quota exceeded")) is None
+
+
+def test_requests_are_admitted_up_to_the_budget():
+    limiter = TokenBucketRateLimiter(requests_per_minute=3, tokens_per_minute=1000)
+    assert [limiter.acquire(blocking=False) for _ in range(4)] == [True, True, True, False]
+
+
+def test_tokens_in_debt_block_requests():
+    limiter = TokenBucketRateLimiter(requests_per_minute=60, tokens_per_minute=600)
+    limiter.consume_tokens(1200)
+    assert not limiter.acquire(blocking=False)
+
+
+def test_rate_limit_reports_pause_every_client():
+    limiter = TokenBucketRateLimiter(requests_per_minute=60, tokens_per_minute=1000)
+    assert limiter.report_rate_limit(0.2) == 0.2
+    assert not limiter.acquire(blocking=False)
+    started = time.monotonic()
+    assert limiter.acquire()
+    assert time.monotonic() - started >= 0.15
+
+
+def test_shared_buckets_are_one_budget(tmp_path):
+    first, second = TokenBucketRateLimiter(requests_per_minute=2), TokenBucketRateLimiter(requests_per_minute=2)
+    first.share(str(tmp_path / 'jobs.sqlite'), 'quota')
+    second.share(str(tmp_path / 'jobs.sqlite'), 'quota')
+    assert [first.acquire(blocking=False), second.acquire(blocking=False), first.acquire(blocking=False)] == [True, True, False]
+    other = TokenBucketRateLimiter(requests_per_minute=2)
+    other.share(str(tmp_path / 'jobs.sqlite'), 'other quota')
+    assert other.acquire(blocking=False)
+
+
+def test_shared_acquire_does_not_block_the_event_loop(tmp_path):
+    limiter = TokenBucketRateLimiter(requests_per_minute=600)
+    limiter.share(str(tmp_path / 'jobs.sqlite'), 'quota')
+    connection = sqlite3.connect(tmp_path / 'jobs.sqlite', isolation_level=None)
+    connection.execute("BEGIN IMMEDIATE")
+
+    async def release_later():
+        await asyncio.sleep(0.3)
+        connection.execute("COMMIT")
+
+    async def run() -> list[float]:
+        ticks = []
+
+        async def tick():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.02)
+
+        admitted, *_ = await asyncio.gather(limiter.aacquire(), tick(), release_later())
+        return admitted, ticks
+
+    admitted, ticks = asyncio.run(run())
+    connection.close()
+    assert admitted and len(ticks) == 5 and ticks[-1] - ticks[0] < 0.25
@@ -0,0 +1,41 @@
+"""Run Index Tests"""
+import os
+
+from utils.run_index import RunIndex, RunStatus
+
+
+def write_file(path: str, text: str = 'x', modified: float | None = None):
+    """Writes a run file, optionally with a given modification time."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    if modified is not None:
+        os.utime(path, (modified, modified))
+
+
+def test_runs_are_indexed_with_their_stages_and_status():
+    write_file('./logs/a/config.json')
+    write_file('./logs/a/Statistician Agent-20250101120500.jsonl.gz')
+    write_file('./logs/a/Metadata Extractor Agent-20250101120000.jsonl.gz')
+    index = RunIndex()
+    record = index.index_run('a')
+    assert record['stages'] == ['Metadata Extractor Agent', 'Statistician Agent']
+    assert record['status'] == RunStatus.IN_PROGRESS.value and record['size'] == 3
+    write_file('./logs/a/error_20250101121000.log', modified=1000)
+    assert index.index_run('a')['status'] == RunStatus.FAILED.value
+    write_file('./logs/a/index.html', modified=2000)
+    assert index.index_run('a')['status'] == RunStatus.SUCCESS.value
+    assert {file['file_name'] for file in index.get_files(['a'])} == set(os.listdir('./logs/a'))
+    assert index.index_run('missing') is None
+
+
+def test_new_runs_are_indexed_once_and_listed_by_update():
+    write_file('./logs/old/config.json', modified=1000)
+    write_file('./logs/new/config.json', modified=2000)
+    write_file('./logs/.cache/cache.sqlite')
+    index = RunIndex()
+    assert index.index_new_runs() == 2
+    assert index.index_new_runs() == 0
+    assert index.count_runs() == 2
+    assert [run['uuid'] for run in index.list_runs()] == ['new', 'old']
+    assert [run['uuid'] for run in index.list_runs(limit=1, offset=1)] == ['old']
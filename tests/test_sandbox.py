@@ -0,0 +1,46 @@
+"""Code Sandbox Tests"""
+import pandas as pd
+import pytest
+
+from tools import sandbox
+from tools.dataset import register_dataset
+from tools.sandbox import CPU_LIMIT_SUPPORTED, SandboxPool
+
+
+@pytest.fixture(name='pool')
+def fixture_pool():
+    """A sandbox pool with a single slot, shut down after the test."""
+    pool = SandboxPool(max_workers=1)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.fixture(name='dataset')
+def fixture_dataset():
+    """A small registered dataset."""
+    return register_dataset(pd.DataFrame({'a': [1, 2, 3], 'b': list('xyz')}))
+
+
+def test_tasks_keep_their_variables_without_holding_the_slot(pool, dataset):
+    with pool.session(dataset) as first, pool.session(dataset) as second:
+        assert first.run("total = df['a'].sum()") == ''
+        assert second.run("total = len(df)") == ''
+        assert first.run("print(total)").strip() == '6'
+        assert second.run("print(total)").strip() == '3'
+
+
+@pytest.mark.skipif(not CPU_LIMIT_SUPPORTED, reason="The platform cannot limit CPU time")
+def test_snippet_over_cpu_time_fails_and_the_process_recovers(pool, dataset, monkeypatch):
+    monkeypatch.setenv('SANDBOX_CPU_SECONDS', '1')
+    with pool.session(dataset) as session:
+        assert session.run("while True:\n    pass").startswith('TimeoutError')
+        assert session.run("print(len(df))").strip() == '3'
+
+
+def test_snippet_over_wall_time_kills_the_process_and_the_next_task_recovers(pool, dataset, monkeypatch):
+    monkeypatch.setattr(sandbox, 'SANDBOX_TIMEOUT_SECONDS', 1)
+    with pool.session(dataset) as session:
+        assert session.run("import time\ntime.sleep(30)").startswith('TimeoutError')
+        assert session.run("print(len(df))").startswith('SandboxError')
+    with pool.session(dataset) as session:
+        assert session.run("print(len(df))").strip() == '3'
@@ -0,0 +1,31 @@
+"""Stage Logs Tests"""
+import os
+
+from tools.dataset import get_dataset_path
+from tools.helper import WorkflowStage
+from utils.stage_log import INITIAL_STATE_NAME, log_stage_update, read_stage_records, rebuild_state
+
+
+def test_replaying_stage_logs_rebuilds_every_intermediate_state():
+    os.makedirs('./logs/a')
+    initial = {'task': [], 'metadata': [], 'statistics': [], 'insights': [], 'df': {'hash': 'h', 'path': get_dataset_path('h')},
+               'stage': [WorkflowStage.METADATA_EXTRACTOR_AGENT, WorkflowStage.PYTHON_CODER_AGENT], 'history': [],
+               'task_results': [], 'memo': []}
+    updates = [
+        ('Metadata Extractor Agent', {'task': ['count rows'], 'stage': [WorkflowStage.PYTHON_CODER_AGENT],
+                                      'history': [{'stage': WorkflowStage.METADATA_EXTRACTOR_AGENT, 'seconds': 1}]}),
+        ('Python Coder Agent - Pandas Task', {'task_results': [{'index': 0, 'output': '3'}]}),
+        ('Python Coder Agent - Pandas Task', {'task_results': [{'index': 1, 'output': '4'}]}),
+        ('Python Coder Agent - Pandas', {'metadata': ['3 rows'], 'task_results': None, 'stage': ['__end__'],
+                                         'history': [{'stage': WorkflowStage.PYTHON_CODER_AGENT, 'seconds': 2}]}),
+    ]
+    states = [log_stage_update('./logs/a', INITIAL_STATE_NAME, {}, initial, 0)]
+    for node, update in updates:
+        states.append(log_stage_update('./logs/a', node, states[-1], update, 1.5))
+    records = read_stage_records('./logs/a')
+    assert [record['node'] for record in records] == [INITIAL_STATE_NAME] + [node for node, _ in updates]
+    assert records[3]['appended'] == {'task_results': [{'index': 1, 'output': '4'}]}
+    for record, state in zip(records, states):
+        assert rebuild_state('./logs/a', until=record['time']) == state
+    assert rebuild_state('./logs/a') == states[-1]
+    assert states[2]['task_results'] == [{'index': 0, 'output': '3'}] and states[-1]['task_results'] == []
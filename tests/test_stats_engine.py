@@ -0,0 +1,48 @@
+"""Statistics Engine Tests"""
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from tools import stats_engine
+from tools.stats_engine import get_classification_statistics, get_kruskal_statistics, get_regression_statistics
+
+
+@pytest.fixture(name='tables', autouse=True)
+def fixture_tables(monkeypatch):
+    """Returns the result tables of the engine as DataFrames keyed by title instead of markdown."""
+    monkeypatch.setattr(stats_engine, '_to_markdown', lambda df, title: (title, df))
+
+
+def test_kruskal_statistics_match_scipy():
+    rng = np.random.default_rng(0)
+    target = pd.Series(rng.integers(0, 3, 60))
+    features = pd.DataFrame({'a': rng.normal(size=60) + target, 'b': rng.integers(0, 4, 60).astype(float)})
+    h_statistic, p_value = get_kruskal_statistics(features, target)
+    for column in features:
+        expected = stats.kruskal(*(features[column][target == level] for level in range(3)))
+        assert h_statistic[column] == pytest.approx(expected.statistic)
+        assert p_value[column] == pytest.approx(expected.pvalue)
+
+
+def test_chi_square_skips_unobserved_levels_and_untestable_columns():
+    df = pd.DataFrame({'city': pd.Categorical(list('aabbab'), categories=list('abc')),
+                       'constant': pd.Categorical(list('xxxxxx'), categories=list('xy')),
+                       'target': [0, 1, 0, 1, 1, 0]})
+    results = dict(get_classification_statistics(df, pd.DataFrame(index=df.index), ['city', 'constant'], 'target'))
+    chi_square = results["Categorical Features vs Target `target` (Chi-square)"]
+    expected = stats.chi2_contingency(pd.crosstab(df['city'].astype(str), df['target']))
+    assert list(chi_square.index) == ['city']
+    assert chi_square.loc['city', 'chi2'] == pytest.approx(expected.statistic)
+
+
+def test_spearman_ranks_rows_with_a_known_target():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'x': rng.normal(size=40)})
+    df['target'] = df['x'] ** 3 + rng.normal(scale=0.1, size=40)
+    df.loc[::3, 'target'] = np.nan
+    numeric_df = df[['x']]
+    results = dict(get_regression_statistics(df, numeric_df, numeric_df.rank(), [], 'target'))
+    mask = df['target'].notna()
+    expected = stats.spearmanr(df.loc[mask, 'x'], df.loc[mask, 'target']).statistic
+    assert results["Numeric Features vs Target `target`"].loc['x', 'spearman_rho'] == pytest.approx(expected)
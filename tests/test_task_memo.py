@@ -0,0 +1,53 @@
+"""Task Memo Tests"""
+import pytest
+
+from tools.task_memo import get_task_anchors, is_same_request, normalize_task, plan_tasks
+
+
+COLUMNS = ['price', 'city', 'quantity', 'target']
+
+
+def is_same(task: str, other_task: str) -> bool:
+    """Normalizes two tasks against `COLUMNS` and compares them."""
+    anchors, other_anchors = get_task_anchors(task, COLUMNS), get_task_anchors(other_task, COLUMNS)
+    return is_same_request(normalize_task(task, anchors), anchors, normalize_task(other_task, other_anchors), other_anchors)
+
+
+@pytest.mark.parametrize('task, other_task', [
+    ("Count the rows where price > 100", "How many records have price > 100?"),
+    ("Calculate the average price by city", "Compute the mean of price grouped by city"),
+    ("Count rows where price is greater than 100", "Count rows where price > 100"),
+    ("Show the number of missing values in each column", "Count the null values per column"),
+])
+def test_rephrased_tasks_are_the_same_request(task, other_task):
+    assert is_same(task, other_task)
+
+
+@pytest.mark.parametrize('task, other_task', [
+    ("Count the rows where price > 100", "Count the rows where price < 100"),
+    ("Count the rows where price >= 100", "Count the rows where price > 100"),
+    ("Count the rows where price == 100", "Count the rows where price != 100"),
+    ("Count the rows where price is above 100", "Count the rows where price is below 100"),
+    ("Mean price of rows where city is missing", "Mean price of rows where city is not missing"),
+    ("Mean quantity by city, excluding rows where price > 100", "Mean quantity by city for rows where price > 100"),
+    ("List the top 10 cities by mean price", "List the bottom 10 cities by mean price"),
+    ("Average price grouped by city", "Average price grouped by quantity"),
+    ("Top 5 cities by price", "Top 10 cities by price"),
+])
+def test_near_miss_tasks_are_different_requests(task, other_task):
+    assert not is_same(task, other_task)
+
+
+def test_long_tasks_differing_by_an_operator_are_different_requests():
+    task = "Calculate the mean, median, standard deviation, minimum and maximum of quantity for orders with price {} 100"
+    assert not is_same(task.format('>'), task.format('<'))
+
+
+def test_plan_tasks_answers_repeats_from_the_list_and_the_memo():
+    memo = [{'task': "Count rows where price > 100", 'intent': normalize_task("Count rows where price > 100", ['100', 'price']),
+             'anchors': ['100', 'price'], 'output': '42', 'seconds': 1.5}]
+    sources = plan_tasks(["How many records have price > 100?", "Count rows where price < 100",
+                          "Count the rows where price < 100"], memo, COLUMNS)
+    assert sources[0]['memo'] is memo[0]
+    assert sources[1]['duplicate_of'] is None and sources[1]['memo'] is None
+    assert sources[2]['duplicate_of'] == 1
@@ -0,0 +1,60 @@
+"""Run Telemetry Tests"""
+import asyncio
+import uuid
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from tools import telemetry
+from tools.telemetry import PROMETHEUS_PATH, TelemetryCallbackHandler, TelemetryStore, add_metric, get_cost, record_span
+
+
+@pytest.fixture(name='store', autouse=True)
+def fixture_store(monkeypatch):
+    """A telemetry store in the directory of the test, exporting to Prometheus."""
+    store = TelemetryStore(exporter='prometheus')
+    monkeypatch.setattr(telemetry, 'TELEMETRY', store)
+    return store
+
+
+def test_metrics_are_added_to_the_span_and_its_enclosing_spans(store):
+    with record_span('a', 'Coder'):
+        add_metric('pandas_seconds', 1.0)
+        with record_span(task='count rows'):
+            add_metric('pandas_seconds', 2.0)
+    spans = store.get_spans('a')
+    assert [(span['node'], span['task'], span['pandas_seconds']) for span in spans] == \
+        [('Coder', None, 3.0), ('Coder', 'count rows', 2.0)]
+    assert [(row['node'], row['executions'], row['pandas_seconds']) for row in store.get_node_summary('a')] == [('Coder', 1, 3.0)]
+
+
+def test_concurrent_tasks_only_measure_their_own_span(store):
+    async def run_task(name: str, seconds: float):
+        with record_span(task=name):
+            add_metric('limiter_seconds', seconds)
+
+    async def run_node():
+        with record_span('a', 'Coder'):
+            await asyncio.gather(run_task('first', 1.0), run_task('second', 2.0))
+
+    asyncio.run(run_node())
+    assert {span['task']: span['limiter_seconds'] for span in store.get_spans('a')} == {None: 3.0, 'first': 1.0, 'second': 2.0}
+
+
+def test_model_calls_report_latency_tokens_and_cost(store):
+    handler, run_id = TelemetryCallbackHandler('models/gemini-2.5-flash'), uuid.uuid4()
+    message = AIMessage(content='ok', usage_metadata={'input_tokens': 1000, 'output_tokens': 200, 'total_tokens': 1200})
+    with record_span('a', 'Statistician'):
+        handler.on_chat_model_start({}, [], run_id=run_id)
+        handler.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]), run_id=run_id)
+    (span,) = store.get_spans('a')
+    assert (span['llm_calls'], span['input_tokens'], span['output_tokens']) == (1, 1000, 200)
+    assert span['cost'] == pytest.approx(get_cost('models/gemini-2.5-flash', 1000, 200)) and span['cost'] > 0
+
+
+def test_node_spans_are_exported_to_the_prometheus_text_file():
+    with record_span('a', 'Coder'):
+        pass
+    with open(PROMETHEUS_PATH, 'r', encoding='utf-8') as f:
+        assert 'cognitoeda_node_executions_total{node="Coder"} 1' in f.read()